@@ -0,0 +1,111 @@
+"""
+Compares the size and the encode and decode times of the registered serializers
+on the state of a scheduler holding generated process instances.
+
+    python benchmarks/bench_serializers.py --processes 100 --jobs 50
+"""
+import argparse
+import os
+import tempfile
+import time
+import warnings
+from datetime import datetime, timedelta
+
+from fbpscheduler.enums import Status
+from fbpscheduler.marshalling import dump_json
+from fbpscheduler.schedulers import LocalScheduler
+from fbpscheduler.serializers import serializers
+from fbpscheduler.templates import ProcessTemplate
+
+
+def make_process(jobs):
+    entities = []
+    for i in range(jobs):
+        entities.append({"Object Type": "Job",
+                         "Name": "job{}".format(i),
+                         "Description": "Generated job",
+                         "Dependencies": ["job{}".format(i - 1)] if i else [],
+                         "Run Type": "cmd",
+                         "Command": "echo #Entity Id# #date#",
+                         "Parameters": {"value": i, "date": "#date#"}})
+    return {"Object Type": "Process",
+            "Name": "process",
+            "Description": "",
+            "Deadline": "01:00:00",
+            "Trigger": {"Trigger Type": "instant"},
+            "Dependencies": [],
+            "Entity List": entities}
+
+
+def make_scheduler(processes, jobs):
+    scheduler = LocalScheduler(".")
+    template = ProcessTemplate(make_process(jobs))
+    start = datetime(2021, 5, 10)
+    for i in range(processes):
+        process = scheduler.trigger_callback(template)
+        scheduler.cache.update_parameters(process.entity_id, {"date": "2021-05-{:02d}".format(i % 28 + 1)})
+        # Half of the instances have run
+        if i % 2:
+            continue
+        for entity in list(process.get_entities()) + [process]:
+            entity.start_time = start + timedelta(minutes=i)
+            entity.end_time = entity.start_time + timedelta(seconds=30)
+            entity.status = Status.finished
+            scheduler.cache.read_state(entity.get_metadata(), run_handlers=False)
+    return scheduler
+
+
+def measure(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=100)
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    scheduler = make_scheduler(args.processes, args.jobs)
+    states = {"cache state": {"id": scheduler.cache.id,
+                              "metadata": scheduler.cache.metadata,
+                              "parameters": scheduler.cache.parameters},
+              "scheduler": scheduler}
+
+    print("processes: {}, jobs per process: {}".format(args.processes, args.jobs))
+    print("{:<12} {:<10} {:>12} {:>12} {:>12}".format("state", "format", "size (kB)", "encode (ms)", "decode (ms)"))
+    for state_name, state in states.items():
+        for name, serializer_class in serializers.items():
+            serializer = serializer_class()
+            try:
+                encode_time, data = measure(lambda: serializer.serialize(state), args.repeat)
+            except TypeError:
+                # The state holds a type the format cannot encode
+                print("{:<12} {:<10} {:>12}".format(state_name, name, "n/a"))
+                continue
+            decode_time, _ = measure(lambda: serializer.deserialize(data), args.repeat)
+            print("{:<12} {:<10} {:>12.1f} {:>12.2f} {:>12.2f}".format(state_name, name, len(data) / 1024,
+                                                                       1000 * encode_time, 1000 * decode_time))
+
+    # Streaming keeps only the chunk being written in memory
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "state.json")
+
+        def stream():
+            with open(path, "w") as f:
+                dump_json(scheduler, f)
+
+        encode_time, _ = measure(stream, args.repeat)
+        print("{:<12} {:<10} {:>12.1f} {:>12.2f}".format("scheduler", "json file", os.path.getsize(path) / 1024,
+                                                         1000 * encode_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Measures trigger lag, the time between the fire date of a trigger and the call of
+its callback, with many triggers registered in a TriggerService. The same triggers
+can also be run with one task per trigger for comparison.
+
+    python benchmarks/bench_triggers.py --triggers 100000 --spread 5 --tasks 10000
+"""
+import argparse
+import asyncio as aio
+import time
+from datetime import datetime, timedelta
+from functools import partial
+
+from fbpscheduler.timers import TriggerService
+from fbpscheduler.triggers import DateTrigger
+
+
+def make_triggers(count, spread, fired):
+    def record(i):
+        fired[i] = time.monotonic()
+
+    start = datetime.now() + timedelta(seconds=1)
+    return [DateTrigger(start + timedelta(seconds=spread * i / count), partial(record, i), None, None)
+            for i in range(count)]
+
+
+async def wait_for_all(fired, timeout):
+    deadline = time.monotonic() + timeout
+    while None in fired and time.monotonic() < deadline:
+        await aio.sleep(0.05)
+
+
+async def run_service(count, spread):
+    fired = [None] * count
+    triggers = make_triggers(count, spread, fired)
+    service = TriggerService()
+    start = time.perf_counter()
+    expected = [service.schedule(trigger).when for trigger in triggers]
+    setup = time.perf_counter() - start
+
+    service.start()
+    await wait_for_all(fired, spread + 10)
+    service.stop()
+    return setup, expected, fired
+
+
+async def run_tasks(count, spread):
+    fired = [None] * count
+    triggers = make_triggers(count, spread, fired)
+    start = time.perf_counter()
+    expected = [time.monotonic() + (trigger._trigger_date - datetime.now()).total_seconds() for trigger in triggers]
+    tasks = [aio.create_task(trigger.activate_trigger()) for trigger in triggers]
+    setup = time.perf_counter() - start
+
+    await wait_for_all(fired, spread + 10)
+    for task in tasks:
+        task.cancel()
+    return setup, expected, fired
+
+
+def report(name, setup, expected, fired):
+    lags = sorted(fire_time - when for when, fire_time in zip(expected, fired) if fire_time is not None)
+    print("{:<8} fired: {:>7}/{:<7} setup: {:6.3f} s  lag ms  p50: {:7.3f}  p99: {:7.3f}  max: {:7.3f}".format(
+        name, len(lags), len(fired), setup, 1000 * lags[len(lags) // 2], 1000 * lags[int(0.99 * (len(lags) - 1))],
+        1000 * lags[-1]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--triggers", type=int, default=100000)
+    parser.add_argument("--spread", type=float, default=5, help="seconds over which the triggers fire")
+    parser.add_argument("--tasks", type=int, default=0, help="number of triggers run with one task each")
+    args = parser.parse_args()
+
+    print("triggers: {}, spread over {} s".format(args.triggers, args.spread))
+    report("service", *aio.run(run_service(args.triggers, args.spread)))
+    if args.tasks:
+        report("tasks", *aio.run(run_tasks(args.tasks, args.spread)))
+
+
+if __name__ == "__main__":
+    main()
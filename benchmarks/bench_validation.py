@@ -0,0 +1,86 @@
+"""
+Validates a corpus of generated process configurations with the compiled
+SchemaValidators and with the per call validate_json. The compiled validators
+use fastjsonschema when it is installed.
+
+    python benchmarks/bench_validation.py --configs 5000 --jobs 50
+"""
+import argparse
+import json
+import tempfile
+import time
+import warnings
+from os.path import join
+from pathlib import Path
+
+from fbpscheduler import schema_dir
+from fbpscheduler.marshalling import SchemaValidators, validate_json, fastjsonschema
+
+
+def make_process(index, jobs):
+    entities = []
+    for i in range(jobs):
+        entities.append({"Object Type": "Job",
+                         "Name": "job{}".format(i),
+                         "Description": "",
+                         "Dependencies": ["job{}".format(i - 1)] if i else [],
+                         "Run Type": "cmd",
+                         "Command": "echo #Entity Id#",
+                         "Parameters": {"value": i}})
+    group = {"Object Type": "JobGroup", "Name": "group", "Description": "", "Dependencies": [],
+             "Jobs": entities[: jobs // 2]}
+    return {"Object Type": "Process",
+            "Name": "process{}".format(index),
+            "Description": "",
+            "Deadline": "01:00:00",
+            "Trigger": {"Trigger Type": "cron", "Cron Expression": "*/5 * * * *"},
+            "Dependencies": [],
+            "Entity List": [group] + entities[jobs // 2:]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--configs", type=int, default=5000)
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--legacy", type=int, default=200, help="number of configs validated with validate_json")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(args.configs):
+            with open(join(directory, "process{}.json".format(i)), "w") as f:
+                json.dump(make_process(i, args.jobs), f)
+
+        start = time.perf_counter()
+        configs = []
+        for path in sorted(Path(directory).iterdir()):
+            with open(path) as f:
+                configs.append(json.load(f))
+        read_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    validators = SchemaValidators(schema_dir)
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assert all(validators.validate_process(config) for config in configs)
+    compiled_time = time.perf_counter() - start
+
+    with open(join(schema_dir, "ProcessSchema.json")) as f:
+        process_schema = json.load(f)
+    schema_path = Path(schema_dir).resolve().as_uri() + "/"
+    legacy_configs = configs[:args.legacy]
+    start = time.perf_counter()
+    assert all(validate_json(config, process_schema, schema_path) for config in legacy_configs)
+    legacy_time = time.perf_counter() - start
+
+    print("configs: {}, jobs per config: {}, fastjsonschema: {}".format(args.configs, args.jobs,
+                                                                        fastjsonschema is not None))
+    print("read:          {:8.3f} s".format(read_time))
+    print("compile:       {:8.3f} s".format(compile_time))
+    print("compiled:      {:8.3f} s ({:.3f} ms/config)".format(compiled_time, 1000 * compiled_time / len(configs)))
+    print("validate_json: {:8.3f} s ({:.3f} ms/config)".format(legacy_time, 1000 * legacy_time / max(len(legacy_configs), 1)))
+
+
+if __name__ == "__main__":
+    main()
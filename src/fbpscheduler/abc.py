@@ -4,12 +4,17 @@ from collections.abc import Callable
 from abc import ABCMeta, abstractmethod
 from dataclasses import dataclass, fields, field
 
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from fbpscheduler.evaluators import python_evaluator
-from fbpscheduler.enums import ObjectType, Status, DateModifierPolicy, ExceptionHandlerPolicy, Fields as SchedulerFields
+from fbpscheduler.enums import ObjectType, Status, DateModifierPolicy, ExceptionHandlerPolicy, MisfirePolicy, \
+    BackoffPolicy, Fields as SchedulerFields
 from fbpscheduler.marshalling import getstate_type_handler, setstate_type_handler
 import asyncio as aio
 
+import logging
+logger = logging.getLogger(__name__)
+
+
 class Scheduler(metaclass=ABCMeta):
 
     def __init__(self, entity_id: str):
@@ -30,6 +35,11 @@ class Entity(metaclass=ABCMeta):
     timeout: None = None
     deadline: str = None
     status: Status = Status.initialized
+    retry_policy: BackoffPolicy | str | None = None
+    retry_delay: float | None = None
+    retry_max_delay: float | None = None
+    retry_count: int = 0
+    resources: dict | None = None
     
 
     def __init__(self, **kwargs):
@@ -53,6 +63,8 @@ class Entity(metaclass=ABCMeta):
         self.object_type = ObjectType(self.object_type)
         if type(self.exception_handling) == str:
             self.exception_handling = ExceptionHandlerPolicy[self.exception_handling]
+        if type(self.retry_policy) == str:
+            self.retry_policy = BackoffPolicy[self.retry_policy]
 
 
         # For cooperative inheritance, cannot pass parameters to subclass, so it is recommended to
@@ -72,22 +84,35 @@ class Entity(metaclass=ABCMeta):
             params = cache.get_parameters(self.entity_id)
         return python_evaluator(module, function, params, cache)
         
+    def resolve_deadline(self, inherited_deadline: datetime = None):
+        """
+        Turns the time of day deadline into the date it expires, counted from now. Does
+        nothing once the deadline is a date, so time spent waiting for resources counts.
+        """
+        if isinstance(self.deadline, datetime):
+            return
+        if self.deadline:
+            timeout = datetime.combine(date.min, datetime.strptime(self.deadline, '%H:%M:%S').time()) - datetime.min
+            self.deadline = datetime.now() + timeout
+            if inherited_deadline is not None:
+                self.deadline = min(self.deadline, inherited_deadline)
+        else:
+            self.deadline = inherited_deadline
+
     def _start(self, inherited_deadline: datetime = None):
         if self.status == Status.initialized:
             self.start_time = datetime.now()
-            if self.deadline:
-                timeout = datetime.combine(date.min, datetime.strptime(self.deadline, '%H:%M:%S').time()) - datetime.min
-                self.deadline = min(datetime.now() + timeout, inherited_deadline)
-            else:
-                self.deadline = inherited_deadline
-            self.timeout = self.deadline - datetime.now()
+            self.resolve_deadline(inherited_deadline)
             self.status = Status.running
         elif self.status == Status.unsuccessful:
             self.status = Status.re_running
         else:
             raise NameError("Invalid status for start of execution")
-        
-        self.timeout = self.deadline - datetime.now()
+
+        # Evaluators expect the time limit in seconds
+        self.timeout = None
+        if self.deadline is not None:
+            self.timeout = (self.deadline - datetime.now()).total_seconds()
         
     def _end(self, execution_status_code):
 
@@ -104,7 +129,9 @@ class Entity(metaclass=ABCMeta):
             else:
                 raise NameError("Invalid status for end of execution")
 
-        if self.status != Status.unsuccessful:
+        if self.status == Status.unsuccessful:
+            self.retry_count += 1
+        else:
             self.end_time = datetime.now()
             print("{name} ended. Status code: {code}".format(name=self.name, code=self.status.value))
 
@@ -143,22 +170,101 @@ class Entity(metaclass=ABCMeta):
     
 
 class Trigger(metaclass=ABCMeta):
-    def __init__(self, callback: Callable, date_modifier: Callable | None, modifier_action: str | None):
+    """
+    A fire date is missed when the trigger comes up more than a threshold after it, after a
+    restart or a stalled event loop. The misfire policy decides what happens to missed dates:
+    coalesce fires once for all of them, catch_up fires each one that is at most
+    misfire_grace_time seconds old, and skip drops them.
+    """
+    # Defaults for triggers saved before misfire policies were added
+    misfire_policy = MisfirePolicy.coalesce
+    misfire_grace_time = None
+
+    def __init__(self, callback: Callable, date_modifier: Callable | None, modifier_action: str | None,
+                 misfire_policy: MisfirePolicy = MisfirePolicy.coalesce, misfire_grace_time: float | None = None):
         self._trigger_date = None
         self._modifier_action = modifier_action
         self._date_modifier = date_modifier
         self._callback = callback
+        self.misfire_policy = misfire_policy
+        self.misfire_grace_time = misfire_grace_time
+
+    @property
+    def trigger_date(self) -> datetime | None:
+        return self._trigger_date
+
+    def set_callback(self, callback: Callable, date_modifier: Callable | None = None):
+        """
+        Sets the callback and date modifier again, for triggers restored from formats that do not keep callables.
+        """
+        self._callback = callback
+        self._date_modifier = date_modifier
+
+    def next_fire_date(self) -> datetime | None:
+        """
+        Returns the date the trigger fires next, after applying the date modifier, or
+        None when the trigger will not fire again.
+        """
+        if self._trigger_date is not None and self._date_modifier is not None:
+            self._apply_modification(self._date_modifier(self._trigger_date))
+        return self._trigger_date
+
+    def is_missed(self, now: datetime, threshold: float) -> bool:
+        return self._trigger_date is not None and (now - self._trigger_date).total_seconds() > threshold
+
+    def drop_missed(self, now: datetime) -> bool:
+        """
+        Applies the misfire policy to a missed fire date. Dates the policy drops move the
+        trigger on to its next date. Returns whether the trigger should fire for its current date.
+        """
+        if self.misfire_policy == MisfirePolicy.skip:
+            self.skip_until(now)
+            return False
+        if self.misfire_policy == MisfirePolicy.catch_up and self.misfire_grace_time is not None:
+            self.skip_until(now - timedelta(seconds=self.misfire_grace_time))
+        return self._trigger_date is not None and self._trigger_date <= now
+
+    def skip_until(self, date: datetime):
+        """
+        Moves the trigger on to its first date after date, if it is not already there.
+        """
+        while self._trigger_date is not None and self._trigger_date <= date:
+            self._trigger_date = self.next()
 
-    async def activate_trigger(self):
-        while self._trigger_date is not None:
-            if self._date_modifier is not None:
-                new_date = self._date_modifier(self._trigger_date)
-                self._apply_modification(new_date)
+    def mark_fired(self, date: datetime):
+        """
+        Moves the trigger on past a date it is known to have fired for, when its state is rebuilt from the journal.
+        """
+        self.skip_until(date)
 
-            sleep_time = max(int((self._trigger_date - datetime.now()).total_seconds()), 0)
-            await aio.sleep(sleep_time)
+    def fire(self, now: datetime | None = None):
+        """
+        Calls the callback and moves the trigger on to its next date. now is given when the
+        fire date was missed, and coalesced triggers then also skip the other missed dates.
+        The trigger moves on even if the callback raises, so a failing callback is not
+        called again for the same date.
+        """
+        try:
             self._callback()
+        finally:
             self._trigger_date = self.next()
+            if now is not None and self.misfire_policy == MisfirePolicy.coalesce:
+                self.skip_until(now)
+
+    async def activate_trigger(self, misfire_threshold: float = 1.0):
+        """
+        Fires the trigger from its own task. Schedulers register triggers in a TriggerService instead.
+        """
+        while self.next_fire_date() is not None:
+            await aio.sleep(max((self._trigger_date - datetime.now()).total_seconds(), 0))
+            now = datetime.now()
+            try:
+                if not self.is_missed(now, misfire_threshold):
+                    self.fire()
+                elif self.drop_missed(now):
+                    self.fire(now)
+            except Exception:
+                logger.exception("Trigger callback raised an exception")
         else:
             print("Trigger will no longer call back.")
 
@@ -182,6 +288,20 @@ class Trigger(metaclass=ABCMeta):
         pass
 
 
+class Serializer(metaclass=ABCMeta):
+    """
+    Converts objects to bytes and back, for saved state, the state journal and the
+    payloads passed to cache handlers.
+    """
+    @abstractmethod
+    def serialize(self, obj) -> bytes:
+        pass
+
+    @abstractmethod
+    def deserialize(self, serialized: bytes):
+        pass
+
+
 class Node(metaclass = ABCMeta):
     
     # Static field
@@ -190,6 +310,7 @@ class Node(metaclass = ABCMeta):
     def __init__(self, node_id):
         self.id = node_id
         self._children = {}
+        self._id_counters = {}
         
     @staticmethod
     def split_id(node_id, delimiter = delim_str):
@@ -204,19 +325,34 @@ class Node(metaclass = ABCMeta):
     def get_child(self, node_id):
         if node_id == self.id:
             return self
-        else:
-            # Since ids are unique, this recursive call should return once
-            target_child = None
-            for child_id, child in self._children.items():
-                if child_id in node_id:
-                    retrieved_child =  child.get_child(node_id)
-                    if retrieved_child is not None:
-                        target_child = retrieved_child
-                        
-            return target_child
-        
-        print("Unable to find the node " + node_id)
+
+        # Ids of descendants extend the ids of their ancestors, so only one child can lead to the node
+        for child_id, child in self._children.items():
+            if node_id == child_id or node_id.startswith(child_id + self.delim_str):
+                return child.get_child(node_id)
+
         return None
+
+    def remove_child(self, node_id):
+        return self._children.pop(node_id, None)
+
+    def next_child_number(self, prefix):
+        """
+        Returns the next number for the ids of children with the given prefix. Counters are
+        stored on the node, so they are saved and restored along with the cache.
+        """
+        number = self._id_counters.get(prefix, 0) + 1
+        self._id_counters[prefix] = number
+        return number
+
+    def count_child(self, child_id):
+        """
+        Advances the counter of the child's prefix to the number of its id, for children
+        restored without going through the factory.
+        """
+        prefix, _, number = self.split_id(child_id)[-1].rpartition("-")
+        if number.isdigit() and int(number) > self._id_counters.get(prefix, 0):
+            self._id_counters[prefix] = int(number)
     
     @abstractmethod
     def set_child(self, node_id):
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import pickle
+import struct
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from fbpscheduler.enums import Status
+
+# Every record of the archive file is an entity id and a pickled process, each prefixed by its length
+_HEADER = struct.Struct("<IQ")
+
+
+@dataclass(frozen=True)
+class ProcessSummary:
+    """
+    Lightweight record of a finished process.
+    """
+    entity_id: str
+    name: str
+    status: Status
+    start_time: datetime | None = None
+    end_time: datetime | None = None
+    durations: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_process(cls, process) -> ProcessSummary:
+        durations = {}
+        pending = list(process.get_entities())
+        while pending:
+            entity = pending.pop()
+            if entity.start_time is not None and entity.end_time is not None:
+                durations[entity.entity_id] = (entity.end_time - entity.start_time).total_seconds()
+            if hasattr(entity, "get_entities"):
+                pending.extend(entity.get_entities())
+
+        return cls(process.entity_id, process.name, process.status, process.start_time, process.end_time, durations)
+
+
+class ProcessArchive:
+    """
+    Keeps summaries of the last maxlen finished processes in memory. When a path is
+    given, every finished process is also appended in full to the archive file and
+    can be read back by id with get. The file offsets of the last maxlen processes
+    read or written are kept, older processes are found by scanning the file.
+    """
+    def __init__(self, maxlen: int | None = 1000, path: str | None = None):
+        self.summaries = deque(maxlen=maxlen)
+        self.path = path
+        self._offsets = OrderedDict()
+
+    def __getstate__(self):
+        # The offsets are found again on lookup
+        state = self.__dict__.copy()
+        del state["_offsets"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._offsets = OrderedDict()
+
+    def _remember(self, process_id, offset):
+        self._offsets[process_id] = offset
+        self._offsets.move_to_end(process_id)
+        if self.summaries.maxlen is not None and len(self._offsets) > self.summaries.maxlen:
+            self._offsets.popitem(last=False)
+
+    def append(self, process):
+        self.summaries.append(ProcessSummary.from_process(process))
+        if self.path is None:
+            return
+
+        entity_id = process.entity_id.encode("utf-8")
+        payload = pickle.dumps(process, pickle.HIGHEST_PROTOCOL)
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(_HEADER.pack(len(entity_id), len(payload)))
+            f.write(entity_id)
+            f.write(payload)
+        self._remember(process.entity_id, offset)
+
+    def _find(self, process_id) -> int | None:
+        # Only the record headers are read, payloads are skipped
+        with open(self.path, "rb") as f:
+            while True:
+                offset = f.tell()
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return None
+                id_length, payload_length = _HEADER.unpack(header)
+                if f.read(id_length).decode("utf-8") == process_id:
+                    return offset
+                f.seek(payload_length, 1)
+
+    def get(self, process_id):
+        """
+        Loads the full process with the given id from the archive file. Returns None
+        if the process is not archived.
+        """
+        if self.path is None:
+            return None
+        offset = self._offsets.get(process_id)
+        if offset is None:
+            try:
+                offset = self._find(process_id)
+            except FileNotFoundError:
+                return None
+            if offset is None:
+                return None
+        self._remember(process_id, offset)
+
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            id_length, payload_length = _HEADER.unpack(f.read(_HEADER.size))
+            f.seek(id_length, 1)
+            return pickle.loads(f.read(payload_length))
+
+    def get_summary(self, process_id) -> ProcessSummary | None:
+        for summary in reversed(self.summaries):
+            if summary.entity_id == process_id:
+                return summary
+        return None
+
+    def __iter__(self):
+        return iter(self.summaries)
+
+    def __len__(self):
+        return len(self.summaries)
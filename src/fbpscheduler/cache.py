@@ -1,6 +1,11 @@
-from fbpscheduler.abc import Node
+from __future__ import annotations
+
+from fbpscheduler.abc import Node, Serializer
 from fbpscheduler.enums import Fields
 from fbpscheduler.parse import flat_args
+from fbpscheduler.pipeline import EventPipeline
+from fbpscheduler.journal import StateJournal
+from collections import ChainMap
 import json
 
 import logging
@@ -24,37 +29,77 @@ def update_process_cache(cache, entity_id, new_parameters: dict = {}):
 
 
 class Cache(Node):
-    def __init__(self, cache_id: str, parameters: dict = {}, cache_handler = None, entity_handler = None):
+    def __init__(self, cache_id: str, parameters: dict = None, cache_handler = None, entity_handler = None,
+                 pipeline: EventPipeline | None = None, journal: StateJournal | None = None,
+                 serializer: Serializer | None = None):
         super().__init__(cache_id)
-        self.parameters = {self.id: parameters}
+        self.parameters = {self.id: parameters if parameters is not None else {}}
         self.metadata = {}
         self.cache_handler = cache_handler
         self.entity_handler = entity_handler
+        # When set, handlers run in batches on the pipeline's worker thread and only receive changes
+        self.pipeline = pipeline
+        # When set, state changes and parameter updates are appended to the journal
+        self.journal = journal
+        # When set, handlers receive serialized payloads instead of the objects of the cache
+        self.serializer = serializer
+        # Flat index of every node in the tree, including the cache itself
+        self._nodes = {self.id: self}
+        # Resolved parameter scope of every node looked up so far. A scope chains the parameter dicts of
+        # the node and its ancestors, so in place updates of those dicts are visible without invalidation.
+        self._scopes = {}
 
-    def set_parameters(self, node_id, parameters: dict = {}):
-        self.parameters[node_id] = parameters
+    def set_parameters(self, node_id, parameters: dict = None):
+        self.parameters[node_id] = parameters if parameters is not None else {}
+        self._invalidate_scopes(node_id)
+        if self.journal is not None and parameters is not None:
+            self.journal.record_parameters(node_id, parameters, replace=True)
     
     def update_parameters(self, node_id, parameters):
         self.parameters[node_id].update(parameters)
-    
-    def get_parameters(self, node_id, look_back = True):
-        output_parameters = {}
-        output_parameters[Fields.entity_id.value] = node_id
-        
-        lookup_list = [node_id]
-        if look_back:
+        if self.journal is not None:
+            self.journal.record_parameters(node_id, parameters)
+
+    def _invalidate_scopes(self, node_id):
+        # The scope of a node is only cached after the scopes of all its ancestors,
+        # so descendants can only be cached if the node itself is.
+        if node_id not in self._scopes:
+            return
+        prefix = node_id + type(self).delim_str
+        for scope_id in [scope_id for scope_id in self._scopes if scope_id.startswith(prefix)]:
+            del self._scopes[scope_id]
+        del self._scopes[node_id]
+
+    def _get_scope(self, node_id) -> ChainMap:
+        scope = self._scopes.get(node_id)
+        if scope is None:
             segmented_id = self.split_id(node_id)
             segmented_id.pop()
-            while segmented_id != []:
-                new_id = type(self).delim_str.join(segmented_id)
-                lookup_list.append(new_id)
-                segmented_id.pop()
-            
-        while lookup_list != []:
-            param = self.parameters[lookup_list.pop()]
-            output_parameters.update(param)
-        
-        return output_parameters
+            id_layer = {Fields.entity_id.value: node_id}
+            if segmented_id:
+                parent_scope = self._get_scope(type(self).delim_str.join(segmented_id))
+                scope = ChainMap(self.parameters[node_id], *parent_scope.maps[:-1], id_layer)
+            else:
+                scope = ChainMap(self.parameters[node_id], id_layer)
+            self._scopes[node_id] = scope
+        return scope
+
+    def parameter_scope(self, node_id, look_back = True) -> ChainMap:
+        """
+        Returns the parameters visible to the node, with the parameters of a node taking
+        precedence over those of its ancestors. The result is a view over the cached
+        scope of the node; writes to it go to a fresh layer and do not affect the cache.
+        """
+        if not look_back:
+            return ChainMap({}, self.parameters[node_id], {Fields.entity_id.value: node_id})
+
+        return self._get_scope(node_id).new_child()
+
+    def get_parameters(self, node_id, look_back = True) -> dict:
+        """
+        Returns a copy of the parameters visible to the node as a plain dict.
+        """
+        return dict(self.parameter_scope(node_id, look_back))
 
     def set_metadata(self, metadata):
         self.metadata[metadata[Fields.entity_id.name]] = metadata
@@ -66,32 +111,153 @@ class Cache(Node):
 
     def read_state(self, metadata, run_handlers = True):
         self.set_metadata(metadata)
-        if run_handlers:
+        if self.journal is not None:
+            self.journal.record_state(metadata)
+        if run_handlers and self.pipeline is not None:
+            self._emit_state(metadata)
+        elif run_handlers:
             if self.cache_handler is not None:
-                self.cache_handler(self.__dict__.copy())
+                if self.serializer is None:
+                    self.cache_handler(self.__dict__.copy())
+                else:
+                    self.cache_handler(self.serializer.serialize({"id": self.id, "metadata": self.metadata,
+                                                                  "parameters": self.parameters}))
             if self.entity_handler is not None:
-                self.entity_handler(metadata, self.get_parameters(metadata[Fields.entity_id.name]))
+                parameters = self.get_parameters(metadata[Fields.entity_id.name])
+                if self.serializer is None:
+                    self.entity_handler(metadata, parameters)
+                else:
+                    self.entity_handler(self.serializer.serialize(metadata), self.serializer.serialize(parameters))
 
     
+    def _emit_state(self, metadata):
+        if self.cache_handler is None and self.entity_handler is None:
+            return
+
+        # The pipeline dispatches later from another thread, so the state is copied now
+        node_id = metadata[Fields.entity_id.name]
+        parameters = self.parameters.get(node_id, {}).copy()
+        resolved_parameters = None
+        if self.entity_handler is not None:
+            resolved_parameters = self.get_parameters(node_id)
+
+        self.pipeline.start(self._dispatch_batch)
+        self.pipeline.emit((node_id, metadata.copy(), parameters, resolved_parameters))
+
+    def _dispatch_batch(self, events):
+        """
+        Runs the handlers for a batch of state changes. Only the last change of each entity
+        in the batch is kept. The cache handler receives a single delta with the same layout
+        as the cache, restricted to the changed entities.
+        """
+        latest = {}
+        for node_id, metadata, parameters, resolved_parameters in events:
+            latest.pop(node_id, None)
+            latest[node_id] = (metadata, parameters, resolved_parameters)
+
+        if self.cache_handler is not None:
+            delta = {"id": self.id,
+                     "metadata": {node_id: event[0] for node_id, event in latest.items()},
+                     "parameters": {node_id: event[1] for node_id, event in latest.items()}}
+            self.cache_handler(delta if self.serializer is None else self.serializer.serialize(delta))
+        if self.entity_handler is not None:
+            for metadata, parameters, resolved_parameters in latest.values():
+                if self.serializer is None:
+                    self.entity_handler(metadata, resolved_parameters)
+                else:
+                    self.entity_handler(self.serializer.serialize(metadata), self.serializer.serialize(resolved_parameters))
+
+    def get_child(self, node_id):
+        return self._nodes.get(node_id)
+
     def set_child(self, node_id):
         splitnode_id = self.split_id(node_id)
         splitnode_id.pop() # List is now the split parent Id
-        if len(splitnode_id) == 1:
-            self._children[node_id] = CacheNode(node_id)
-            self._children[node_id].parent = self
+        parent_id = type(self).delim_str.join(splitnode_id)
+        if parent_id == self.id:
+            child = CacheNode(node_id)
+            child.parent = self
+            self._children[node_id] = child
         else:
-            target_node = self.get_child(type(self).delim_str.join(splitnode_id))
-            target_node.set_child(node_id)
+            try:
+                child = self._nodes[parent_id].set_child(node_id)
+            except KeyError:
+                raise KeyError("Unable to find the parent node " + parent_id) from None
+        self._nodes[node_id] = child
         self.set_parameters(node_id)
-        
-    
-    
+
+    def remove_child(self, node_id):
+        """
+        Removes the node and all of its descendants, along with their parameters and metadata.
+        Returns the ids of the removed nodes.
+        """
+        node = self._nodes.get(node_id)
+        if node is None or node is self:
+            return []
+
+        removed_ids = self.get_descendant_ids(node_id)
+        node.parent._children.pop(node_id, None)
+        if self.journal is not None:
+            self.journal.record_removed(node_id)
+        self._invalidate_scopes(node_id)
+
+        for removed_id in removed_ids:
+            del self._nodes[removed_id]
+            self.parameters.pop(removed_id, None)
+            self.metadata.pop(removed_id, None)
+
+        return removed_ids
+
+    def get_descendant_ids(self, node_id):
+        """
+        Returns the id of the node followed by the ids of all of its descendants.
+        """
+        node = self._nodes.get(node_id)
+        if node is None:
+            return []
+
+        node_ids = []
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            node_ids.append(node.id)
+            pending.extend(node._children.values())
+        return node_ids
+
+    def __getstate__(self):
+        # The node index and the parameter scopes are rebuilt when unpickled
+        state = self.__dict__.copy()
+        del state["_nodes"]
+        state["_scopes"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._nodes = {}
+        pending = [self]
+        while pending:
+            node = pending.pop()
+            self._nodes[node.id] = node
+            for child in node._children.values():
+                child._parent = node
+            pending.extend(node._children.values())
+
 
 class CacheNode(Node):
     def __init__(self, node_id):
         super().__init__(node_id)
         self._parent = None
     
+    def __getstate__(self):
+        # The parent is linked again by the cache, which keeps the state free of cycles
+        state = self.__dict__.copy()
+        del state["_parent"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._parent = None
+
     @property
     def parent(self):
         return self._parent
@@ -102,10 +268,12 @@ class CacheNode(Node):
     
 
     def set_child(self, node_id):
-       if (self.id in node_id):
-           child = CacheNode(node_id)
-           child._parent = self
-           self._children[node_id] = child  
+        if node_id.startswith(self.id + self.delim_str):
+            child = CacheNode(node_id)
+            child._parent = self
+            self._children[node_id] = child
+            return child
+        return None
             
         
     
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import asyncio as aio
 from dataclasses import dataclass
 from fbpscheduler.abc import Trigger
 from datetime import datetime
@@ -10,23 +9,21 @@ class ConfigStore:
     config: dict
     last_unmodified: datetime | float
     trigger: Trigger = None
-    trigger_task = None
+    trigger_handle = None
 
     def set_trigger(self, trigger):
         self.trigger = trigger
 
-    def activate_trigger(self):
+    def activate_trigger(self, trigger_service):
         if self.trigger is None:
             print("Trigger not set")
             return None
 
-        self.trigger_task = aio.create_task(self.trigger.activate_trigger())
-
-    async def cancel_trigger(self):
-        self.trigger_task.cancel()
-        try:
-            await self.trigger_task
-        except aio.CancelledError:
-            print("Trigger Updated")
+        self.trigger_handle = trigger_service.schedule(self.trigger)
 
+    def cancel_trigger(self, trigger_service):
+        if self.trigger_handle is None:
+            return None
 
+        trigger_service.cancel(self.trigger_handle)
+        self.trigger_handle = None
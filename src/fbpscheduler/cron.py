@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+from operator import itemgetter
+from weakref import WeakSet, WeakValueDictionary
+
+from croniter import croniter
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def normalize_expression(expression: str) -> str:
+    return " ".join(expression.split())
+
+
+@lru_cache(maxsize=4096)
+def is_valid(expression: str) -> bool:
+    return croniter.is_valid(expression)
+
+
+class CronSchedule:
+    """
+    Fire dates of a cron expression, shared by every trigger that uses it. Dates are
+    computed batch_size at a time and cached. The cache holds every fire date after
+    start, in order, so the next date after any later date is found by bisection.
+    """
+    def __init__(self, expression: str, batch_size: int = 64):
+        self.expression = expression
+        self.batch_size = batch_size
+        self.triggers = WeakSet()
+        self._start = None
+        self._dates = []
+
+    def _reset(self, start: datetime):
+        self._start = start
+        self._dates = []
+        self._iter = croniter(self.expression, start)
+
+    def _extend(self):
+        get_next = self._iter.get_next
+        self._dates.extend(get_next(datetime) for _ in range(self.batch_size))
+
+    def _cover(self, date: datetime):
+        # Makes sure the cache holds the first fire date after date. Dates past the cache, after
+        # an outage for instance, start a new one rather than stepping through the gap.
+        if self._start is None or date < self._start or (self._dates and date >= self._dates[-1]):
+            self._reset(date)
+        if not self._dates:
+            self._extend()
+
+        # Dates up to the requested one are dropped once more than a batch of them has built up.
+        # The cursors of other triggers are not tracked: a trigger still behind the cache start
+        # rebuilds the cache from its own date, which is correct but recomputes dates.
+        index = bisect_right(self._dates, date)
+        if index > self.batch_size:
+            self._start = self._dates[index - 1]
+            del self._dates[:index]
+
+    def next_after(self, date: datetime) -> datetime:
+        self._cover(date)
+        return self._dates[bisect_right(self._dates, date)]
+
+    def upcoming(self, date: datetime, count: int) -> list:
+        """
+        Returns the next count fire dates after date.
+        """
+        self._cover(date)
+        index = bisect_right(self._dates, date)
+        while len(self._dates) < index + count:
+            self._extend()
+        return self._dates[index:index + count]
+
+    def window(self, start: datetime, end: datetime) -> list:
+        """
+        Returns the fire dates after start up to and including end.
+        """
+        self._cover(start)
+        index = bisect_right(self._dates, start)
+        while self._dates[-1] <= end:
+            self._extend()
+        return self._dates[index:bisect_right(self._dates, end)]
+
+    def as_array(self, date: datetime, count: int):
+        """
+        Returns the next count fire dates after date as a numpy datetime64 array.
+        """
+        if numpy is None:
+            raise ImportError("as_array requires numpy")
+        return numpy.array(self.upcoming(date, count), dtype="datetime64[us]")
+
+
+class CronEngine:
+    """
+    Parses every distinct cron expression once and shares its schedule between the
+    triggers that use it. Schedules are dropped once no trigger holds them.
+    """
+    def __init__(self, batch_size: int = 64):
+        self.batch_size = batch_size
+        self._schedules = WeakValueDictionary()
+
+    def __len__(self):
+        return len(self._schedules)
+
+    @staticmethod
+    def is_valid(expression: str) -> bool:
+        return is_valid(normalize_expression(expression))
+
+    def schedule(self, expression: str) -> CronSchedule:
+        expression = normalize_expression(expression)
+        schedule = self._schedules.get(expression)
+        if schedule is None:
+            if not is_valid(expression):
+                raise ValueError("Cron expression: {} is not valid".format(expression))
+            schedule = CronSchedule(expression, self.batch_size)
+            self._schedules[expression] = schedule
+        return schedule
+
+    def window(self, start: datetime, end: datetime) -> list:
+        """
+        Returns (fire date, trigger) pairs for every trigger of every schedule that fires
+        after start up to and including end, ordered by fire date.
+        """
+        fires = []
+        for schedule in list(self._schedules.values()):
+            triggers = list(schedule.triggers)
+            if not triggers:
+                continue
+            for fire_date in schedule.window(start, end):
+                fires.extend((fire_date, trigger) for trigger in triggers)
+        fires.sort(key=itemgetter(0))
+        return fires
+
+
+cron_engine = CronEngine()
@@ -12,6 +12,16 @@ class Fields(str, Enum):
 
     exception_handling = "Exception Handling"
 
+    retry_policy = "Retry Policy"
+
+    retry_delay = "Retry Delay"
+
+    retry_max_delay = "Retry Max Delay"
+
+    retry_count = "Retry Count"
+
+    resources = "Resources"
+
     dependencies = "Dependencies"
 
     start_time = "Start Time"
@@ -19,6 +29,8 @@ class Fields(str, Enum):
     end_time = "End Time"
 
     status = "Status"
+
+    timeout = "Timeout"
     # Job Field Enums
 
     run_type = "Run Type"
@@ -31,6 +43,14 @@ class Fields(str, Enum):
 
     parameter_delimiter = "Parameter Delimiter"
 
+    execution_backend = "Execution Backend"
+
+    output_file = "Output File"
+
+    environment = "Environment"
+
+    working_directory = "Working Directory"
+
     success_code = "Success Code"
 
     return_code = "Return Code"
@@ -41,12 +61,16 @@ class Fields(str, Enum):
 
     jobs = "Jobs"
 
+    concurrency = "Concurrency"
+
     # Process Field Enums
 
     trigger = "Trigger"
 
     entity_list = "Entity List"
 
+    priority = "Priority"
+
     # Trigger Field Enums
 
     trigger_type = "Trigger Type"
@@ -57,6 +81,10 @@ class Fields(str, Enum):
 
     cron_expression = "Cron Expression"
 
+    misfire_policy = "Misfire Policy"
+
+    misfire_grace_time = "Misfire Grace Time"
+
     # Scheduler Field Enums
 
     last_unmodified = "Last Unmodified"
@@ -99,6 +127,17 @@ class RunType(Enum):
     # Executes a command line expression
     cmd = auto()
 
+    # Executes a program directly, without a shell, with the parameters as its arguments
+    exec = auto()
+
+
+class ExecutionBackend(Enum):
+    # Runs python jobs in the thread pool of the event loop
+    thread = auto()
+
+    # Runs python jobs in a managed pool of worker processes
+    process = auto()
+
 
 class ExceptionHandlerPolicy(Enum):
     kill = auto()
@@ -108,6 +147,62 @@ class ExceptionHandlerPolicy(Enum):
     skip = auto()
 
 
+class BackoffPolicy(Enum):
+    # Retries wait the retry delay
+    fixed = auto()
+
+    # The wait doubles with every retry, up to the retry max delay
+    exponential = auto()
+
+    # Exponential wait, of which a random part is taken so that retries are spread out
+    jittered = auto()
+
+
+class BackpressurePolicy(Enum):
+    # Wait for room in the queue
+    block = auto()
+
+    # Discard the oldest queued event to make room
+    drop_oldest = auto()
+
+    # Discard the new event
+    drop_newest = auto()
+
+
+class FileEvent(Enum):
+    # File was added to the watched directory
+    created = auto()
+
+    # File content changed
+    modified = auto()
+
+    # File was removed from the watched directory
+    deleted = auto()
+
+
+class JournalRecord(Enum):
+    # Status and timestamps of an entity changed
+    state = auto()
+
+    # Parameters of a node were updated, or replaced
+    parameters = auto()
+
+    # A node and its descendants were removed from the cache
+    removed = auto()
+
+    # A process instance was created by a trigger, with the config and date the trigger fired for
+    process = auto()
+
+    # A process instance ended and left the run queue
+    ended = auto()
+
+    # A process config was inserted or replaced
+    config = auto()
+
+    # A process config was removed
+    config_removed = auto()
+
+
 class DateModifierPolicy(Enum):
     # If new date is different from current date, replace trigger date with new date
     keep = auto()
@@ -119,6 +214,17 @@ class DateModifierPolicy(Enum):
     delete = auto()
 
 
+class MisfirePolicy(Enum):
+    # Missed fire dates of a trigger are fired once
+    coalesce = auto()
+
+    # Every missed fire date within the grace time is fired, the older ones are dropped
+    catch_up = auto()
+
+    # Missed fire dates are dropped
+    skip = auto()
+
+
 class ObjectType(str, Enum):
     # Represents the Job class
     job = "Job"
@@ -1,14 +1,84 @@
 from __future__ import annotations
 
 import importlib.util
+import signal
 import traceback
-from fbpscheduler.enums import Fields
+from os import stat, environ
+import os
+from os.path import basename, splitext
+from collections import OrderedDict, deque
+from collections.abc import Callable
+from fbpscheduler.enums import Fields, ExecutionBackend
+from fbpscheduler.pool import get_process_pool
 import asyncio as aio
 from functools import partial
 
 
+class ModuleCache:
+    """
+    LRU cache of python modules loaded from file paths. A cached module is reused
+    as long as the modification time and size of its file are unchanged, otherwise
+    it is executed again.
+    """
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._modules = OrderedDict()
+
+    @staticmethod
+    def _exec_module(path: str):
+        spec = importlib.util.spec_from_file_location(splitext(basename(path))[0], path)
+        lib = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(lib)
+        return lib
+
+    def load(self, path: str):
+        file_stat = stat(path)
+        signature = (file_stat.st_mtime_ns, file_stat.st_size)
+
+        cached = self._modules.get(path)
+        if cached is not None and cached[0] == signature:
+            self._modules.move_to_end(path)
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        lib = self._exec_module(path)
+        self._modules[path] = (signature, lib)
+        self._modules.move_to_end(path)
+        while len(self._modules) > self.maxsize:
+            self._modules.popitem(last=False)
+        return lib
+
+    def invalidate(self, path: str | None = None):
+        """
+        Drops the cached module of the given path, or every cached module if no path is given.
+        """
+        if path is None:
+            self._modules.clear()
+        else:
+            self._modules.pop(path, None)
+
+    def info(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses,
+                "size": len(self._modules), "maxsize": self.maxsize}
+
+    def __len__(self):
+        return len(self._modules)
+
+    def __contains__(self, path):
+        return path in self._modules
+
+
+module_cache = ModuleCache()
+
+_CHUNK_SIZE = 64 * 1024
+
+
 async def python_evaluator(path: str, command: str, arguments: dict | None = {}, cache = None,
-                           timeout: float | int | None = None) -> int:
+                           timeout: float | int | None = None,
+                           backend: ExecutionBackend = ExecutionBackend.thread) -> int:
     """
     Evaluate a python function in module specified by path. Can pass in arguments
     into the python function and also pass a reference to the scheduler cache.
@@ -22,11 +92,16 @@ async def python_evaluator(path: str, command: str, arguments: dict | None = {},
         Arguments to be passed into the function. The default is {}.
         
     path : str
-        Module full path. Must be a normalized absolutized path.
+        Module full path. Must be a normalized absolutized path. Modules are
+        loaded through module_cache and only re-executed when the file changes.
     cache :  Cache, optional
         A reference to the scheduler cache. The default is None.
     timeout: float | int | None, optional
         Specify a time limit for the python function execution. The default is None.
+    backend: ExecutionBackend, optional
+        Run the function in the thread pool of the event loop or in the process
+        pool of the scheduler. Functions run in the process pool are killed once
+        the time limit is reached and do not receive the cache. The default is thread.
 
     Returns
     -------
@@ -38,26 +113,134 @@ async def python_evaluator(path: str, command: str, arguments: dict | None = {},
     
 
     """
-    module_path = path.split("//")
-    spec = importlib.util.spec_from_file_location(module_path[-1][:-3], path)
-    lib = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(lib)
-    func = partial(getattr(lib, command), **arguments, **{Fields.cache.value: cache})
+    if backend == ExecutionBackend.process:
+        return await get_process_pool().run(path, command, arguments, timeout)
 
     loop = aio.get_event_loop()
     try:
+        lib = module_cache.load(path)
+        func = partial(getattr(lib, command), **arguments, **{Fields.cache.value: cache})
         future = loop.run_in_executor(None, func) # run_in_executor does not take kwargs
-        await aio.wait_for(fut=future, timeout=timeout, loop=loop)
+        await aio.wait_for(fut=future, timeout=timeout)
         return 0, "Function {} ran successfully".format(command)
     except Exception as e:
         return 1, traceback.format_exc()
     
 
-async def cmd_evaluator(command: str, arguments: str = "", timeout: float | int | None = None) -> tuple[int, str]:
+class OutputTail:
+    """
+    Ring buffer keeping the last `limit` bytes of a command's output.
+    """
+    def __init__(self, limit: int = 64 * 1024):
+        self.limit = limit
+        self._chunks = deque()
+        self._size = 0
+
+    def append(self, data: bytes):
+        if len(data) >= self.limit:
+            self._chunks.clear()
+            data = data[-self.limit:]
+            self._size = 0
+
+        self._chunks.append(data)
+        self._size += len(data)
+        while self._size > self.limit:
+            excess = self._size - self.limit
+            head = self._chunks[0]
+            if len(head) <= excess:
+                self._chunks.popleft()
+                self._size -= len(head)
+            else:
+                self._chunks[0] = head[excess:]
+                self._size -= excess
+
+    def getvalue(self, encoding: str = "utf-8") -> str:
+        return b"".join(self._chunks).decode(encoding, errors="replace")
+
+
+async def _capture_output(stream, tail: OutputTail, sink=None, line_handler: Callable | None = None,
+                          encoding: str = "utf-8"):
+    """
+    Reads a stream in chunks until EOF. Every chunk is written to the tail and to the
+    sink, and complete lines are forwarded to the line handler as they arrive.
+    """
+    partial_line = b""
+    while True:
+        data = await stream.read(_CHUNK_SIZE)
+        if not data:
+            break
+
+        tail.append(data)
+        if sink is not None:
+            sink.write(data)
+
+        if line_handler is not None:
+            lines = (partial_line + data).split(b"\n")
+            partial_line = lines.pop()
+            if len(partial_line) > _CHUNK_SIZE:
+                lines.append(partial_line)
+                partial_line = b""
+            for line in lines:
+                line_handler(line.decode(encoding, errors="replace").rstrip("\r"))
+
+    if partial_line and line_handler is not None:
+        line_handler(partial_line.decode(encoding, errors="replace").rstrip("\r"))
+
+
+# Commands run in a process group of their own, so that a timeout also stops the processes they start
+_NEW_SESSION = hasattr(os, "killpg")
+
+
+def _kill(proc):
+    if _NEW_SESSION:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    elif proc.returncode is None:
+        proc.kill()
+
+
+async def _run_subprocess(proc, timeout: float | int | None, line_handler: Callable | None,
+                          output_path: str | None, tail_limit: int) -> tuple[int, str]:
+    tail = OutputTail(tail_limit)
+    sink = open(output_path, "ab") if output_path else None
+    try:
+        await aio.wait_for(aio.gather(_capture_output(proc.stdout, tail, sink, line_handler),
+                                      _capture_output(proc.stderr, tail, sink, line_handler),
+                                      proc.wait()),
+                           timeout=timeout)
+    except aio.CancelledError:
+        _kill(proc)
+        await proc.wait()
+        raise
+    except Exception as e:
+        # Processes started by the command keep the pipes open, and wait returns once they are closed
+        _kill(proc)
+        await proc.wait()
+        return 1, "Exception {!r}\n{}".format(e, tail.getvalue())
+    finally:
+        if sink is not None:
+            sink.close()
+
+    return proc.returncode, tail.getvalue()
+
+
+def _environment(env: dict | None) -> dict | None:
+    if env is None:
+        return None
+    return {**environ, **{key: str(value) for key, value in env.items()}}
+
+
+async def cmd_evaluator(command: str, arguments: str = "", timeout: float | int | None = None,
+                        line_handler: Callable | None = None, output_path: str | None = None,
+                        tail_limit: int = 64 * 1024, env: dict | None = None,
+                        cwd: str | None = None) -> tuple[int, str]:
     
     """
     Evaluates a command line expression. Can pass arguments alongside the 
-    expression.
+    expression. Output is read as it is produced, so only the last tail_limit
+    bytes of it are kept in memory.
 
     Parameters
     ----------
@@ -67,30 +250,74 @@ async def cmd_evaluator(command: str, arguments: str = "", timeout: float | int
         Arguments to be passed into the function. The default is "".
     timeout: float | int | None, optional
         Specify a time limit for the command line executable. The default is None.
-    log_error: bool, optional
-        Choose whether or not to log errors/failed runs.
+    line_handler: Callable | None, optional
+        Called with every line of stdout and stderr as it arrives. The default is None.
+    output_path: str | None, optional
+        File the full output is appended to. The default is None.
+    tail_limit: int, optional
+        Number of bytes of output returned. The default is 64 KiB.
+    env: dict | None, optional
+        Variables added to the environment of the command. The default is None.
+    cwd: str | None, optional
+        Working directory of the command. The default is None.
 
     Returns
     -------
     int
         Return code/value from running the cmd commands.
     str
-        Return string output describing the evaluation of the given cmd commands
+        The tail of the output of the given cmd commands
 
     """
     cmd_string = command + " " + arguments
 
     proc = await aio.create_subprocess_shell(cmd_string, stdout=aio.subprocess.PIPE,
-                                             stderr=aio.subprocess.PIPE)
+                                             stderr=aio.subprocess.PIPE,
+                                             env=_environment(env), cwd=cwd,
+                                             start_new_session=_NEW_SESSION)
 
-    try:
-        stdout, stderr = await aio.wait_for(proc.communicate(), timeout=timeout)
-    except Exception as e:
-        return 1, f"Exception {e}"
+    return await _run_subprocess(proc, timeout, line_handler, output_path, tail_limit)
 
-    encoding = "utf-8"
-    logging_info = ""
-    if stdout != "": logging_info = logging_info + stdout.decode(encoding)
-    if stderr != "": logging_info = logging_info + stderr.decode(encoding)
-    return proc.returncode, logging_info
 
+async def exec_evaluator(argv: list, timeout: float | int | None = None,
+                         line_handler: Callable | None = None, output_path: str | None = None,
+                         tail_limit: int = 64 * 1024, env: dict | None = None,
+                         cwd: str | None = None) -> tuple[int, str]:
+    """
+    Executes a program directly, without going through a shell. Arguments are
+    passed to the program as is, so they do not need any quoting.
+
+    Parameters
+    ----------
+    argv : list
+        The executable followed by its arguments.
+    timeout: float | int | None, optional
+        Specify a time limit for the executable. The default is None.
+    line_handler: Callable | None, optional
+        Called with every line of stdout and stderr as it arrives. The default is None.
+    output_path: str | None, optional
+        File the full output is appended to. The default is None.
+    tail_limit: int, optional
+        Number of bytes of output returned. The default is 64 KiB.
+    env: dict | None, optional
+        Variables added to the environment of the executable. The default is None.
+    cwd: str | None, optional
+        Working directory of the executable. The default is None.
+
+    Returns
+    -------
+    int
+        Return code of the executable.
+    str
+        The tail of the output of the executable
+
+    """
+    try:
+        proc = await aio.create_subprocess_exec(*argv, stdout=aio.subprocess.PIPE,
+                                                stderr=aio.subprocess.PIPE,
+                                                env=_environment(env), cwd=cwd,
+                                                start_new_session=_NEW_SESSION)
+    except OSError as e:
+        return 1, "Exception {!r}".format(e)
+
+    return await _run_subprocess(proc, timeout, line_handler, output_path, tail_limit)
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from fbpscheduler.enums import ObjectType, DateModifierPolicy, TriggerType, Fields
-from fbpscheduler.objects import Job, JobGroup, Process
+from fbpscheduler.enums import ObjectType, DateModifierPolicy, TriggerType, MisfirePolicy, Fields
+from fbpscheduler.objects import Graph, Job, JobGroup, Process
 from fbpscheduler.triggers import CronTrigger, DateTrigger, InstantTrigger
 from dateutil.parser import parse
+from datetime import datetime
 
 
 
@@ -22,13 +23,11 @@ class EntityFactory:
        
         if parent_node is not None:
             new_id = new_id + parent_node.id + parent_node.delim_str
-            found_id = False
-            while not found_id:
-                test_id = new_id + prefix + subdelim_str + str(id_number)
-                if parent_node.is_child(test_id):
-                    id_number = id_number + 1
-                else:
-                    found_id = True
+            # Counters only grow, so ids are not reused once a child is removed. The check guards
+            # against children that were added without going through the factory.
+            id_number = parent_node.next_child_number(prefix)
+            while parent_node.is_child(new_id + prefix + subdelim_str + str(id_number)):
+                id_number = parent_node.next_child_number(prefix)
         new_id = new_id + prefix + subdelim_str + str(id_number)
         return new_id
     
@@ -37,6 +36,24 @@ class EntityFactory:
         new_job = Job(entity_id = job_id, **job_info)
         return new_job
     
+    @staticmethod
+    def _resolve_dependencies(graph):
+        """
+        Maps the dependency names of every entity in the graph to entity ids and builds
+        the dependency graph, so missing dependencies and cycles are reported at parse time.
+        """
+        entities = graph.get_entities()
+        ids = {entity.name: entity.entity_id for entity in entities}
+
+        for entity in entities:
+            for name in entity.get_dependency_names():
+                if name not in ids:
+                    raise ValueError("{entity} depends on {name}, which is not defined in {parent}"
+                                     .format(entity=entity.name, name=name, parent=graph.name))
+                entity.add_dependency(name, ids[name])
+
+        graph.generate_graph()
+
     @classmethod
     def _parse_job_group(cls, group_id, job_group_info, cache):
         new_job_group = JobGroup(entity_id = group_id, **job_group_info)    
@@ -44,13 +61,7 @@ class EntityFactory:
         for job in job_group_info[Fields.jobs]:
                 new_job_group.append(cls.parse(group_id, job, cache))
                 
-        group_jobs = new_job_group.get_entities() 
-        ids = {job.name: job.entity_id for job in group_jobs}
-    
-        for job in group_jobs:
-            for name in job.get_dependency_names():
-                job.add_dependency(name, ids[name])
-            
+        cls._resolve_dependencies(new_job_group)
         return new_job_group
 
     @classmethod
@@ -65,15 +76,69 @@ class EntityFactory:
         for entity in process_info[Fields.entity_list]:
                 new_process.append(cls.parse(process_id, entity, cache))
                 
-        process_entities = new_process.get_entities() 
-        ids = {entity.name: entity.entity_id for entity in process_entities}
-    
-        for entity in process_entities:
-            for name in entity.get_dependency_names():
-                entity.add_dependency(name, ids[name])
-            
+        cls._resolve_dependencies(new_process)
         return new_process
       
+    @classmethod
+    def compile(cls, entity, position=0):
+        """
+        Builds an entity and its children without registering them in a cache, so the
+        result can be used as the prototype of a ProcessTemplate. Prototype ids are the
+        positions of the entities within their parent.
+        """
+        object_type = ObjectType(entity[Fields.object_type])
+        entity_id = str(position)
+
+        if object_type == ObjectType.job:
+            return cls._parse_job(entity_id, entity)
+        elif object_type == ObjectType.job_group:
+            compiled_entity = JobGroup(entity_id = entity_id, **entity)
+            children = entity[Fields.jobs]
+        elif object_type == ObjectType.process:
+            compiled_entity = Process(entity_id = entity_id, **entity)
+            children = entity[Fields.entity_list]
+        else:
+            raise ValueError("Unrecognized object type")
+
+        for i, child in enumerate(children):
+            compiled_entity.append(cls.compile(child, i))
+
+        cls._resolve_dependencies(compiled_entity)
+        return compiled_entity
+
+    @classmethod
+    def _copy_prototype(cls, parent_id, prototype, cache, entities):
+        entity_id = cls.generate_id(parent_id, prototype.object_type, cache)
+        cache.set_child(entity_id)
+
+        # Entity.__init__ is skipped, the fields of the prototype are already converted
+        entity = prototype.__class__.__new__(prototype.__class__)
+        entity.__dict__.update(prototype.__dict__)
+        entity.entity_id = entity_id
+
+        if isinstance(prototype, Graph):
+            children = [cls._copy_prototype(entity_id, child, cache, entities) for child in prototype.get_entities()]
+            entity.graph_entities = {child.entity_id: child for child in children}
+            entity.graph = prototype.graph.relabel(entity.graph_entities)
+            for child, child_prototype in zip(children, prototype.get_entities()):
+                child.dependencies = {name: entity.graph.ids[prototype.graph.index[dependency_id]]
+                                      for name, dependency_id in child_prototype.dependencies.items()}
+
+        entities.append(entity)
+        return entity
+
+    @classmethod
+    def instantiate(cls, parent_id, prototype, cache):
+        """
+        Creates a new instance of a compiled entity under parent_id. Ids are generated
+        and registered in the cache in the same order as parse.
+        """
+        entities = []
+        entity = cls._copy_prototype(parent_id, prototype, cache, entities)
+        for new_entity in entities:
+            cache.read_state(new_entity.get_metadata())
+        return entity
+
     @classmethod
     def parse(cls, parent_id, entity, cache):
         object_type = ObjectType(entity[Fields.object_type])
@@ -108,14 +173,26 @@ class TriggerFactory:
             modifier_action = DateModifierPolicy(1)
         
         trigger_type = TriggerType[trigger_info[Fields.trigger_type]]
+        misfire = TriggerFactory.misfire_options(trigger_info)
             
         if trigger_type == TriggerType.cron:
-            trigger = CronTrigger(trigger_info[Fields.cron_expression], callback, date_modifier, modifier_action)
+            trigger = CronTrigger(trigger_info[Fields.cron_expression], callback, date_modifier, modifier_action,
+                                  **misfire)
         elif trigger_type == TriggerType.datetime:
-            trigger = DateTrigger(parse(trigger_info[Fields.trigger_time]), callback, date_modifier, modifier_action)
+            trigger = DateTrigger(parse(trigger_info[Fields.trigger_time]), callback, date_modifier, modifier_action,
+                                  **misfire)
         elif trigger_type == TriggerType.instant:
-            trigger = InstantTrigger(callback)
+            trigger = InstantTrigger(callback, **misfire)
         else:
             raise ValueError("Unrecognized trigger type " + trigger_type.name)
             
         return trigger
+
+    @staticmethod
+    def misfire_options(trigger_info) -> dict:
+        misfire = {"misfire_policy": MisfirePolicy[trigger_info.get(Fields.misfire_policy, MisfirePolicy.coalesce.name)]}
+        grace_time = trigger_info.get(Fields.misfire_grace_time)
+        if grace_time is not None:
+            grace_time = datetime.strptime(grace_time, '%H:%M:%S')
+            misfire["misfire_grace_time"] = float(grace_time.hour * 3600 + grace_time.minute * 60 + grace_time.second)
+        return misfire
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from collections import deque
+
+
+class DependencyGraph:
+    """
+    Directed graph of entity dependencies stored as integer indexed adjacency
+    lists. Node i is the entity ids[i]; dependencies[i] holds the indices of the
+    entities it depends on and dependents[i] the indices of the entities that
+    depend on it.
+
+    Graphs are validated on construction: unknown dependencies and cycles raise
+    a ValueError.
+    """
+
+    def __init__(self, ids: tuple = (), dependencies: tuple = ()):
+        self.ids = tuple(ids)
+        self.index = {entity_id: i for i, entity_id in enumerate(self.ids)}
+        self.dependencies = tuple(tuple(predecessors) for predecessors in dependencies) or ((),) * len(self.ids)
+
+        dependents = [[] for _ in self.ids]
+        for i, predecessors in enumerate(self.dependencies):
+            for j in predecessors:
+                dependents[j].append(i)
+        self.dependents = tuple(tuple(successors) for successors in dependents)
+
+        self._check_acyclic()
+
+    @classmethod
+    def from_dict(cls, dict_graph: dict) -> DependencyGraph:
+        """
+        Builds the graph from a dictionary of the form {entity_id: dependency_ids}.
+
+        Parameters
+        ----------
+        dict_graph : dict
+            Dictionary used to generate the graph. Every dependency must be a key
+            of the dictionary.
+
+        Returns
+        -------
+        DependencyGraph
+            The directed graph constructed from the dictionary.
+
+        """
+        index = {entity_id: i for i, entity_id in enumerate(dict_graph)}
+        dependencies = []
+        for entity_id, dependency_ids in dict_graph.items():
+            try:
+                dependencies.append(tuple(index[dependency_id] for dependency_id in dependency_ids))
+            except KeyError as err:
+                raise ValueError("{id} depends on {dependency}, which is not part of the graph"
+                                 .format(id=entity_id, dependency=err.args[0])) from None
+
+        return cls(dict_graph.keys(), dependencies)
+
+    def _check_acyclic(self):
+        in_degree = [len(predecessors) for predecessors in self.dependencies]
+        ready = deque(i for i, degree in enumerate(in_degree) if degree == 0)
+        visited = 0
+        while ready:
+            i = ready.popleft()
+            visited += 1
+            for j in self.dependents[i]:
+                in_degree[j] -= 1
+                if in_degree[j] == 0:
+                    ready.append(j)
+
+        if visited != len(self.ids):
+            cycle = [self.ids[i] for i, degree in enumerate(in_degree) if degree > 0]
+            raise ValueError("Dependency cycle found between " + ", ".join(cycle))
+
+    def relabel(self, ids) -> DependencyGraph:
+        """
+        Returns a graph with the same structure whose nodes are named by ids.
+        """
+        graph = object.__new__(type(self))
+        graph.__dict__.update(self.__dict__)
+        graph.ids = tuple(ids)
+        graph.index = {entity_id: i for i, entity_id in enumerate(graph.ids)}
+        return graph
+
+    def predecessor_counts(self) -> list:
+        return [len(predecessors) for predecessors in self.dependencies]
+
+    def get_dependencies(self, entity_id) -> list:
+        return [self.ids[j] for j in self.dependencies[self.index[entity_id]]]
+
+    def get_dependents(self, entity_id) -> list:
+        return [self.ids[j] for j in self.dependents[self.index[entity_id]]]
+
+    def edges(self):
+        """
+        Yields (entity_id, dependency_id) pairs.
+        """
+        for i, predecessors in enumerate(self.dependencies):
+            for j in predecessors:
+                yield self.ids[i], self.ids[j]
+
+    def to_dict(self) -> dict:
+        return {entity_id: [self.ids[j] for j in self.dependencies[i]] for i, entity_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, entity_id):
+        return entity_id in self.index
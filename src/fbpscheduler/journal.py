@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import os
+import pickle
+import struct
+from datetime import datetime
+from glob import glob, escape
+from os.path import join, basename
+from threading import Thread, Lock
+
+from fbpscheduler.abc import Serializer
+from fbpscheduler.enums import JournalRecord, Fields
+from fbpscheduler.serializers import PickleSerializer
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Every journal record is a serialized (seq, kind, payload) tuple prefixed by its length
+_RECORD = struct.Struct("<I")
+# Snapshots start with a marker and the sequence number of the last record they include
+_SNAPSHOT_MARKER = b"FBPSNAP1"
+_SNAPSHOT = struct.Struct("<Q")
+
+
+def _scan_records(path: str, serializer: Serializer):
+    """
+    Yields the end offset and the (seq, kind, payload) tuple of every complete record of
+    a journal segment. Scanning stops at the first incomplete record, which is what a
+    crash in the middle of a write leaves behind.
+    """
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                if header:
+                    logger.warning("Incomplete record at the end of %s was ignored", path)
+                return
+            length = _RECORD.unpack(header)[0]
+            data = f.read(length)
+            try:
+                if len(data) < length:
+                    raise EOFError
+                seq, kind, payload = serializer.deserialize(data)
+            except (pickle.UnpicklingError, EOFError, ValueError):
+                logger.warning("Incomplete record at the end of %s was ignored", path)
+                return
+            yield f.tell(), (seq, JournalRecord(kind), payload)
+
+
+def read_records(path: str, serializer: Serializer):
+    """
+    Yields the (seq, kind, payload) records of a journal segment, up to the first incomplete one.
+    """
+    for _, record in _scan_records(path, serializer):
+        yield record
+
+
+class StateJournal:
+    """
+    Append-only log of state transitions with periodic snapshots.
+
+    Every change of entity status, parameter update, process creation and process
+    termination is appended to the current journal segment as a small record.
+    A snapshot of the whole state is taken every snapshot_interval records: the state
+    is pickled on the calling thread, the journal moves on to a new segment, and a
+    background thread writes the snapshot to a temporary file, moves it over the
+    previous one and deletes the segments it covers.
+
+    Files are named <name>.snapshot and <name>.<first seq>.journal in the directory
+    the journal is opened in. With sync set, every record is flushed to disk. Records
+    and snapshots are written with the serializer, pickle by default, which must be
+    able to encode process instances and the scheduler.
+    """
+    def __init__(self, snapshot_interval: int = 10000, sync: bool = False, serializer: Serializer | None = None):
+        self.snapshot_interval = snapshot_interval
+        self.sync = sync
+        self.serializer = serializer if serializer is not None else PickleSerializer()
+        self.seq = 0
+        self.directory = None
+        self.name = None
+        self._snapshot_seq = 0
+        self._file = None
+        self._writer = None
+        self._lock = Lock()
+
+    def __getstate__(self):
+        # Only the configuration is kept, the journal is opened again when the state is loaded
+        return {"snapshot_interval": self.snapshot_interval, "sync": self.sync, "serializer": self.serializer}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def snapshot_path(self) -> str:
+        return join(self.directory, self.name + ".snapshot")
+
+    def _segment_path(self, first_seq: int) -> str:
+        return join(self.directory, "{name}.{seq:012d}.journal".format(name=self.name, seq=first_seq))
+
+    def segment_paths(self) -> list:
+        return sorted(glob(join(self.directory, escape(self.name) + ".*.journal")))
+
+    def open(self, directory: str, name: str, seq: int = 0):
+        """
+        Starts a new segment after record seq. Records are only written once the journal is open.
+        """
+        with self._lock:
+            self.directory = directory
+            self.name = name
+            self.seq = seq
+            self._snapshot_seq = seq
+            self._file = self._open_segment(seq + 1)
+
+    def _open_segment(self, first_seq: int):
+        # A segment left by a crash may end with a torn record, records appended after it could not be read back
+        path = self._segment_path(first_seq)
+        segment = open(path, "ab")
+        if segment.tell():
+            length = 0
+            for length, _ in _scan_records(path, self.serializer):
+                pass
+            if length < segment.tell():
+                segment.truncate(length)
+        return segment
+
+    def _append(self, kind: JournalRecord, *payload):
+        with self._lock:
+            if self._file is None:
+                return
+            self.seq += 1
+            data = self.serializer.serialize((self.seq, kind, payload))
+            self._file.write(_RECORD.pack(len(data)) + data)
+            self._file.flush()
+            if self.sync:
+                os.fsync(self._file.fileno())
+
+    def record_state(self, metadata: dict):
+        self._append(JournalRecord.state, metadata[Fields.entity_id.name], metadata.get(Fields.status.name),
+                     metadata.get(Fields.start_time.name), metadata.get(Fields.end_time.name),
+                     metadata.get(Fields.deadline.name))
+
+    def record_parameters(self, node_id: str, parameters: dict, replace: bool = False):
+        self._append(JournalRecord.parameters, node_id, dict(parameters), replace)
+
+    def record_removed(self, node_id: str):
+        self._append(JournalRecord.removed, node_id)
+
+    def record_process(self, process, config_name: str | None = None, fire_date: datetime | None = None):
+        self._append(JournalRecord.process, process, config_name, fire_date)
+
+    def record_ended(self, process_id: str):
+        self._append(JournalRecord.ended, process_id)
+
+    def record_config(self, file_name: str, config: dict, last_unmodified: float):
+        self._append(JournalRecord.config, file_name, config, last_unmodified)
+
+    def record_config_removed(self, file_name: str):
+        self._append(JournalRecord.config_removed, file_name)
+
+    def snapshot_due(self) -> bool:
+        return self._file is not None and self.seq - self._snapshot_seq >= self.snapshot_interval
+
+    def snapshot(self, state, serializer: Serializer | None = None):
+        """
+        Takes a snapshot of state, which must include everything the journal records so far.
+        The snapshot is written with the journal's serializer unless another one is given.
+        """
+        if self._file is None:
+            return
+
+        data = (serializer or self.serializer).serialize(state)
+        with self._lock:
+            seq = self.seq
+            self._file.close()
+            self._file = self._open_segment(seq + 1)
+            self._snapshot_seq = seq
+
+        # Snapshots are written in order, a newer one never gets replaced by an older one
+        if self._writer is not None:
+            self._writer.join()
+        self._writer = Thread(target=self._write_snapshot, args=(seq, data), name="StateJournal", daemon=True)
+        self._writer.start()
+
+    def _write_snapshot(self, seq: int, data: bytes):
+        temp_path = self.snapshot_path + ".tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(_SNAPSHOT_MARKER + _SNAPSHOT.pack(seq))
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.snapshot_path)
+        except OSError as err:
+            logger.error("Could not write the snapshot of %s: %s", self.name, err)
+            return
+
+        # Segments up to the snapshot are no longer needed
+        current_segment = basename(self._segment_path(seq + 1))
+        for path in self.segment_paths():
+            if basename(path) < current_segment:
+                try:
+                    os.remove(path)
+                except OSError as err:
+                    logger.warning("Could not remove journal segment %s: %s", path, err)
+
+    def wait(self):
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+
+    def close(self):
+        self.wait()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @staticmethod
+    def read_snapshot(path: str, serializer: Serializer | None = None):
+        """
+        Returns the sequence number and the state saved in a snapshot, read with the given
+        serializer or pickle. Raises a ValueError for files that are not snapshots, which
+        includes the plain pickles saved before the journal was added.
+        """
+        with open(path, "rb") as f:
+            marker = f.read(len(_SNAPSHOT_MARKER))
+            if marker != _SNAPSHOT_MARKER:
+                raise ValueError("{} is not a snapshot. States saved before the journal was added "
+                                 "cannot be loaded.".format(path))
+            seq = _SNAPSHOT.unpack(f.read(_SNAPSHOT.size))[0]
+            return seq, (serializer or PickleSerializer()).deserialize(f.read())
+
+    def replay(self, directory: str, name: str, after: int):
+        """
+        Yields the records of every segment in directory with a sequence number after the
+        given one, in order. The journal should be opened after the last record is read.
+        """
+        self.directory = directory
+        self.name = name
+        for path in self.segment_paths():
+            for record in read_records(path, self.serializer):
+                if record[0] > after:
+                    yield record
@@ -1,125 +1,430 @@
-from jsonschema import validate, RefResolver, ValidationError, draft7_format_checker
-from json import JSONEncoder
+from jsonschema import RefResolver, Draft7Validator, draft7_format_checker
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+from json import JSONEncoder, load as json_load
+from os.path import join
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+from functools import partial
+from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from pandas import DataFrame
-from collections.abc import Callable
-from fbpscheduler.enums import Fields, Status, RunType, ExceptionHandlerPolicy, DateModifierPolicy, ObjectType, TriggerType
-
-ENUMS = frozenset({"Fields": Fields,
-                   "Status": Status,
-                   "RunType": RunType,
-                   "ExceptionHandlerPolicy": ExceptionHandlerPolicy,
-                   "DateModifierPolicy": DateModifierPolicy,
-                   "ObjectType": ObjectType,
-                   "TriggerType": TriggerType})
-
-def validate_json(json_data, schema, schema_path):
-    """
-    Validating the given json data based on the schema provided.
-    """
-    try:
-        validate(instance=json_data, schema=schema, resolver=RefResolver(schema_path, schema),
-                 format_checker=draft7_format_checker)
-        return True
-    except ValidationError as err:
-        print(err)
-        return False
+from collections import ChainMap, deque
+from importlib import import_module
+from types import FunctionType, BuiltinFunctionType, MethodType
+import logging
+from fbpscheduler.graph import DependencyGraph
+from fbpscheduler.enums import Fields, Status, RunType, ExceptionHandlerPolicy, DateModifierPolicy, ObjectType, \
+    TriggerType, ExecutionBackend, BackpressurePolicy, FileEvent, JournalRecord, MisfirePolicy, \
+    BackoffPolicy
+
+ENUMS = {"Fields": Fields,
+         "Status": Status,
+         "RunType": RunType,
+         "ExceptionHandlerPolicy": ExceptionHandlerPolicy,
+         "DateModifierPolicy": DateModifierPolicy,
+         "ObjectType": ObjectType,
+         "TriggerType": TriggerType,
+         "ExecutionBackend": ExecutionBackend,
+         "BackpressurePolicy": BackpressurePolicy,
+         "FileEvent": FileEvent,
+         "JournalRecord": JournalRecord,
+         "MisfirePolicy": MisfirePolicy,
+         "BackoffPolicy": BackoffPolicy}
+
+
+def _most_relevant(error):
+    """
+    Replaces errors of oneOf/anyOf keywords by an error of the branch that came closest
+    to matching, i.e. the branch with the fewest errors.
+    """
+    while error.context:
+        branches = {}
+        for suberror in error.context:
+            branches.setdefault(suberror.relative_schema_path[0], []).append(suberror)
+        branch = min(branches.values(), key=len)
+        error = max(branch, key=lambda suberror: len(suberror.absolute_path))
+    return error
+
+
+@dataclass(frozen=True)
+class ValidationIssue:
+    message: str
+    path: tuple = ()
+    schema_path: tuple = ()
+
+    def __str__(self):
+        location = "/".join(str(part) for part in self.path)
+        return "{}: {}".format(location, self.message) if location else self.message
+
+
+@dataclass(frozen=True)
+class ValidationResult:
+    """
+    Outcome of validating json data. Truthy when the data is valid.
+    """
+    errors: tuple = ()
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+    def __bool__(self):
+        return self.valid
+
+    def __str__(self):
+        return "; ".join(str(error) for error in self.errors)
+
+    @classmethod
+    def from_errors(cls, errors) -> "ValidationResult":
+        issues = []
+        for error in errors:
+            error = _most_relevant(error)
+            issues.append(ValidationIssue(error.message, tuple(error.absolute_path), tuple(error.absolute_schema_path)))
+        return cls(tuple(issues))
+
+
+def _schema_formats(schema, formats=None) -> set:
+    formats = set() if formats is None else formats
+    if isinstance(schema, dict):
+        if isinstance(schema.get("format"), str):
+            formats.add(schema["format"])
+        for value in schema.values():
+            _schema_formats(value, formats)
+    elif isinstance(schema, list):
+        for value in schema:
+            _schema_formats(value, formats)
+    return formats
+
+
+def _conforms(format_name, value) -> bool:
+    return draft7_format_checker.conforms(value, format_name)
+
+
+class SchemaValidators:
+    """
+    Validators for the process, entity and trigger schemas, compiled once. All schemas
+    are loaded into the resolver store up front, so references between them are
+    resolved without reading any file during validation.
+
+    When fastjsonschema is installed, the schemas are also compiled to python code,
+    which is used to accept valid data quickly. Data it rejects is validated again
+    with jsonschema to collect every error.
+    """
+    schema_names = ("Process", "Entity", "Trigger")
+
+    def __init__(self, schema_dir: str):
+        self.schema_dir = schema_dir
+        base_uri = Path(schema_dir).resolve().as_uri() + "/"
+
+        schemas = {}
+        for name in self.schema_names:
+            with open(join(schema_dir, name + "Schema.json")) as f:
+                schemas[name] = json_load(f)
+        store = {urljoin(base_uri, name + "Schema.json"): schema for name, schema in schemas.items()}
+
+        self._validators = {}
+        for name, schema in schemas.items():
+            Draft7Validator.check_schema(schema)
+            resolver = RefResolver(urljoin(base_uri, name + "Schema.json"), schema, store=store)
+            self._validators[name] = Draft7Validator(schema, resolver=resolver, format_checker=draft7_format_checker)
+
+        self._fast_validators = {}
+        if fastjsonschema is not None:
+            by_file_name = {name + "Schema.json": schema for name, schema in schemas.items()}
+            handlers = {"file": lambda uri: by_file_name[Path(urlparse(uri).path).name]}
+            # Formats are checked with the same checker as the jsonschema validators
+            formats = {format_name: partial(_conforms, format_name)
+                       for format_name in _schema_formats(list(schemas.values()))}
+            for name, schema in schemas.items():
+                self._fast_validators[name] = fastjsonschema.compile(schema, handlers=handlers, formats=formats)
+
+    def validate(self, name: str, json_data) -> ValidationResult:
+        fast_validator = self._fast_validators.get(name)
+        if fast_validator is not None:
+            try:
+                fast_validator(json_data)
+                return ValidationResult()
+            except fastjsonschema.JsonSchemaException:
+                pass
+
+        return ValidationResult.from_errors(self._validators[name].iter_errors(json_data))
+
+    def validate_process(self, json_data) -> ValidationResult:
+        return self.validate("Process", json_data)
+
+    def validate_entity(self, json_data) -> ValidationResult:
+        return self.validate("Entity", json_data)
+
+    def validate_trigger(self, json_data) -> ValidationResult:
+        return self.validate("Trigger", json_data)
+
+
+def validate_json(json_data, schema, schema_path) -> ValidationResult:
+    """
+    Validating the given json data based on the schema provided. Resolves references
+    on every call; SchemaValidators should be preferred for repeated validation.
+    """
+    validator = Draft7Validator(schema, resolver=RefResolver(schema_path, schema),
+                                format_checker=draft7_format_checker)
+    return ValidationResult.from_errors(validator.iter_errors(json_data))
 
 class SchedulerEncoder(JSONEncoder):
+    """
+    JSON encoder for scheduler state, types json does not handle are reduced by encode_value.
+    """
     def default(self, obj):
-        #if isinstance(obj, Scheduler):
-        #attr_dict = obj.__dict__
+        return encode_value(obj)
 
-        #return attr_dict
 
-        # Let the base class default method raise the TypeError
-        return JSONEncoder.default(self, obj)
+def _overrides(cls, method_name) -> bool:
+    # Since python 3.11 every object has a __getstate__, only overrides of it describe the state of an object
+    return getattr(cls, method_name, None) is not getattr(object, method_name, None)
 
-def to_json(value):
-    new_value = value
 
-    if hasattr(value, "__getstate__"):
-        new_value = value.__getstate__()
+# Key of the tag of encoded values. Dictionaries without it are plain data, whatever their keys.
+TYPE_KEY = "__fbp_type__"
 
-    if isinstance(value, datetime):
-        new_value = {"Datetime": value.isoformat()}
+# Modules whose classes and enums are rebuilt from encoded data, extended by applications that store their own types
+TRUSTED_MODULES = ["fbpscheduler"]
 
-    if isinstance(value, Enum):
-        new_value = {"Enum": str(value)}
 
-    if isinstance(value, DataFrame):
-        new_value = {"DataFrame": value.to_dict()}
+def _tagged(tag, encoded):
+    return {TYPE_KEY: tag, "value": encoded}
 
-    if isinstance(value, Callable):
-        new_value = {"Callable": None}
 
-    if isinstance(value, list):
-        new_value = value.copy()
-        for i, subvalue in enumerate(value):
-            new_value[i] = to_json(subvalue)
+def _encode_datetime(value):
+    return _tagged("Datetime", value.isoformat())
 
-    if isinstance(value, dict):
-        new_value = value.copy()
-        for key, subvalue in value.items():
-            new_value[key] = to_json(subvalue)
 
-    return new_value
+def _encode_enum(value):
+    enum_class = type(value)
+    name = enum_class.__name__
+    if ENUMS.get(name) is not enum_class:
+        name = enum_class.__module__ + ":" + enum_class.__qualname__
+    return _tagged("Enum", name + "." + value.name)
 
-def from_json(value):
-    new_value = value
-    if isinstance(value, dict):
-        if "Datetime" in value:
-            new_value = datetime.fromisoformat(value["Datetime"])
-        elif "Enum" in value:
-            name, member = value["Enum"].split(".")
-            new_value = ENUMS[name][member]
-        elif "DataFrame" in value:
-            new_value = DataFrame.from_dict(value["DataFrame"])
-        elif "Callable" in value:
-            new_value = None
+
+def _encode_graph(value):
+    # Edges are (entity index, dependency index) pairs
+    return _tagged("Graph", {"ids": value.ids,
+                             "edges": [(i, j) for i, predecessors in enumerate(value.dependencies) for j in predecessors]})
+
+
+def _encode_dataframe(value):
+    return _tagged("DataFrame", value.to_dict())
+
+
+def _encode_callable(value):
+    return _tagged("Callable", None)
+
+
+def _encode_logger(value):
+    return _tagged("Logger", value.name)
+
+
+def _encode_deque(value):
+    return _tagged("Deque", {"items": list(value), "maxlen": value.maxlen})
+
+
+def _encode_object(value):
+    value_class = type(value)
+    if _overrides(value_class, "__getstate__"):
+        state = value.__getstate__()
+    else:
+        try:
+            state = value.__dict__
+        except AttributeError:
+            raise TypeError("Object of type {} is not JSON serializable".format(value_class.__name__)) from None
+    return _tagged("Object", {"type": value_class.__module__ + ":" + value_class.__qualname__, "state": state})
+
+
+# Encoders by type. Types that are not listed are resolved once through their MRO and added.
+# Subclasses of the json types are reduced to the base type, so str enums are encoded as their value.
+_ENCODERS = {str: str.__str__,
+             int: int.__int__,
+             float: float.__float__,
+             bool: bool,
+             type(None): lambda value: value,
+             list: list,
+             tuple: list,
+             dict: dict,
+             ChainMap: dict,
+             deque: _encode_deque,
+             datetime: _encode_datetime,
+             Enum: _encode_enum,
+             DependencyGraph: _encode_graph,
+             logging.Logger: _encode_logger,
+             FunctionType: _encode_callable,
+             BuiltinFunctionType: _encode_callable,
+             MethodType: _encode_callable,
+             partial: _encode_callable,
+             type: _encode_callable}
+
+
+def _find_encoder(value_class):
+    for base in value_class.__mro__[:-1]:
+        if base in _ENCODERS:
+            encoder = _ENCODERS[base]
+            break
+    else:
+        if value_class.__name__ == "DataFrame" and value_class.__module__.startswith("pandas"):
+            encoder = _encode_dataframe
+        elif any("__call__" in vars(base) for base in value_class.__mro__[:-1]):
+            encoder = _encode_callable
         else:
-            new_value = value.copy()
-            for key, subvalue in value.items():
-                new_value[key] = from_json(subvalue)
+            encoder = _encode_object
+    _ENCODERS[value_class] = encoder
+    return encoder
 
-    if isinstance(value, list):
-        new_value = value.copy()
-        for i, subvalue in enumerate(value):
-            new_value[i] = from_json(subvalue)
 
-    if hasattr(value, "__setstate__"):
-        new_value = type(value).__setstate__(value)
+def encode_value(value):
+    """
+    Reduces a value json cannot encode to a tagged dictionary. Nested values are left
+    as they are, so the result is passed back to the encoder rather than copied.
+    """
+    encoder = _ENCODERS.get(type(value))
+    if encoder is None:
+        encoder = _find_encoder(type(value))
+    return encoder(value)
 
-    return new_value
 
+def _decode_enum(name):
+    enum_name, member = name.rsplit(".", 1)
+    enum_class = _import_qualname(enum_name) if ":" in enum_name else ENUMS[enum_name]
+    if not (isinstance(enum_class, type) and issubclass(enum_class, Enum)):
+        raise TypeError("{} is not an enum".format(enum_name))
+    return enum_class[member]
 
 
+def _decode_graph(encoded):
+    dependencies = [[] for _ in encoded["ids"]]
+    for i, j in encoded["edges"]:
+        dependencies[i].append(j)
+    return DependencyGraph(encoded["ids"], dependencies)
 
-def getstate_type_handler(func):
-    def wrapper(*args, **kwargs):
 
-        attr_dict = func(*args, **kwargs)
+def _decode_dataframe(encoded):
+    from pandas import DataFrame
+    return DataFrame.from_dict(encoded)
 
-        for key, value in attr_dict.items():
-            attr_dict[key] = to_json(value)
 
+def _decode_object(encoded):
+    value_class = _import_qualname(encoded["type"])
+    if not isinstance(value_class, type):
+        raise TypeError("{} is not a class".format(encoded["type"]))
+    value = value_class.__new__(value_class)
+    if _overrides(value_class, "__setstate__"):
+        value.__setstate__(encoded["state"])
+    else:
+        value.__dict__.update(encoded["state"])
+    return value
 
 
-        return attr_dict
+def _import_qualname(name):
+    module_name, qualname = name.split(":")
+    if not any(module_name == trusted or module_name.startswith(trusted + ".") for trusted in TRUSTED_MODULES):
+        raise ValueError("Types of module {} are not decoded, add it to TRUSTED_MODULES".format(module_name))
+    value = import_module(module_name)
+    for attribute in qualname.split("."):
+        value = getattr(value, attribute)
+    return value
 
-    return wrapper
 
-def setstate_type_handler(func):
-    def wrapper(self, attr_dict):
+_DECODERS = {"Datetime": datetime.fromisoformat,
+             "Enum": _decode_enum,
+             "Graph": _decode_graph,
+             "DataFrame": _decode_dataframe,
+             "Callable": lambda encoded: None,
+             "Logger": logging.getLogger,
+             "Deque": lambda encoded: deque(encoded["items"], encoded["maxlen"]),
+             "Object": _decode_object}
 
-        for key, value in attr_dict.items():
-            attr_dict[key] = from_json(value)
 
+def decode_value(value: dict):
+    """
+    Restores a tagged dictionary produced by encode_value. Other dictionaries are returned
+    as they are. Used as the object hook of the json decoder, which calls it on the
+    innermost dictionaries first, and on the extension types of the msgpack serializer.
 
-        func(self, attr_dict)
+    Objects and enums are rebuilt from the class named in the data, which must belong to
+    one of the TRUSTED_MODULES.
+    """
+    tag = value.get(TYPE_KEY)
+    if tag is not None and len(value) == 2 and "value" in value:
+        decoder = _DECODERS.get(tag)
+        if decoder is not None:
+            return decoder(value["value"])
+    return value
+
+
+def to_json(value):
+    """
+    Converts a value to dictionaries, lists and json scalars in a single pass.
+    """
+    value_class = type(value)
+    if value_class is str or value_class is int or value_class is float or value_class is bool or value is None:
+        return value
+    if value_class is dict:
+        return {key: to_json(subvalue) for key, subvalue in value.items()}
+    if value_class is list or value_class is tuple:
+        return [to_json(subvalue) for subvalue in value]
+    return to_json(encode_value(value))
+
+
+def from_json(value):
+    """
+    Restores the values converted by to_json. Dictionaries and lists are decoded in place.
+    """
+    value_class = type(value)
+    if value_class is dict:
+        for key, subvalue in value.items():
+            value[key] = from_json(subvalue)
+        return decode_value(value)
+    if value_class is list:
+        for i, subvalue in enumerate(value):
+            value[i] = from_json(subvalue)
+    return value
+
+
+# Encoded chunks are written in blocks of about this many characters
+_WRITE_SIZE = 64 * 1024
+
+
+def dump_json(value, fp, indent=None):
+    """
+    Writes value to the file object as json. The output is written in chunks as it is
+    encoded, so the encoded state is never held in memory as a whole. This uses the
+    pure python encoder, which is several times slower than encoding to a string.
+    """
+    separators = (",", ":") if indent is None else None
+    chunks = []
+    size = 0
+    for chunk in SchedulerEncoder(indent=indent, separators=separators).iterencode(value):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= _WRITE_SIZE:
+            fp.write("".join(chunks))
+            chunks.clear()
+            size = 0
+    fp.write("".join(chunks))
 
-        return None
+
+def load_json(fp):
+    return json_load(fp, object_hook=decode_value)
+
+
+def getstate_type_handler(func):
+    def wrapper(*args, **kwargs):
+        return {key: to_json(value) for key, value in func(*args, **kwargs).items()}
 
     return wrapper
 
+def setstate_type_handler(func):
+    def wrapper(self, attr_dict):
+        func(self, {key: from_json(value) for key, value in attr_dict.items()})
+        return None
+
+    return wrapper
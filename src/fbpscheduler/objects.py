@@ -1,28 +1,39 @@
 from __future__ import annotations
 
-import pandas as pd 
-from fbpscheduler.parse import parse_arguments, fill_string, flat_args
+from fbpscheduler.parse import parse_arguments, fill_string, flat_args, list_args
 from fbpscheduler.cache import Cache
-from fbpscheduler.enums import Status, RunType, ExceptionHandlerPolicy
-from fbpscheduler.evaluators import python_evaluator, cmd_evaluator
+from fbpscheduler.enums import Status, RunType, ExceptionHandlerPolicy, ExecutionBackend
+from fbpscheduler.evaluators import python_evaluator, cmd_evaluator, exec_evaluator
 from fbpscheduler.abc import Entity
+from fbpscheduler.graph import DependencyGraph
 from fbpscheduler.marshalling import getstate_type_handler, setstate_type_handler
+from fbpscheduler.resources import hold_resources
 from dataclasses import dataclass
+from collections import deque
+from shlex import split, join
 
 from datetime import datetime
+import asyncio as aio
 import logging
 logger = logging.getLogger(__name__)
 
 
 def status_handler(func):
     async def wrapper_status_handler(self, cache: Cache, inherited_deadline: datetime = None):
-        self._start(inherited_deadline)
-        cache.read_state(self.get_metadata())
+        if self.status == Status.initialized:
+            self.resolve_deadline(inherited_deadline)
+        async with hold_resources(self.resources):
+            # The entity may have been terminated by a deadline while it waited for resources
+            if self.status == Status.failure:
+                return self.status.value
 
-        status_code = await func(self, cache)
-        status_code = self._end(status_code)
-        
-        cache.read_state(self.get_metadata())
+            self._start(inherited_deadline)
+            cache.read_state(self.get_metadata())
+
+            status_code = await func(self, cache)
+            status_code = self._end(status_code)
+
+            cache.read_state(self.get_metadata())
         return status_code
         
     return wrapper_status_handler
@@ -41,42 +52,36 @@ class Graph:
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.graph_entities = {}
-        self.graph = pd.DataFrame()
+        self.graph = DependencyGraph()
         
     def append(self, entity: Entity):
         self.graph_entities[entity.entity_id] = entity
     
     @staticmethod
-    def dictionary_to_graph(dict_graph: dict) -> pd.DataFrame:
+    def dictionary_to_graph(dict_graph: dict) -> DependencyGraph:
         """
-        Converts a dictionary to a directed graph stored as a matrix
+        Converts a dictionary to a directed graph stored as adjacency lists
     
         Parameters
         ----------
-        dict_graph : str
-            Dictionary used to generate the matrix
+        dict_graph : dict
+            Dictionary of the form {entity_id: dependency_ids} used to generate the graph
     
         Returns
         -------
-        DataFrame
-            A dataframe that contains the directed graph constructed from the dictionary.
+        DependencyGraph
+            The directed graph constructed from the dictionary. Raises a ValueError
+            on missing dependencies or cycles.
     
         """
-        edges = [(source, target) for source, targets in dict_graph.items() for target in targets]
-        df = pd.DataFrame(edges)
-        if df.empty:
-            return df # Return the empty dataframe if no edges
-        adj_matrix = pd.crosstab(df[0], df[1]).rename_axis(None).rename_axis(None, axis=1)
-        return adj_matrix
+        return DependencyGraph.from_dict(dict_graph)
         
     def generate_graph(self, apply: bool = True):
         dict_graph = {}
         for key, job in self.graph_entities.items():
             dict_graph.update(job.dependency_to_dict())
         new_graph = self.dictionary_to_graph(dict_graph)
-        idx = self.graph_entities.keys()
-        
-        new_graph = new_graph.reindex(index = idx, columns = idx, fill_value=0)
+
         if apply:
             self.graph = new_graph
             return None
@@ -101,17 +106,26 @@ class Job(Entity):
     success_code: str | float | None = 0
     parameter_delimiter: str | None = "; "
     exception_handling: ExceptionHandlerPolicy | str = ExceptionHandlerPolicy.kill
+    execution_backend: ExecutionBackend | str = ExecutionBackend.thread
+    output_file: str | None = None
+    environment: dict | None = None
+    working_directory: str | None = None
     message: str = ""
 
+    # Only the last message_limit characters of the job's output are kept in message
+    message_limit = 64 * 1024
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.run_type = RunType[self.run_type]
+        if type(self.execution_backend) == str:
+            self.execution_backend = ExecutionBackend[self.execution_backend]
 
     @status_handler
     async def execute(self, cache = None) -> bool:
         params = {}
         if cache is not None:
-            params = cache.get_parameters(self.entity_id)
+            params = cache.parameter_scope(self.entity_id)
         arguments = parse_arguments(self.parameters, params)
         flat_arguments = flat_args(arguments, self.parameter_delimiter)
         command = fill_string(self.command, params)
@@ -119,10 +133,28 @@ class Job(Entity):
         if self.run_type == RunType.python:
             module = fill_string(self.module, params)
             self.log("Executing: " + command + " " + flat_arguments + " from " + module)
-            self.return_code, logging_info = await python_evaluator(module, command, arguments, cache, self.timeout)
-        elif self.run_type == RunType.cmd:
-            self.log("Executing: " + command + " " + flat_arguments)
-            self.return_code, logging_info = await cmd_evaluator(command, flat_arguments, self.timeout)
+            self.return_code, logging_info = await python_evaluator(module, command, arguments, cache, self.timeout,
+                                                                    self.execution_backend)
+        elif self.run_type in (RunType.cmd, RunType.exec):
+            output_path = fill_string(self.output_file, params) if self.output_file else None
+            cwd = fill_string(self.working_directory, params) if self.working_directory else None
+            env = None
+            if self.environment is not None:
+                env = {key: fill_string(str(value), params) for key, value in self.environment.items()}
+
+            if self.run_type == RunType.cmd:
+                self.log("Executing: " + command + " " + flat_arguments)
+                self.return_code, output = await cmd_evaluator(command, flat_arguments, self.timeout,
+                                                               self._log_output, output_path, self.message_limit,
+                                                               env, cwd)
+            else:
+                argv = split(command) + (list_args(arguments) if isinstance(arguments, dict)
+                                         else [str(value) for value in arguments])
+                self.log("Executing: " + join(argv))
+                self.return_code, output = await exec_evaluator(argv, self.timeout, self._log_output, output_path,
+                                                                self.message_limit, env, cwd)
+            self._store_message(output)
+            logging_info = "{name} exited with return code {code}".format(name=self.name, code=self.return_code)
         else:
             raise ValueError("Unrecognized run type")
         
@@ -135,8 +167,15 @@ class Job(Entity):
                 
         return 1 - execution_result       
 
+    def _store_message(self, message):
+        self.message = (self.message + message)[-self.message_limit:]
+
+    def _log_output(self, line):
+        if self.status != Status.re_running:
+            logger.info("%s: %s", self.name, line)
+
     def log(self, message, warning=False):
-        self.message += message
+        self._store_message(message)
         if self.status != Status.re_running:
             if warning:
                 logger.warning(message)
@@ -161,29 +200,67 @@ class Job(Entity):
 class JobGroup(Graph, Entity):
 
     exception_handling: ExceptionHandlerPolicy | str = ExceptionHandlerPolicy.repeat
-                          
+    concurrency: int | None = None
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
     @status_handler
     async def execute(self, cache: Cache):
-        if self.status == Status.running:
+        return await self._execute_graph(cache)
+
+    async def _execute_graph(self, cache: Cache):
+        """
+        Runs the children of the group as a DAG. Every child whose dependencies
+        have finished is started as its own task, up to the concurrency cap of
+        the group, and its dependents are released as soon as it finishes.
+        No new children are started once a child has ended unsuccessfully.
+        """
+        # The factory builds the graph with the group, it is only rebuilt if children were added since
+        if self.status == Status.running and len(self.graph) != len(self.graph_entities):
             self.generate_graph()
-        graph_sum = 1
+
+        in_degree = dict.fromkeys(self.graph_entities, 0)
+        for entity_id, dependency_id in self.graph.edges():
+            if self.graph_entities[dependency_id].status != Status.finished:
+                in_degree[entity_id] += 1
+
+        ready = deque(entity_id for entity_id, degree in in_degree.items()
+                      if degree == 0 and self.graph_entities[entity_id].status != Status.finished)
+        running = {}
         execution_status_code = 0
 
-        while graph_sum != 0:
-            graph_sum = self.graph.to_numpy().sum()
-            for index, row in self.graph.iterrows():
-                if (row.sum() == 0) and (self.graph_entities[index].status != Status.finished):
-                    child_status_code = await self.graph_entities[index].execute(cache, self.deadline)
+        try:
+            while ready or running:
+                while ready and execution_status_code == 0 and \
+                        (self.concurrency is None or len(running) < self.concurrency):
+                    entity_id = ready.popleft()
+                    task = aio.create_task(self.graph_entities[entity_id].execute(cache, self.deadline))
+                    running[task] = entity_id
+
+                if not running:
+                    break
+
+                done, _ = await aio.wait(running.keys(), return_when=aio.FIRST_COMPLETED)
+                for task in done:
+                    entity_id = running.pop(task)
+                    child_status_code = task.result()
                     if child_status_code == 0:
-                        self.graph[index] = 0
+                        for dependent_id in self.graph.get_dependents(entity_id):
+                            in_degree[dependent_id] -= 1
+                            if in_degree[dependent_id] == 0:
+                                ready.append(dependent_id)
                     else:
                         execution_status_code = max(execution_status_code, child_status_code)
-
-            if execution_status_code != 0:
-                return execution_status_code
+        finally:
+            # Left over when a child raised or the group was cancelled. The children are given the
+            # chance to clean up before they are marked as failed, so that they can be run again
+            for task in running:
+                task.cancel()
+            if running:
+                await aio.gather(*running, return_exceptions=True)
+                for entity_id in running.values():
+                    self.graph_entities[entity_id].terminate(cache)
 
         return execution_status_code
 
@@ -206,13 +283,16 @@ class JobGroup(Graph, Entity):
 @dataclass(init=False)
 class Process(JobGroup):
 
+    # Processes of a higher priority class are started first when several are ready
+    priority: int = 0
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
     
     @status_handler
     async def execute(self, cache: Cache):
-        super().execute(self, cache, self.deadline)
+        return await self._execute_graph(cache)
 
         
             
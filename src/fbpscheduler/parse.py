@@ -1,5 +1,6 @@
 from __future__ import annotations
 import re
+from functools import lru_cache
 
 
 def flat_args(arguments: dict | list, delimiter="; ") -> str:
@@ -55,6 +56,19 @@ def list_args(arguments: dict) -> list:
     return new_list
     
 
+_template_pattern = re.compile("#(.*?)#")
+
+
+@lru_cache(maxsize=4096)
+def split_template(target_string: str) -> tuple:
+    """
+    Splits a parameterized string into literal text and parameter keys. Keys are at
+    the odd positions of the returned tuple. Results are cached, as the same command
+    templates are filled on every run.
+    """
+    return tuple(_template_pattern.split(target_string))
+
+
 def fill_string(target_string: str, params: dict, partial_fill = False) -> str:
     """
     Fill in parameterized values within the target string with the params
@@ -83,18 +97,20 @@ def fill_string(target_string: str, params: dict, partial_fill = False) -> str:
         print("Target is not of instance str")
         return target_string
 
-    pattern = "#(.*?)#"
-    substring_match = re.search(pattern, target_string)
-    try:
-        while substring_match is not None:
-            substring = substring_match.group(1)
-            target_string = target_string.replace(substring_match.group(0), str(params[substring]))
-            substring_match = re.search(pattern, target_string)
-    except KeyError:
-        if not partial_fill:
-            print("Could not find parameter " + substring + " in passed parameters.")
+    parts = split_template(target_string)
+    if len(parts) == 1:
+        return target_string
+
+    filled = list(parts)
+    for i in range(1, len(parts), 2):
+        try:
+            filled[i] = str(params[parts[i]])
+        except KeyError:
+            filled[i] = "#" + parts[i] + "#"
+            if not partial_fill:
+                print("Could not find parameter " + parts[i] + " in passed parameters.")
 
-    return target_string
+    return "".join(filled)
 
 
 def parse_arguments(arguments: dict | list, params: dict) -> dict:
@@ -120,24 +136,21 @@ def parse_arguments(arguments: dict | list, params: dict) -> dict:
     """
     
     args_copy = arguments.copy()
-    pattern = "#(.*?)#"
     if isinstance(arguments, dict):
         for key, value in arguments.items():
             if not isinstance(value, str):
                 continue
-            substring_match = re.search(pattern, value)
-            if substring_match is not None:
-                substring = substring_match.group(1)
-                args_copy[key] = params[substring]
+            parts = split_template(value)
+            if len(parts) > 1:
+                args_copy[key] = params[parts[1]]
 
     if isinstance(arguments, list):
         for i, value in enumerate(arguments):
             if not isinstance(value, str):
                 continue
-            substring_match = re.search(pattern, value)
-            if substring_match is not None:
-                substring = substring_match.group(1)
-                args_copy[i] = params[substring]
+            parts = split_template(value)
+            if len(parts) > 1:
+                args_copy[i] = params[parts[1]]
             
     return args_copy
 
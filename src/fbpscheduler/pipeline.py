@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from queue import Queue, Empty, Full
+from threading import Thread, Lock
+from time import monotonic
+
+from fbpscheduler.enums import BackpressurePolicy
+
+import logging
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class EventPipeline:
+    """
+    Bounded queue of events consumed by a background thread. Events are grouped
+    into batches of at most batch_size events, or of whatever arrived within
+    batch_window seconds of the first event of the batch, and every batch is
+    passed to the dispatcher in a single call.
+
+    When the queue is full, the backpressure policy decides whether emitting
+    blocks until there is room, drops the oldest queued event or drops the new one.
+    """
+    def __init__(self, batch_size: int = 100, batch_window: float = 0.5, max_queue_size: int = 10000,
+                 backpressure: BackpressurePolicy | str = BackpressurePolicy.block):
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_queue_size = max_queue_size
+        if type(backpressure) == str:
+            backpressure = BackpressurePolicy[backpressure]
+        self.backpressure = backpressure
+        self.dropped = 0
+        self._dispatcher = None
+        self._queue = None
+        self._thread = None
+        self._lock = Lock()
+
+    def __getstate__(self):
+        # Only the configuration is kept, the worker is started again on the first event
+        state = self.__dict__.copy()
+        for key in ("_dispatcher", "_queue", "_thread", "_lock"):
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._dispatcher = None
+        self._queue = None
+        self._thread = None
+        self._lock = Lock()
+
+    def start(self, dispatcher: Callable[[list], None]):
+        with self._lock:
+            self._dispatcher = dispatcher
+            if self._thread is None:
+                self._queue = Queue(self.max_queue_size)
+                self._thread = Thread(target=self._run, name="EventPipeline", daemon=True)
+                self._thread.start()
+
+    def emit(self, event):
+        if self.backpressure == BackpressurePolicy.block:
+            self._queue.put(event)
+            return
+
+        try:
+            self._queue.put_nowait(event)
+        except Full:
+            self.dropped += 1
+            if self.backpressure == BackpressurePolicy.drop_oldest:
+                try:
+                    self._queue.get_nowait()
+                except Empty:
+                    pass
+                self._queue.put_nowait(event)
+
+    def queue_depth(self) -> int:
+        return 0 if self._queue is None else self._queue.qsize()
+
+    def close(self, timeout: float | None = None):
+        """
+        Dispatches the events that are still queued and stops the worker thread.
+        """
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        stopped = False
+        while not stopped:
+            event = self._queue.get()
+            if event is _STOP:
+                break
+
+            batch = [event]
+            batch_deadline = monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = batch_deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = self._queue.get(timeout=remaining)
+                except Empty:
+                    break
+                if event is _STOP:
+                    stopped = True
+                    break
+                batch.append(event)
+
+            try:
+                self._dispatcher(batch)
+            except Exception:
+                logger.exception("Handler raised an exception while dispatching %d events", len(batch))
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio as aio
+import multiprocessing
+import traceback
+from collections import deque
+from contextvars import ContextVar
+from os import cpu_count
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Pool serving the python jobs of the current task, set by the scheduler running them
+_pool = ContextVar("process_pool", default=None)
+
+
+def _worker_main(connection):
+    """
+    Entry point of a worker process. Receives (path, command, arguments) tasks until
+    None is sent and replies with a (return code, message) tuple for each task.
+    """
+    from fbpscheduler.evaluators import module_cache
+    from fbpscheduler.enums import Fields
+
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        path, command, arguments = task
+        try:
+            lib = module_cache.load(path)
+            getattr(lib, command)(**arguments, **{Fields.cache.value: None})
+            result = (0, "Function {} ran successfully".format(command))
+        except Exception:
+            result = (1, traceback.format_exc())
+        connection.send(result)
+
+
+class _Worker:
+    def __init__(self, context):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_connection,), daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class ProcessPool:
+    """
+    Pool of worker processes for CPU bound python jobs. Workers are started on demand
+    up to the pool size. Unlike a ProcessPoolExecutor, a worker whose job exceeds its
+    time limit is killed and replaced, so runaway jobs stop at their deadline.
+
+    Arguments of jobs run in the pool must be picklable and jobs do not receive a
+    reference to the scheduler cache. Workers are started with the forkserver method
+    where it is available and with spawn otherwise, so they do not inherit the threads
+    and open files of the scheduler. As with any spawned process, scripts that start a
+    scheduler need an if __name__ == "__main__" guard.
+    """
+    def __init__(self, size: int | None = None):
+        self.size = size or cpu_count() or 1
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self._context = multiprocessing.get_context(start_method)
+        self._idle = []
+        self._waiters = deque()
+        self._started = 0
+
+    def __getstate__(self):
+        return {"size": self.size}
+
+    def __setstate__(self, state):
+        self.__init__(state["size"])
+
+    async def _acquire(self) -> _Worker:
+        if self._idle:
+            return self._idle.pop()
+        if self._started < self.size:
+            self._started += 1
+            return _Worker(self._context)
+
+        waiter = aio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        return await waiter
+
+    def _release(self, worker: _Worker):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(worker)
+                return
+        self._idle.append(worker)
+
+    @staticmethod
+    async def _receive(connection):
+        """
+        Waits for the reply of a worker on the event loop. Loops that cannot watch pipes
+        wait in a thread of their own, never in the default executor used by thread jobs.
+        """
+        loop = aio.get_running_loop()
+        readable = loop.create_future()
+        try:
+            loop.add_reader(connection.fileno(), lambda: readable.done() or readable.set_result(None))
+        except NotImplementedError:
+            return await aio.to_thread(connection.recv)
+        try:
+            await readable
+        finally:
+            loop.remove_reader(connection.fileno())
+        return connection.recv()
+
+    async def run(self, path: str, command: str, arguments: dict,
+                  timeout: float | int | None = None) -> tuple[int, str]:
+        worker = await self._acquire()
+        replace = True
+        try:
+            worker.connection.send((path, command, arguments))
+            result = await aio.wait_for(self._receive(worker.connection), timeout=timeout)
+            replace = False
+        except aio.TimeoutError:
+            logger.warning("Function %s exceeded its time limit. Worker process was killed.", command)
+            result = (1, "Function {} timed out after {} seconds".format(command, timeout))
+        except (EOFError, OSError):
+            result = (1, "Worker process running function {} exited unexpectedly".format(command))
+        except Exception:
+            replace = False
+            result = (1, traceback.format_exc())
+        finally:
+            if replace:
+                worker.kill()
+                worker = _Worker(self._context)
+            self._release(worker)
+
+        return result
+
+    def shutdown(self):
+        for worker in self._idle:
+            worker.stop()
+        self._idle = []
+        self._started = 0
+
+    def activate(self):
+        """
+        Makes this pool run the python jobs of the current task and the tasks it starts.
+        """
+        _pool.set(self)
+
+
+_process_pool = None
+
+
+def configure_process_pool(size: int | None = None) -> ProcessPool:
+    """
+    Replaces the shared process pool, used by jobs run outside of a scheduler, with a
+    pool of the given size. Defaults to the number of CPUs.
+    """
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown()
+    _process_pool = ProcessPool(size)
+    return _process_pool
+
+
+def get_process_pool() -> ProcessPool:
+    pool = _pool.get()
+    if pool is not None:
+        return pool
+    if _process_pool is None:
+        return configure_process_pool()
+    return _process_pool
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from datetime import datetime, date
+
+
+def expected_deadline(entity, now: datetime | None = None) -> datetime:
+    """
+    Returns the deadline of an entity, or the deadline it would get if it started now
+    when it has not started yet. Entities without a deadline come last.
+    """
+    deadline = entity.deadline
+    if isinstance(deadline, datetime):
+        return deadline
+    if not deadline:
+        return datetime.max
+    timeout = datetime.combine(date.min, datetime.strptime(deadline, '%H:%M:%S').time()) - datetime.min
+    return (now or datetime.now()) + timeout
+
+
+class PriorityRunQueue:
+    """
+    Processes ordered by priority class, highest first, then by earliest deadline, then
+    by insertion. The queue is a binary heap with the position of every process indexed
+    by its entity id, so processes are inserted, looked up and removed by id in O(log n).
+
+    Keys are computed when a process is inserted; update moves a process whose
+    deadline or priority changed since.
+    """
+    def __init__(self):
+        self._heap = []
+        self._index = {}
+        self._seq = 0
+
+    def __getstate__(self):
+        return {"entries": [(key, process) for key, process in self._heap], "seq": self._seq}
+
+    def __setstate__(self, state):
+        # Keys come back as lists from formats without tuples
+        self._heap = [[tuple(key), process] for key, process in state["entries"]]
+        self._index = {entry[1].entity_id: position for position, entry in enumerate(self._heap)}
+        self._seq = state["seq"]
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __bool__(self):
+        return bool(self._heap)
+
+    def __contains__(self, process) -> bool:
+        return process.entity_id in self._index
+
+    def __iter__(self):
+        # Heap order, use ordered() for priority order
+        return iter([entry[1] for entry in self._heap])
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, self.ordered())
+
+    def _key(self, process) -> tuple:
+        self._seq += 1
+        return -process.priority, expected_deadline(process), self._seq
+
+    def get(self, entity_id: str):
+        position = self._index.get(entity_id)
+        return None if position is None else self._heap[position][1]
+
+    def push(self, process):
+        """
+        Inserts the process, or moves it if it is already queued.
+        """
+        if process.entity_id in self._index:
+            self.update(process)
+            return
+        self._heap.append([self._key(process), process])
+        self._index[process.entity_id] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def update(self, process):
+        position = self._index[process.entity_id]
+        self._heap[position][0] = self._key(process)
+        self._sift_up(position)
+        self._sift_down(self._index[process.entity_id])
+
+    def peek(self):
+        return self._heap[0][1] if self._heap else None
+
+    def pop(self):
+        if not self._heap:
+            raise IndexError("pop from an empty run queue")
+        return self._remove_at(0)
+
+    def remove(self, process):
+        position = self._index.get(process.entity_id)
+        if position is None:
+            raise ValueError("{} is not in the run queue".format(process.entity_id))
+        return self._remove_at(position)
+
+    def discard(self, process):
+        if process.entity_id in self._index:
+            self.remove(process)
+
+    def ordered(self) -> list:
+        return [entry[1] for entry in sorted(self._heap, key=lambda entry: entry[0])]
+
+    def _remove_at(self, position: int):
+        heap = self._heap
+        process = heap[position][1]
+        del self._index[process.entity_id]
+        last = heap.pop()
+        if position < len(heap):
+            heap[position] = last
+            self._index[last[1].entity_id] = position
+            self._sift_up(position)
+            self._sift_down(self._index[last[1].entity_id])
+        return process
+
+    def _sift_up(self, position: int):
+        heap = self._heap
+        entry = heap[position]
+        while position > 0:
+            parent = (position - 1) >> 1
+            if heap[parent][0] <= entry[0]:
+                break
+            heap[position] = heap[parent]
+            self._index[heap[position][1].entity_id] = position
+            position = parent
+        heap[position] = entry
+        self._index[entry[1].entity_id] = position
+
+    def _sift_down(self, position: int):
+        heap = self._heap
+        size = len(heap)
+        entry = heap[position]
+        while True:
+            child = 2 * position + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1][0] < heap[child][0]:
+                child += 1
+            if entry[0] <= heap[child][0]:
+                break
+            heap[position] = heap[child]
+            self._index[heap[position][1].entity_id] = position
+            position = child
+        heap[position] = entry
+        self._index[entry[1].entity_id] = position
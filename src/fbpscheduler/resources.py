@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import asyncio as aio
+import heapq
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Resource manager of the scheduler running the current task
+_manager = ContextVar("resource_manager", default=None)
+# Names of the pools held by the current task and the tasks that started it
+_held = ContextVar("held_resources", default=frozenset())
+# Order of the requests of the current task, the negated priority and the deadline of its process
+_rank = ContextVar("resource_rank", default=(0, datetime.max))
+
+
+class ResourcePool:
+    """
+    A named number of slots. Requests are served in the order of the run queue, by the
+    priority then the deadline of the process making them, and first come, first served
+    among equals. A request that does not fit waits, and requests behind it wait too,
+    so large requests are not starved by a stream of small ones.
+    """
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self.available = size
+        # Heap of (rank, seq, count, future)
+        self._waiters = []
+        self._seq = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def in_use(self) -> int:
+        return self.size - self.available
+
+    async def acquire(self, count: int = 1):
+        if count > self.size:
+            raise ValueError("{} slots requested from resource pool {} of size {}".format(count, self.name, self.size))
+        if not self._waiters and count <= self.available:
+            self.available -= count
+            return
+
+        waiter = aio.get_running_loop().create_future()
+        self._seq += 1
+        entry = (_rank.get(), self._seq, count, waiter)
+        heapq.heappush(self._waiters, entry)
+        # A request ranked ahead of the waiting ones takes the free slots
+        self._grant()
+        try:
+            await waiter
+        except aio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slots were granted as the task was cancelled
+                self.release(count)
+            else:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                self._grant()
+            raise
+
+    def release(self, count: int = 1):
+        self.available += count
+        self._grant()
+
+    def _grant(self):
+        while self._waiters:
+            _, _, count, waiter = self._waiters[0]
+            # Cancelled requests are removed by their task once it runs again
+            if waiter.done():
+                heapq.heappop(self._waiters)
+                continue
+            if count > self.available:
+                break
+            heapq.heappop(self._waiters)
+            self.available -= count
+            waiter.set_result(None)
+
+
+class ResourceManager:
+    """
+    The resource pools of a scheduler, declared as {name: size}, for instance
+    {"warehouse_db": 4, "cpu": 16}.
+
+    Entities take the slots they declare for as long as they run. Pools held by a group
+    cover the entities in it, which would otherwise deadlock on a pool their group holds.
+    Pools are acquired one at a time in name order, and entities in a group may only
+    request pools that sort after the pools of the groups around them, so every task
+    takes its pools in name order and two entities never wait on each other's pools.
+    """
+    def __init__(self, pools: dict | None = None):
+        self.pools = {name: ResourcePool(name, size) for name, size in (pools or {}).items()}
+
+    def __getstate__(self):
+        # Slots in use and waiting requests belong to the running event loop
+        return {"pools": {name: pool.size for name, pool in self.pools.items()}}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def queue_depth(self) -> dict:
+        return {name: pool.queue_depth for name, pool in self.pools.items()}
+
+    def check(self, resources: dict):
+        """
+        Raises a ValueError if a request names a pool that does not exist or asks for
+        more slots than a pool has.
+        """
+        for name, count in resources.items():
+            pool = self.pools.get(name)
+            if pool is None:
+                raise ValueError("Unknown resource pool " + name)
+            if count > pool.size:
+                raise ValueError("{} slots requested from resource pool {} of size {}".format(count, name, pool.size))
+
+    @asynccontextmanager
+    async def hold(self, resources: dict | None):
+        held = _held.get()
+        requested = sorted((name, count) for name, count in (resources or {}).items() if name not in held)
+        if held and requested and requested[0][0] < max(held):
+            raise ValueError("Resource pool {} is requested while holding pool {}, nested entities must request "
+                             "pools that sort after those of their groups".format(requested[0][0], max(held)))
+        acquired = []
+        try:
+            for name, count in requested:
+                await self.pools[name].acquire(count)
+                acquired.append((name, count))
+            token = _held.set(held.union(name for name, _ in requested))
+            try:
+                yield
+            finally:
+                _held.reset(token)
+        finally:
+            for name, count in reversed(acquired):
+                self.pools[name].release(count)
+
+    def activate(self, rank: tuple | None = None):
+        """
+        Makes this manager serve the resource requests of the current task and the tasks it starts.
+        rank is the (negated priority, deadline) of the process the requests are made for.
+        """
+        _manager.set(self)
+        if rank is not None:
+            _rank.set(rank)
+
+
+def check_resource_order(entity, held: frozenset = frozenset()):
+    """
+    Raises a ValueError if an entity requests a resource pool that sorts before a pool
+    held by one of its groups, which could deadlock with an entity that takes the same
+    pools the other way around.
+    """
+    requested = {name for name in (entity.resources or {}) if name not in held}
+    if held and requested and min(requested) < max(held):
+        raise ValueError("{} requests resource pool {} inside a group holding pool {}, nested entities must "
+                         "request pools that sort after those of their groups".format(entity.name, min(requested),
+                                                                                     max(held)))
+    held = held.union(requested)
+    for child in getattr(entity, "graph_entities", {}).values():
+        check_resource_order(child, held)
+
+
+@asynccontextmanager
+async def hold_resources(resources: dict | None):
+    """
+    Holds the slots of resources from the manager of the current task. Does nothing
+    outside of a scheduler with resource pools.
+    """
+    manager = _manager.get()
+    if manager is None or not resources:
+        yield
+        return
+    async with manager.hold(resources):
+        yield
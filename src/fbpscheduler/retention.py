@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import json
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from fbpscheduler.enums import Status
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def approximate_size(value) -> int:
+    """
+    Rough estimate of the memory held by a value and the containers nested in it.
+    """
+    size = 0
+    pending = [value]
+    seen = set()
+    while pending:
+        value = pending.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        size += sys.getsizeof(value)
+        if isinstance(value, dict):
+            pending.extend(value.keys())
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            pending.extend(value)
+    return size
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    Limits on the finished process instances kept in the cache. Instances are evicted,
+    oldest first, when there are more than max_instances of a process name, when they
+    ended more than max_age ago, or while the cache holds more than max_bytes of
+    finished instances. Running instances are never evicted.
+
+    Evicted instances are appended to archive_path as JSON lines when it is set.
+    """
+    max_instances: int | None = None
+    max_age: timedelta | float | None = None
+    max_bytes: int | None = None
+    archive_path: str | None = None
+    _sizes: dict = field(default_factory=dict, repr=False)
+
+    def _ended_instances(self, cache) -> list:
+        instances = []
+        for process_id in cache._children:
+            metadata = cache.metadata.get(process_id)
+            if metadata is not None and metadata.get("status") in (Status.finished, Status.failure):
+                instances.append(process_id)
+        return instances
+
+    def _instance_size(self, cache, process_id) -> int:
+        size = self._sizes.get(process_id)
+        if size is None:
+            size = sum(approximate_size(cache.metadata.get(node_id)) + approximate_size(cache.parameters.get(node_id))
+                       for node_id in cache.get_descendant_ids(process_id))
+            self._sizes[process_id] = size
+        return size
+
+    def select(self, cache, now: datetime | None = None) -> list:
+        """
+        Returns the ids of the process instances to evict, oldest first.
+        """
+        instances = self._ended_instances(cache)
+        evicted = set()
+
+        if self.max_instances is not None:
+            by_name = {}
+            for process_id in cache._children:
+                metadata = cache.metadata.get(process_id)
+                if metadata is not None:
+                    by_name.setdefault(metadata.get("name"), []).append(process_id)
+            ended = set(instances)
+            for process_ids in by_name.values():
+                excess = len(process_ids) - self.max_instances
+                for process_id in process_ids:
+                    if excess <= 0:
+                        break
+                    if process_id in ended:
+                        evicted.add(process_id)
+                        excess -= 1
+
+        if self.max_age is not None:
+            max_age = self.max_age if isinstance(self.max_age, timedelta) else timedelta(seconds=self.max_age)
+            cutoff = (now or datetime.now()) - max_age
+            for process_id in instances:
+                end_time = cache.metadata[process_id].get("end_time")
+                if end_time is not None and end_time < cutoff:
+                    evicted.add(process_id)
+
+        if self.max_bytes is not None:
+            retained = [process_id for process_id in instances if process_id not in evicted]
+            total = sum(self._instance_size(cache, process_id) for process_id in retained)
+            for process_id in retained:
+                if total <= self.max_bytes:
+                    break
+                total -= self._instance_size(cache, process_id)
+                evicted.add(process_id)
+
+        return [process_id for process_id in instances if process_id in evicted]
+
+    def archive(self, cache, process_ids):
+        with open(self.archive_path, "a") as f:
+            for process_id in process_ids:
+                node_ids = cache.get_descendant_ids(process_id)
+                record = {"id": process_id,
+                          "metadata": {node_id: cache.metadata.get(node_id) for node_id in node_ids},
+                          "parameters": {node_id: cache.parameters.get(node_id) for node_id in node_ids}}
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def apply(self, cache, now: datetime | None = None) -> list:
+        """
+        Evicts the selected process instances from the cache and returns their ids.
+        """
+        process_ids = self.select(cache, now)
+        if not process_ids:
+            return []
+
+        if self.archive_path is not None:
+            try:
+                self.archive(cache, process_ids)
+            except OSError as err:
+                logger.warning("Could not archive evicted processes: %s", err)
+
+        for process_id in process_ids:
+            cache.remove_child(process_id)
+            self._sizes.pop(process_id, None)
+        logger.info("Evicted %d process instances from the cache", len(process_ids))
+        return process_ids
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from datetime import datetime
+from heapq import heappush, heappop
+from itertools import count
+
+from fbpscheduler.enums import BackoffPolicy, Status
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RetrySettings:
+    """
+    Backoff of an entity that ends unsuccessfully. Entities without retry settings of
+    their own use the settings of their parent, and processes use these defaults.
+    """
+    policy: BackoffPolicy = BackoffPolicy.fixed
+    delay: float = 60.0
+    max_delay: float | None = None
+
+    def inherit(self, entity) -> RetrySettings:
+        return RetrySettings(entity.retry_policy if entity.retry_policy is not None else self.policy,
+                             entity.retry_delay if entity.retry_delay is not None else self.delay,
+                             entity.retry_max_delay if entity.retry_max_delay is not None else self.max_delay)
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Returns the seconds to wait before retry number attempt, counted from 1.
+        """
+        if self.policy == BackoffPolicy.fixed:
+            wait = self.delay
+        else:
+            # The exponent is capped so that long failing entities do not overflow
+            wait = self.delay * 2 ** min(max(attempt - 1, 0), 64)
+        if self.max_delay is not None:
+            wait = min(wait, self.max_delay)
+        if self.policy == BackoffPolicy.jittered:
+            wait = random.uniform(0, wait)
+        return wait
+
+
+def retry_delay(entity, settings: RetrySettings = RetrySettings()) -> float:
+    """
+    Returns the seconds to wait before an unsuccessful entity is run again. Groups wait
+    for the longest backoff of their unsuccessful children, so that every child gets
+    the wait it is configured with.
+    """
+    settings = settings.inherit(entity)
+    delays = [retry_delay(child, settings) for child in getattr(entity, "graph_entities", {}).values()
+              if child.status == Status.unsuccessful]
+    if delays:
+        return max(delays)
+    return settings.backoff(entity.retry_count)
+
+
+class RetryQueue:
+    """
+    Processes waiting to be run again after ending unsuccessfully, in a min-heap on the
+    date of their retry. Removed processes are left in the heap and skipped when they
+    come up.
+    """
+    def __init__(self):
+        self._heap = []
+        self._pending = {}
+        self._seq = count()
+
+    def __getstate__(self):
+        # Retries are scheduled again from the retry counts of the processes when the scheduler is loaded
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, process) -> bool:
+        return process.entity_id in self._pending
+
+    def push(self, process, retry_date: datetime):
+        seq = next(self._seq)
+        self._pending[process.entity_id] = seq
+        heappush(self._heap, (retry_date, seq, process))
+
+    def discard(self, process):
+        self._pending.pop(process.entity_id, None)
+
+    def _drop_stale(self):
+        while self._heap and self._pending.get(self._heap[0][2].entity_id) != self._heap[0][1]:
+            heappop(self._heap)
+
+    def next_date(self) -> datetime | None:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> list:
+        due = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, process = heappop(self._heap)
+            del self._pending[process.entity_id]
+            due.append(process)
+            self._drop_stale()
+        return due
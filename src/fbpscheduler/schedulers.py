@@ -7,10 +7,9 @@ Created on Mon May 10 10:23:28 2021
 
 from __future__ import annotations
 
-from os import listdir
-from os.path import isfile, join, getmtime
+from os.path import join, getmtime, dirname
 
-from datetime import datetime
+from datetime import datetime, timedelta
 import asyncio as aio
 from collections.abc import Callable
 from functools import partial
@@ -18,46 +17,79 @@ from functools import partial
 from fbpscheduler import schema_dir
 from fbpscheduler.abc import Scheduler
 from fbpscheduler.cache import Cache
-from fbpscheduler.factory import EntityFactory, TriggerFactory
+from fbpscheduler.factory import TriggerFactory
+from fbpscheduler.templates import ProcessTemplate
 from json import load as json_load, dump as json_dump, JSONDecodeError
-from fbpscheduler.marshalling import validate_json
-from fbpscheduler.enums import Fields, Status
+from fbpscheduler.marshalling import SchemaValidators
+from fbpscheduler.enums import Fields, Status, FileEvent, JournalRecord
 from fbpscheduler.configstore import ConfigStore
-
-from pickle import dump, load
+from fbpscheduler.pool import ProcessPool
+from fbpscheduler.archive import ProcessArchive, ProcessSummary
+from fbpscheduler.journal import StateJournal
+from fbpscheduler.retry import RetryQueue, RetrySettings, retry_delay
+from fbpscheduler.resources import ResourceManager
+from fbpscheduler.queues import PriorityRunQueue, expected_deadline
+from fbpscheduler.timers import TriggerService
+from fbpscheduler.watcher import create_watcher
 
 import logging
 
 
+def _iter_entities(process):
+    # The process first, then its descendants, parents before their children
+    pending = [process]
+    while pending:
+        entity = pending.pop(0)
+        yield entity
+        if hasattr(entity, "get_entities"):
+            pending.extend(entity.get_entities())
 
 
 class LocalScheduler(Scheduler):
 
     def __init__(self, read_path, save_path=None, date_modifier=None,
                  termination_handler=None, cache_handler=None, entity_handler=None,
-                 session_parameters=None, logger=None):
+                 session_parameters=None, logger=None, process_pool_size=None, event_pipeline=None,
+                 retention_policy=None, archive_size=1000, archive_path=None, journal=None,
+                 handler_serializer=None, trigger_service=None, retry_settings=None, poll_interval=3,
+                 resource_pools=None):
         sch_id = "S-{date}".format(date=datetime.now().strftime("%Y%m%d%H%M%S"))
         super().__init__(sch_id)
         self.read_path = read_path
         self.save_path = save_path
-        self.cache = Cache(self.id, session_parameters, cache_handler, entity_handler)
+        self.journal = journal if journal is not None else StateJournal()
+        self.cache = Cache(self.id, session_parameters, cache_handler, entity_handler, event_pipeline, self.journal,
+                           handler_serializer)
 
         self.logger = logger
         if not self.logger:
             self.logger = logging.getLogger(__name__)
             self.logger.setLevel(logging.DEBUG)
 
-        with open(join(schema_dir, "ProcessSchema.json")) as f:
-            self.process_schema = json_load(f)
-            self.schema_path = "file:/{0}/".format(schema_dir).replace("\\", "/")
+        self.validators = SchemaValidators(schema_dir)
 
         self.process_configs = {}
+        self.trigger_service = trigger_service if trigger_service is not None else TriggerService()
+        self.poll_interval = poll_interval
+        self._watcher = None
+        self._wakeup = None
+        self._deadline_timers = {}
         self.date_modifier = date_modifier
         self.termination_handler = termination_handler
-
-        self.initiated_processes = []
-        self.run_queue = []
-        self.ended_processes = []
+        self.retention_policy = retention_policy
+
+        # Processes triggered since the last dispatch, and processes that are running or waiting for a retry
+        self.initiated_processes = PriorityRunQueue()
+        self.run_queue = PriorityRunQueue()
+        self.retry_settings = retry_settings if retry_settings is not None else RetrySettings()
+        self.retry_queue = RetryQueue()
+        self.resources = ResourceManager(resource_pools)
+        self.process_pool = ProcessPool(process_pool_size)
+        if archive_path is None and save_path is not None:
+            archive_path = join(save_path, self.id + ".archive")
+        self.ended_processes = ProcessArchive(archive_size, archive_path)
+        if save_path is not None:
+            self.journal.open(save_path, self.id)
 
     def __getstate__(self):
         attr_dict = self.__dict__.copy()
@@ -67,106 +99,260 @@ class LocalScheduler(Scheduler):
                                                last_unmodified=value.last_unmodified,
                                                trigger=value.trigger)
         attr_dict["process_configs"] = serialized_dict
+        attr_dict["_watcher"] = None
+        # Events and timers belong to the running event loop, they are set up again when the scheduler starts
+        attr_dict["_wakeup"] = None
+        attr_dict["_deadline_timers"] = {}
+        # Compiled validators are rebuilt when the scheduler is loaded
+        del attr_dict["validators"]
         return attr_dict
 
     def __setstate__(self, state):
         self.__dict__ = state
+        self.validators = SchemaValidators(schema_dir)
+        # Formats other than pickle do not keep callables, the trigger callbacks are made again from the configs
+        for file_name, config_store in list(self.process_configs.items()):
+            try:
+                template = ProcessTemplate(config_store.config)
+            except ValueError as err:
+                self.logger.warning("Invalid configuration for %s: %s", file_name, err)
+                del self.process_configs[file_name]
+                continue
+            config_store.trigger.set_callback(partial(self.trigger_callback, template=template, config_name=file_name),
+                                              self.date_modifier)
+        # Schedulers saved before the run queues were priority queues hold lists
+        for name in ("initiated_processes", "run_queue"):
+            if isinstance(state[name], list):
+                queue = PriorityRunQueue()
+                for process in state[name]:
+                    queue.push(process)
+                setattr(self, name, queue)
 
     def _check_insert(self, file_name):
         if file_name not in self.process_configs:
             return True
-        elif getmtime(join(self.read_path, file_name)) != self.process_configs[file_name].last_unmodified:
-            return True
-        else:
+        try:
+            return getmtime(join(self.read_path, file_name)) != self.process_configs[file_name].last_unmodified
+        except FileNotFoundError:
             return False
 
-    async def _file_check(self):
-        process_file_names = [f for f in listdir(self.read_path) if isfile(join(self.read_path, f))]
-        for file_name in process_file_names:
-            if self._check_insert(file_name):
-                try:
-                    with open(join(self.read_path, file_name)) as g:
-                        process_json = json_load(g)
-                except JSONDecodeError:
-                    self.logger.warning("Invalid JSON file for %s. Json could not be decoded.", file_name)
-                    continue
-                except PermissionError:
-                    self.logger.warning("Could not access %s. Will try again later.", file_name)
-                    continue
-
-                if validate_json(process_json, self.process_schema, self.schema_path):
-                    if file_name in self.process_configs.keys():
-                        await self.process_configs[file_name].cancel_trigger()
-                    callback = partial(self.trigger_callback, process_json=process_json)
-                    trigger = TriggerFactory.create_trigger(process_json[Fields.trigger], callback, self.date_modifier)
-                    self.process_configs[file_name] = ConfigStore(config=process_json,
-                                                                  last_unmodified=getmtime(join(self.read_path, file_name)),
-                                                                  trigger=trigger)
-                    self.process_configs[file_name].activate_trigger()
-
-                    self.logger.info("Inserted process %s", file_name)
+    async def _insert_config(self, file_name):
+        try:
+            with open(join(self.read_path, file_name)) as g:
+                process_json = json_load(g)
+        except JSONDecodeError:
+            self.logger.warning("Invalid JSON file for %s. Json could not be decoded.", file_name)
+            return
+        except PermissionError:
+            self.logger.warning("Could not access %s. Will try again later.", file_name)
+            return
+        except FileNotFoundError:
+            return
+
+        validation = self.validators.validate_process(process_json)
+        if validation:
+            last_unmodified = getmtime(join(self.read_path, file_name))
+            try:
+                config_store = self._create_config_store(file_name, process_json, last_unmodified)
+            except ValueError as err:
+                self.logger.warning("Invalid configuration for %s: %s", file_name, err)
+                return
 
-                else:
-                    self.logger.warning("Invalid configuration for %s", file_name)
-                    continue
+            if file_name in self.process_configs.keys():
+                self.process_configs[file_name].cancel_trigger(self.trigger_service)
+            self.process_configs[file_name] = config_store
+            self.journal.record_config(file_name, process_json, last_unmodified)
+            config_store.activate_trigger(self.trigger_service)
 
-            try:
-                error = self.process_configs[file_name].trigger_task.exception()
-                if error is not None:
-                    self.logger.critical("Exception raised: %s", str(error))
-            except aio.exceptions.InvalidStateError:
-                pass
+            self.logger.info("Inserted process %s", file_name)
 
+        else:
+            self.logger.warning("Invalid configuration for %s: %s", file_name, validation)
+
+    def _create_config_store(self, file_name, process_json, last_unmodified):
+        template = ProcessTemplate(process_json)
+        self.resources.check(template.required_resources())
+        callback = partial(self.trigger_callback, template=template, config_name=file_name)
+        trigger = TriggerFactory.create_trigger(process_json[Fields.trigger], callback, self.date_modifier)
+        return ConfigStore(config=process_json, last_unmodified=last_unmodified, trigger=trigger)
+
+    async def _remove_config(self, file_name):
+        config_store = self.process_configs.pop(file_name, None)
+        if config_store is not None:
+            config_store.cancel_trigger(self.trigger_service)
+            self.journal.record_config_removed(file_name)
+            self.logger.info("Removed process %s", file_name)
 
-    def trigger_callback(self, process_json):
-        process = EntityFactory.parse(self.id, process_json, self.cache)
+    async def _file_check(self):
+        if self._watcher is None:
+            self._watcher = create_watcher(self.read_path)
+
+        for event, file_name in self._watcher.changes():
+            if event == FileEvent.deleted:
+                await self._remove_config(file_name)
+            elif self._check_insert(file_name):
+                await self._insert_config(file_name)
+
+
+    def trigger_callback(self, template, config_name=None):
+        process = template.instantiate(self.id, self.cache)
+        # The fire date lets a replay move the trigger on, so the process is not triggered twice
+        config_store = self.process_configs.get(config_name)
+        fire_date = config_store.trigger.trigger_date if config_store is not None else None
+        self.journal.record_process(process, config_name, fire_date)
         self.logger.info("{Name} has been triggered. Process {Id} has been generated".format(Name=process.name,
                                                                                   Id=process.entity_id))
-        self.initiated_processes.append(process)
+        self.initiated_processes.push(process)
+        self._wake()
+        return process
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
 
     async def _condition_check(self):
-        for process in self.initiated_processes:
+        """
+        Moves the processes initiated since the last check to the run queue and returns
+        them by priority, then earliest deadline.
+        """
+        queued = []
+        while self.initiated_processes:
+            process = self.initiated_processes.pop()
             if process.status != Status.finished:
-                #print(process.entity_id + " passed conditions check")
-                self.run_queue.append(process)
-        self.initiated_processes = list(filter(lambda x: x not in self.run_queue, self.initiated_processes))
+                self.run_queue.push(process)
+                queued.append(process)
+        return queued
 
     def _terminate_process(self, process):
+        self.retry_queue.discard(process)
+        timer = self._deadline_timers.pop(process.entity_id, None)
+        if timer is not None:
+            timer.cancel()
         process.terminate(self.cache)
         self.ended_processes.append(process)
         self.run_queue.remove(process)
+        self.journal.record_ended(process.entity_id)
         if self.termination_handler is not None:
                 self.termination_handler(process)
+        if self.retention_policy is not None:
+            self.retention_policy.apply(self.cache)
 
 
     async def _execute_process(self, process):
-        self.save_state()
+        self.resources.activate((-process.priority, expected_deadline(process)))
+        self.process_pool.activate()
         await process.execute(self.cache)
 
+        # The deadline may have ended the process while it ran
+        if process not in self.run_queue:
+            return None
         if process.status in [Status.finished, Status.failure]:
             self._terminate_process(process)
+        elif process.status == Status.unsuccessful:
+            self._schedule_retry(process)
+        self._wake()
  
         return None
 
-    async def _execute(self):
-        for process in self.run_queue:
-            if process.deadline <= datetime.now():
-                self.logger.warning("Process {} exceeded specified deadline".format(process.entity_id))
-                self._terminate_process(process)
+    def _start_process(self, process):
+        # The deadline runs from here, processes waiting for resources may reach it before they start
+        if process.status == Status.initialized:
+            process.resolve_deadline()
+        self._set_deadline_timer(process)
+        aio.create_task(self._execute_process(process))
+
+    def _set_deadline_timer(self, process):
+        # The deadline is a time of day string until the process starts
+        if not isinstance(process.deadline, datetime) or process.entity_id in self._deadline_timers:
+            return
+        delay = max((process.deadline - datetime.now()).total_seconds(), 0)
+        self._deadline_timers[process.entity_id] = aio.get_running_loop().call_later(delay, self._deadline_passed,
+                                                                                     process)
+
+    def _deadline_passed(self, process):
+        self._deadline_timers.pop(process.entity_id, None)
+        if process in self.run_queue:
+            self.logger.warning("Process {} exceeded specified deadline".format(process.entity_id))
+            self._terminate_process(process)
+
+    def _schedule_retry(self, process):
+        delay = retry_delay(process, self.retry_settings)
+        self.retry_queue.push(process, datetime.now() + timedelta(seconds=delay))
+        aio.get_running_loop().call_later(delay, self._wake)
+        self.logger.info("%s will be retried in %.1f seconds", process.entity_id, delay)
+
+    async def _execute(self, processes):
+        """
+        Starts the given processes from the run queue, and the retries that are due.
+        """
+        now = datetime.now()
+        for process in processes:
+            if isinstance(process.deadline, datetime) and process.deadline <= now:
+                self._deadline_passed(process)
+            elif process.status == Status.unsuccessful:
+                # Processes restored from a snapshot have no retry scheduled yet
+                if process not in self.retry_queue:
+                    self._schedule_retry(process)
+            elif process.status not in [Status.running, Status.re_running]:
+                self.logger.info("Executing %s", process.entity_id)
+                self._start_process(process)
             else:
-                if process.status not in [Status.running, Status.re_running]:
-                    if process.status != Status.unsuccessful:
-                        self.logger.info("Executing %s", process.entity_id)
-                    else:
-                        await aio.sleep(60)
-                    aio.create_task(self._execute_process(process))
+                self._set_deadline_timer(process)
+
+        # Retries wait in their own queue, they never hold up the processes above
+        for process in self.retry_queue.pop_due(now):
+            self.logger.info("Retrying %s", process.entity_id)
+            self._start_process(process)
+
+    async def _dispatch(self):
+        """
+        Starts processes as soon as they are triggered or due for a retry. The task sleeps
+        until one of them wakes it up.
+        """
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self._execute(await self._condition_check())
+            if self.journal.snapshot_due():
+                self.save_state()
+
+    async def _watch_configs(self):
+        """
+        Inserts and removes process configs as files change in read_path. Inotify events
+        wake the task up; without them, the directory is scanned every poll_interval seconds.
+        """
+        if self._watcher is None:
+            self._watcher = create_watcher(self.read_path)
+        fd = self._watcher.fileno()
+        if fd is None:
+            while True:
+                await self._file_check()
+                await aio.sleep(self.poll_interval)
+
+        loop = aio.get_running_loop()
+        changed = aio.Event()
+        loop.add_reader(fd, changed.set)
+        try:
+            while True:
+                await self._file_check()
+                await changed.wait()
+                changed.clear()
+        finally:
+            loop.remove_reader(fd)
 
     async def _start_loop(self):
-        while True:
-            await self._file_check()
-            await self._condition_check()
-            await self._execute()
-            await aio.sleep(3)
+        self._wakeup = aio.Event()
+        self.trigger_service.start()
+        # Triggers of configs restored with the scheduler are registered again
+        for config_store in self.process_configs.values():
+            if config_store.trigger_handle is None:
+                config_store.activate_trigger(self.trigger_service)
+
+        self.save_state()
+        # Processes restored with the scheduler are started, or get their deadlines and retries back
+        await self._execute(self.run_queue.ordered())
+        self._wake()
+        await aio.gather(self._dispatch(), self._watch_configs())
 
     def run(self):
         loop = aio.get_event_loop()
@@ -174,17 +360,99 @@ class LocalScheduler(Scheduler):
         if not loop.is_running():
             loop.run_forever()
 
-    def save_state(self):
+    def save_state(self, serializer=None):
+        """
+        Writes a snapshot of the scheduler to save_path/<id>.snapshot in the background.
+        Changes made after the snapshot are kept in the journal until the next one.
+        The snapshot is written with the journal's serializer unless another one is given.
+        """
         if self.save_path is not None:
-            with open(join(self.save_path, self.id + ".pkl"), "wb") as f:
-                dump(self, f)
+            self.journal.snapshot(self, serializer)
 
     @classmethod
-    def load_state(cls, path):
-        with open(path, "rb") as f:
-            scheduler = load(f)
+    def load_state(cls, path, serializer=None):
+        """
+        Loads a scheduler from a snapshot written by save_state and replays the journal
+        records written after it. The serializer must be the one the snapshot was written
+        with, pickle by default. States saved before the journal was added are rejected
+        with a ValueError.
+        """
+        seq, scheduler = StateJournal.read_snapshot(path, serializer)
+        # Formats other than pickle do not keep shared references
+        scheduler.cache.journal = scheduler.journal
+        directory = dirname(path)
+        seq = scheduler._replay(scheduler.journal.replay(directory, scheduler.id, seq), seq)
+        scheduler.journal.open(directory, scheduler.id, seq)
         return scheduler
 
+    def _replay(self, records, seq):
+        """
+        Applies journal records to the state loaded from a snapshot. Returns the sequence
+        number of the last record applied.
+        """
+        entities = {}
+        for process in list(self.initiated_processes) + list(self.run_queue):
+            entities.update((entity.entity_id, entity) for entity in _iter_entities(process))
+
+        for seq, kind, payload in records:
+            if kind == JournalRecord.state:
+                entity_id, status, start_time, end_time, deadline = payload
+                entity = entities.get(entity_id)
+                if entity is not None:
+                    entity.status, entity.start_time, entity.end_time, entity.deadline = \
+                        status, start_time, end_time, deadline
+                    self.cache.read_state(entity.get_metadata(), run_handlers=False)
+                elif entity_id in self.cache.metadata:
+                    self.cache.metadata[entity_id].update(status=status, start_time=start_time,
+                                                          end_time=end_time, deadline=deadline)
+
+            elif kind == JournalRecord.parameters:
+                node_id, parameters, replace = payload
+                if node_id not in self.cache.parameters:
+                    continue
+                if replace:
+                    self.cache.set_parameters(node_id, parameters)
+                else:
+                    self.cache.update_parameters(node_id, parameters)
+
+            elif kind == JournalRecord.removed:
+                self.cache.remove_child(payload[0])
+
+            elif kind == JournalRecord.process:
+                process, config_name, fire_date = payload
+                for entity in _iter_entities(process):
+                    if self.cache.get_child(entity.entity_id) is None:
+                        self.cache.set_child(entity.entity_id)
+                    # Ids given out after the snapshot are not given out again
+                    parent = self.cache.get_child(entity.entity_id.rpartition(self.cache.delim_str)[0])
+                    if parent is not None:
+                        parent.count_child(entity.entity_id)
+                    entities[entity.entity_id] = entity
+                    self.cache.read_state(entity.get_metadata(), run_handlers=False)
+                self.initiated_processes.push(process)
+                if config_name in self.process_configs and fire_date is not None:
+                    self.process_configs[config_name].trigger.mark_fired(fire_date)
+
+            elif kind == JournalRecord.ended:
+                process = entities.get(payload[0])
+                if process is None:
+                    continue
+                self.initiated_processes.discard(process)
+                self.run_queue.discard(process)
+                self.ended_processes.summaries.append(ProcessSummary.from_process(process))
+
+            elif kind == JournalRecord.config:
+                file_name, config, last_unmodified = payload
+                try:
+                    self.process_configs[file_name] = self._create_config_store(file_name, config, last_unmodified)
+                except ValueError as err:
+                    self.logger.warning("Invalid configuration for %s: %s", file_name, err)
+
+            elif kind == JournalRecord.config_removed:
+                self.process_configs.pop(payload[0], None)
+
+        return seq
+
     def set_date_modifier(self, modifier: Callable[[datetime], datetime]):
         if callable(modifier):
             self.date_modifier = modifier
@@ -1 +1,25 @@
+from fbpscheduler.abc import Serializer
+from fbpscheduler.serializers.pickle_serializer import PickleSerializer
+from fbpscheduler.serializers.json_serializer import JsonSerializer
+from fbpscheduler.serializers.msgpack_serializer import MsgpackSerializer, msgpack
 
+# Serializers by name. msgpack is only registered when it is installed.
+serializers = {"pickle": PickleSerializer,
+               "json": JsonSerializer}
+if msgpack is not None:
+    serializers["msgpack"] = MsgpackSerializer
+
+
+def register_serializer(name: str, serializer_class: type):
+    if not issubclass(serializer_class, Serializer):
+        raise TypeError(serializer_class.__name__ + " is not a Serializer")
+    serializers[name] = serializer_class
+
+
+def get_serializer(name: str, **kwargs) -> Serializer:
+    try:
+        serializer_class = serializers[name]
+    except KeyError:
+        raise ValueError("Unknown serializer {name}. Available serializers: {names}"
+                         .format(name=name, names=", ".join(serializers))) from None
+    return serializer_class(**kwargs)
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from json import dumps, loads
+
+from fbpscheduler.abc import Serializer
+from fbpscheduler.marshalling import SchedulerEncoder, decode_value
+
+@dataclass(frozen=True)
+class JsonSerializer(Serializer):
+    """
+    Encodes values with SchedulerEncoder, so datetimes, enums, graphs and objects are
+    tagged and restored when decoded. Enums with a str value are encoded as their value.
+    """
+    indent: int | None = None
+
+    def serialize(self, obj) -> bytes:
+        separators = (",", ":") if self.indent is None else None
+        return dumps(obj, cls=SchedulerEncoder, indent=self.indent, separators=separators).encode("utf-8")
+
+    def deserialize(self, serialized: bytes):
+        return loads(serialized, object_hook=decode_value)
@@ -0,0 +1,120 @@
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from fbpscheduler.abc import Serializer
+from fbpscheduler.marshalling import TYPE_KEY, encode_value, decode_value
+
+# Tagged values are msgpack extension types rather than maps, so plain maps are decoded without a hook
+_EXT_CODES = {"Datetime": 1, "Enum": 2, "Graph": 3, "DataFrame": 4, "Callable": 5, "Logger": 6, "Deque": 7,
+              "Object": 8}
+_EXT_TAGS = {code: tag for tag, code in _EXT_CODES.items()}
+# Tags whose value is a string, stored as its utf-8 bytes without a nested message
+_STRING_CODES = {_EXT_CODES["Datetime"], _EXT_CODES["Enum"], _EXT_CODES["Logger"]}
+# Objects whose state is a dictionary list their type and field names once per message.
+# Later objects with the same fields refer to them by the order the types were listed in.
+_CLASS_DEFINITION = 9
+_CLASS_REFERENCE = 10
+
+
+class _Packer:
+    def __init__(self):
+        self.classes = {}
+        self.defined = 0
+        # Enum members are encoded once per message
+        self.enums = {}
+
+    def pack(self, obj) -> bytes:
+        # With strict types, subclasses of the msgpack types also go through encode_value
+        return msgpack.packb(obj, default=self.default, strict_types=True, use_bin_type=True)
+
+    def default(self, value):
+        # Datetimes and enums make up most tagged values, they skip the tagged dictionary
+        if type(value) is datetime:
+            return msgpack.ExtType(_EXT_CODES["Datetime"], value.isoformat().encode("utf-8"))
+        if isinstance(value, Enum):
+            ext = self.enums.get(value)
+            if ext is None:
+                ext = self.enums[value] = self._default(value)
+            return ext
+        return self._default(value)
+
+    def _default(self, value):
+        encoded = encode_value(value)
+        if type(encoded) is not dict or len(encoded) != 2 or encoded.get(TYPE_KEY) not in _EXT_CODES:
+            return encoded
+        code, payload = _EXT_CODES[encoded[TYPE_KEY]], encoded["value"]
+        if code in _STRING_CODES:
+            return msgpack.ExtType(code, payload.encode("utf-8"))
+        if code != _EXT_CODES["Object"] or type(payload["state"]) is not dict:
+            return msgpack.ExtType(code, self.pack(payload))
+
+        fields = tuple(payload["state"])
+        key = (payload["type"], fields)
+        index = self.classes.get(key)
+        if index is not None:
+            return msgpack.ExtType(_CLASS_REFERENCE, self.pack([index, list(payload["state"].values())]))
+        data = self.pack([payload["type"], fields, list(payload["state"].values())])
+        # Types are numbered once their fields are packed, in the order the unpacker sees them
+        self.classes[key] = self.defined
+        self.defined += 1
+        return msgpack.ExtType(_CLASS_DEFINITION, data)
+
+
+class _Unpacker:
+    def __init__(self):
+        self.classes = []
+        # Enum members are decoded once per message
+        self.enums = {}
+
+    def unpack(self, data: bytes):
+        return msgpack.unpackb(data, ext_hook=self.ext_hook, raw=False, strict_map_key=False)
+
+    def ext_hook(self, code: int, data: bytes):
+        if code == _EXT_CODES["Enum"]:
+            member = self.enums.get(data)
+            if member is None:
+                member = self.enums[data] = decode_value({TYPE_KEY: "Enum", "value": data.decode("utf-8")})
+            return member
+        if code in _STRING_CODES:
+            return decode_value({TYPE_KEY: _EXT_TAGS[code], "value": data.decode("utf-8")})
+
+        value = self.unpack(data)
+        if code == _CLASS_DEFINITION:
+            type_name, fields, values = value
+            self.classes.append((type_name, fields))
+            return self._decode_object(type_name, fields, values)
+        if code == _CLASS_REFERENCE:
+            index, values = value
+            return self._decode_object(*self.classes[index], values)
+        return decode_value({TYPE_KEY: _EXT_TAGS[code], "value": value})
+
+    @staticmethod
+    def _decode_object(type_name, fields, values):
+        return decode_value({TYPE_KEY: "Object", "value": {"type": type_name, "state": dict(zip(fields, values))}})
+
+
+@dataclass(frozen=True)
+class MsgpackSerializer(Serializer):
+    """
+    Binary encoding of the same values as JsonSerializer. Requires msgpack.
+
+    Tagged values are stored as extension types and the field names of objects once per
+    message, so the output is smaller and faster to decode than json. Pickle, which also
+    shares repeated strings, stays the smallest.
+    """
+
+    def __post_init__(self):
+        if msgpack is None:
+            raise ImportError("MsgpackSerializer requires the msgpack package")
+
+    def serialize(self, obj) -> bytes:
+        return _Packer().pack(obj)
+
+    def deserialize(self, serialized: bytes):
+        return _Unpacker().unpack(serialized)
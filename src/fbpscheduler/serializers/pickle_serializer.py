@@ -1,11 +1,11 @@
 from dataclasses import dataclass
-from pickle import dumps, loads
+from pickle import dumps, loads, HIGHEST_PROTOCOL
 
-from scheduler.abc import Serializer
+from fbpscheduler.abc import Serializer
 
 @dataclass(frozen=True)
 class PickleSerializer(Serializer):
-    protocol: int = 4
+    protocol: int = HIGHEST_PROTOCOL
 
     def serialize(self, obj) -> bytes:
         return dumps(obj, self.protocol)
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from fbpscheduler.enums import Fields
+from fbpscheduler.factory import EntityFactory
+from fbpscheduler.objects import Process
+from fbpscheduler.resources import check_resource_order
+
+
+class ProcessTemplate:
+    """
+    A validated process configuration compiled once into a prototype entity tree.
+    Enum fields are converted and dependency names are resolved to positions in the
+    dependency graph when the template is built, so missing dependencies and cycles
+    are reported when the configuration is loaded instead of when it is triggered, as
+    are resource requests in an order that could deadlock.
+
+    Every call to instantiate creates a new run instance of the process. Instances
+    share the configuration values of the prototype, which are treated as read-only.
+    """
+    def __init__(self, config: dict):
+        self.config = config
+        self.name = config[Fields.name]
+        self._prototype = EntityFactory.compile(config)
+        check_resource_order(self._prototype)
+
+    def required_resources(self) -> dict:
+        """
+        Returns the largest number of slots any entity of the process requests from each resource pool.
+        """
+        required = {}
+        pending = [self._prototype]
+        while pending:
+            entity = pending.pop()
+            for name, count in (entity.resources or {}).items():
+                required[name] = max(required.get(name, 0), count)
+            pending.extend(getattr(entity, "graph_entities", {}).values())
+        return required
+
+    def instantiate(self, parent_id: str, cache) -> Process:
+        return EntityFactory.instantiate(parent_id, self._prototype, cache)
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import asyncio as aio
+from collections import deque
+from datetime import datetime
+from heapq import heappush, heappop, heapify
+from itertools import count
+from time import monotonic
+
+from fbpscheduler.abc import Trigger
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class TriggerHandle:
+    """
+    Registration of a trigger in a TriggerService. when is the next fire time on the
+    monotonic clock, or None once the trigger is cancelled.
+    """
+    __slots__ = ("trigger", "when", "_seq")
+
+    def __init__(self, trigger: Trigger):
+        self.trigger = trigger
+        self.when = None
+        self._seq = None
+
+    @property
+    def active(self) -> bool:
+        return self._seq is not None
+
+
+class TriggerService:
+    """
+    Fires every registered trigger from a single task. Next fire times are kept in a
+    min-heap on the monotonic clock, and the task sleeps until the earliest one. All
+    triggers that are due when it wakes up are fired in batches of at most batch_size,
+    yielding to the event loop between batches.
+
+    A trigger that comes up more than misfire_threshold seconds after its fire date
+    has missed it, and its misfire policy decides whether it still fires. Missed fires
+    are launched at no more than catch_up_rate per second, so a restart after a long
+    outage does not start every overdue process at once.
+
+    Cancelled and rescheduled entries are left in the heap and skipped when they come
+    up; the heap is rebuilt once more than half of its entries are stale.
+    """
+    def __init__(self, batch_size: int = 1000, misfire_threshold: float = 1.0, catch_up_rate: float | None = 10.0):
+        self.batch_size = batch_size
+        self.misfire_threshold = misfire_threshold
+        self.catch_up_rate = catch_up_rate
+        self.lag = 0.0
+        self._heap = []
+        self._catch_up = deque()
+        self._next_catch_up = 0.0
+        self._seq = count()
+        self._stale = 0
+        self._task = None
+        self._waiter = None
+
+    def __getstate__(self):
+        # Triggers are registered again when the scheduler starts
+        return {"batch_size": self.batch_size, "misfire_threshold": self.misfire_threshold,
+                "catch_up_rate": self.catch_up_rate}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self._heap) + len(self._catch_up) - self._stale
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = aio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def schedule(self, trigger: Trigger) -> TriggerHandle:
+        """
+        Registers the trigger at its next fire date. The returned handle is inactive if
+        the trigger has no date.
+        """
+        handle = TriggerHandle(trigger)
+        self._push(handle)
+        return handle
+
+    def cancel(self, handle: TriggerHandle):
+        handle.when = None
+        if handle.active:
+            handle._seq = None
+            self._stale += 1
+            self._compact()
+
+    def reschedule(self, handle: TriggerHandle, trigger: Trigger | None = None):
+        """
+        Moves the handle to the next fire date of its trigger, or of a new trigger.
+        """
+        self.cancel(handle)
+        if trigger is not None:
+            handle.trigger = trigger
+        self._push(handle)
+
+    def _push(self, handle: TriggerHandle):
+        fire_date = handle.trigger.next_fire_date()
+        if fire_date is None:
+            handle.when = None
+            return
+
+        handle.when = monotonic() + (fire_date - datetime.now()).total_seconds()
+        handle._seq = next(self._seq)
+        heappush(self._heap, (handle.when, handle._seq, handle))
+        # A new earliest entry needs a shorter sleep
+        if self._heap[0][2] is handle:
+            self._wake()
+
+    def _compact(self):
+        if self._stale > (len(self._heap) + len(self._catch_up)) // 2:
+            self._heap = [entry for entry in self._heap if entry[1] == entry[2]._seq]
+            heapify(self._heap)
+            self._catch_up = deque(entry for entry in self._catch_up if entry[0] == entry[1]._seq)
+            self._stale = 0
+
+    def _pop_due(self, now: float) -> list:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            when, seq, handle = heappop(self._heap)
+            if seq != handle._seq:
+                self._stale -= 1
+                continue
+            handle._seq = None
+            due.append(handle)
+        return due
+
+    def _pop_catch_up(self, now: float) -> list:
+        due = []
+        while self._catch_up and self._next_catch_up <= now:
+            seq, handle = self._catch_up.popleft()
+            if seq != handle._seq:
+                self._stale -= 1
+                continue
+            handle._seq = None
+            due.append(handle)
+            self._next_catch_up = max(self._next_catch_up, now) + 1 / self.catch_up_rate
+        return due
+
+    def _fire(self, due: list, now: float, missed: bool = False):
+        """
+        Fires the handles, or queues missed fires for catch-up. missed is set for handles
+        coming out of the catch-up queue.
+        """
+        if not missed:
+            self.lag = now - due[0].when
+        fire_date = datetime.now()
+        for handle in due:
+            trigger = handle.trigger
+            try:
+                if not missed and not trigger.is_missed(fire_date, self.misfire_threshold):
+                    trigger.fire()
+                elif trigger.drop_missed(fire_date):
+                    if missed or self.catch_up_rate is None:
+                        trigger.fire(fire_date)
+                    else:
+                        handle._seq = next(self._seq)
+                        self._catch_up.append((handle._seq, handle))
+                        continue
+            except Exception:
+                logger.exception("Trigger callback raised an exception")
+            # The callback may have cancelled the handle
+            if handle.when is not None:
+                self._push(handle)
+
+    async def _run(self):
+        loop = aio.get_running_loop()
+        while True:
+            now = monotonic()
+            due = self._pop_due(now)
+            caught_up = self._pop_catch_up(now)
+            if due or caught_up:
+                if due:
+                    self._fire(due, now)
+                if caught_up:
+                    self._fire(caught_up, now, missed=True)
+                # Let other tasks run between batches
+                await aio.sleep(0)
+                continue
+
+            self._waiter = loop.create_future()
+            wake_times = []
+            if self._heap:
+                wake_times.append(self._heap[0][0])
+            if self._catch_up:
+                wake_times.append(self._next_catch_up)
+            timer = None
+            if wake_times:
+                timer = loop.call_later(max(min(wake_times) - monotonic(), 0), self._wake)
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+                if timer is not None:
+                    timer.cancel()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
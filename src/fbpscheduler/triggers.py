@@ -1,5 +1,5 @@
 from fbpscheduler.abc import Trigger
-from croniter import croniter
+from fbpscheduler.cron import CronEngine, cron_engine
 from datetime import datetime
 from dateutil import parser
 
@@ -11,40 +11,67 @@ class CronTrigger(Trigger):
     i.e. */2 * * * * indicates a trigger that hits every two minutes
          0 8 * * * indicates a trigger that hits daily at 8 am local time
          - Time zone is currently based on machine time zone. Support for time zone specification may be included in the future
-         
+
+    Fire dates come from the schedule of the expression in the cron engine, which is shared
+    by all triggers with the same expression. Invalid expressions raise a ValueError.
     """
-    def __init__(self, cron_expression, callback, date_modifier, modifier_action):
-        super().__init__(callback, date_modifier, modifier_action)
-        if croniter.is_valid(cron_expression):
-            self._cron_exp = cron_expression
-            self._iter = croniter(self._cron_exp, datetime.now())
-            self._trigger_date = self._iter.get_next(datetime)
-        else:
-            print("Cron expression: {} is not valid".format(cron_expression))
-            self._trigger_date = None
+    def __init__(self, cron_expression, callback, date_modifier, modifier_action, engine: CronEngine = None, **misfire):
+        super().__init__(callback, date_modifier, modifier_action, **misfire)
+        self._cron_exp = cron_expression
+        self._engine = engine if engine is not None else cron_engine
+        self._schedule = self._engine.schedule(cron_expression)
+        self._schedule.triggers.add(self)
+        # Next date of the expression, before any modification by the date modifier
+        self._cron_date = self._schedule.next_after(datetime.now())
+        self._trigger_date = self._cron_date
+
+    def __getstate__(self):
+        # Schedules are shared, so they are looked up again in the engine when loaded
+        state = self.__dict__.copy()
+        del state["_engine"]
+        del state["_schedule"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._engine = cron_engine
+        self._schedule = self._engine.schedule(self._cron_exp)
+        self._schedule.triggers.add(self)
 
     def next(self):
-        next_date = self._iter.get_next(datetime)
-        return next_date
+        self._cron_date = self._schedule.next_after(self._cron_date)
+        return self._cron_date
+
+    def skip_until(self, date):
+        # The schedule finds the next date directly, long outages are not stepped through date by date
+        if self._trigger_date is not None and self._trigger_date <= date:
+            self._cron_date = self._schedule.next_after(max(date, self._cron_date))
+            self._trigger_date = self._cron_date
 
 
 class DateTrigger(Trigger):
     """
     Trigger type object that triggers once at the specified datetime
     """
-    def __init__(self, trigger_date, callback, date_modifier, modifier_action):
-        super().__init__(callback, date_modifier, modifier_action)
-        self._trigger_date = parser.parse(trigger_date)
+    def __init__(self, trigger_date, callback, date_modifier, modifier_action, **misfire):
+        super().__init__(callback, date_modifier, modifier_action, **misfire)
+        if isinstance(trigger_date, str):
+            trigger_date = parser.parse(trigger_date)
+        self._trigger_date = trigger_date
 
     def next(self):
         return None
 
 
 class InstantTrigger(Trigger):
-    def __init__(self, callback):
-        super().__init__(callback=callback, date_modifier=None, modifier_action=None)
+    def __init__(self, callback, **misfire):
+        super().__init__(callback=callback, date_modifier=None, modifier_action=None, **misfire)
         self._trigger_date = datetime.now()
 
+    def mark_fired(self, date):
+        # Instant triggers rebuilt from the journal are dated when they are rebuilt, after the date they fired for
+        self._trigger_date = None
+
     def next(self):
         return None
 
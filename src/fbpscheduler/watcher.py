@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+
+from fbpscheduler.enums import FileEvent
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class PollingWatcher:
+    """
+    Reports changes to the files of a directory by comparing the modification time
+    and size of every file with the previous scan. The first scan reports every
+    file as created.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._files = {}
+
+    def _scan(self) -> dict:
+        files = {}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    file_stat = entry.stat()
+                    files[entry.name] = (file_stat.st_mtime_ns, file_stat.st_size)
+        return files
+
+    def changes(self) -> list:
+        files = self._scan()
+        changes = []
+        for file_name, signature in files.items():
+            if file_name not in self._files:
+                changes.append((FileEvent.created, file_name))
+            elif self._files[file_name] != signature:
+                changes.append((FileEvent.modified, file_name))
+        for file_name in self._files.keys() - files.keys():
+            changes.append((FileEvent.deleted, file_name))
+
+        self._files = files
+        return changes
+
+    def fileno(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(PollingWatcher):
+    """
+    Reports changes to the files of a directory from Linux inotify events, so files
+    are only looked at when they change. Falls back to a full scan when the kernel
+    event queue overflows.
+    """
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    _event_header = struct.Struct("iIII")
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_DELETE
+        if libc.inotify_add_watch(self._fd, os.fsencode(path), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, "inotify_add_watch failed for " + path)
+        self._initialized = False
+
+    def _read_events(self):
+        """
+        Returns the latest event mask of every file with pending events, or None if events were lost.
+        """
+        events = {}
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, name_length = self._event_header.unpack_from(data, offset)
+                offset += self._event_header.size
+                name = os.fsdecode(data[offset:offset + name_length].rstrip(b"\0"))
+                offset += name_length
+                if mask & self.IN_Q_OVERFLOW:
+                    return None
+                if name and not mask & self.IN_ISDIR:
+                    events[name] = mask
+        return events
+
+    def changes(self) -> list:
+        events = self._read_events()
+        if not self._initialized or events is None:
+            self._initialized = True
+            return super().changes()
+
+        changes = []
+        for file_name, mask in events.items():
+            if mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                if file_name in self._files:
+                    del self._files[file_name]
+                    changes.append((FileEvent.deleted, file_name))
+            elif file_name in self._files:
+                changes.append((FileEvent.modified, file_name))
+            else:
+                self._files[file_name] = None
+                changes.append((FileEvent.created, file_name))
+        return changes
+
+    def fileno(self):
+        return self._fd
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_watcher(path: str) -> PollingWatcher:
+    """
+    Returns an inotify backed watcher on Linux and a polling watcher elsewhere or
+    when inotify is unavailable.
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError) as err:
+            logger.info("inotify is unavailable (%s). Polling %s instead.", err, path)
+    return PollingWatcher(path)
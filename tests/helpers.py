@@ -0,0 +1,12 @@
+def job_config(name="job", run_type="cmd", command="true", parameters=None, **fields):
+    config = {"Object Type": "Job", "Name": name, "Description": "", "Dependencies": [],
+              "Run Type": run_type, "Command": command, "Parameters": parameters if parameters is not None else {}}
+    config.update(fields)
+    return config
+
+
+def process_config(entities, name="process", trigger=None, **fields):
+    config = {"Object Type": "Process", "Name": name, "Description": "", "Deadline": "00:01:00",
+              "Trigger": trigger or {"Trigger Type": "instant"}, "Dependencies": [], "Entity List": entities}
+    config.update(fields)
+    return config
@@ -0,0 +1,53 @@
+import asyncio
+import pickle
+
+from fbpscheduler.archive import ProcessArchive
+from fbpscheduler.cache import Cache
+from fbpscheduler.enums import Status
+from fbpscheduler.templates import ProcessTemplate
+
+from helpers import job_config, process_config
+
+
+def run_processes(count):
+    cache = Cache("S-1")
+    template = ProcessTemplate(process_config([job_config()]))
+    processes = [template.instantiate(cache.id, cache) for _ in range(count)]
+    for process in processes:
+        asyncio.run(process.execute(cache))
+    return processes
+
+
+def test_only_the_last_summaries_are_kept():
+    archive = ProcessArchive(maxlen=2)
+    for process in run_processes(3):
+        archive.append(process)
+    assert [summary.entity_id for summary in archive] == ["S-1.P-2", "S-1.P-3"]
+    summary = archive.get_summary("S-1.P-3")
+    assert summary.status == Status.finished and list(summary.durations) == ["S-1.P-3.J-1"]
+    assert archive.get_summary("S-1.P-1") is None and archive.get("S-1.P-1") is None
+
+
+def test_processes_are_read_back_from_the_archive_file(tmp_path):
+    path = str(tmp_path / "processes.archive")
+    archive = ProcessArchive(maxlen=1, path=path)
+    for process in run_processes(3):
+        archive.append(process)
+    assert archive.get("S-1.P-1").entity_id == "S-1.P-1"
+    # A new archive indexes the file on the first lookup
+    restored = ProcessArchive(path=path).get("S-1.P-2")
+    assert restored.entity_id == "S-1.P-2" and restored.status == Status.finished
+    assert ProcessArchive(path=path).get("S-1.P-9") is None
+    assert ProcessArchive(path=str(tmp_path / "missing")).get("S-1.P-1") is None
+
+
+def test_only_the_last_offsets_are_kept(tmp_path):
+    path = str(tmp_path / "processes.archive")
+    archive = ProcessArchive(maxlen=2, path=path)
+    for process in run_processes(5):
+        archive.append(process)
+    assert list(archive._offsets) == ["S-1.P-4", "S-1.P-5"]
+    # Older processes are found in the file and replace the least recently used offset
+    assert archive.get("S-1.P-1").entity_id == "S-1.P-1"
+    assert list(archive._offsets) == ["S-1.P-5", "S-1.P-1"]
+    assert pickle.loads(pickle.dumps(archive)).get("S-1.P-3").entity_id == "S-1.P-3"
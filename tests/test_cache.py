@@ -0,0 +1,61 @@
+import json
+import pickle
+
+from fbpscheduler.cache import Cache
+
+
+def make_cache(**handlers):
+    cache = Cache("S-1", {"date": "2021-05-10", "level": "scheduler"}, **handlers)
+    cache.set_child("S-1.P-1")
+    cache.set_parameters("S-1.P-1", {"level": "process"})
+    cache.set_child("S-1.P-1.J-1")
+    cache.set_parameters("S-1.P-1.J-1", {"value": 1})
+    return cache
+
+
+def test_get_parameters_returns_a_dict_with_inherited_parameters():
+    parameters = make_cache().get_parameters("S-1.P-1.J-1")
+    assert type(parameters) is dict
+    assert parameters == {"date": "2021-05-10", "level": "process", "value": 1, "Entity Id": "S-1.P-1.J-1"}
+
+
+def test_get_parameters_returns_a_copy():
+    cache = make_cache()
+    cache.get_parameters("S-1.P-1")["level"] = "changed"
+    assert cache.get_parameters("S-1.P-1")["level"] == "process"
+
+
+def test_parameter_scope_sees_updates_of_ancestors():
+    cache = make_cache()
+    scope = cache.parameter_scope("S-1.P-1.J-1")
+    cache.update_parameters("S-1.P-1", {"level": "updated"})
+    assert scope["level"] == "updated"
+    assert cache.get_parameters("S-1.P-1.J-1")["level"] == "updated"
+
+
+def test_entity_handler_receives_json_serializable_parameters():
+    received = []
+    cache = make_cache(entity_handler=lambda metadata, parameters: received.append(json.dumps(parameters)))
+    cache.read_state({"entity_id": "S-1.P-1.J-1", "status": None})
+    assert json.loads(received[0])["value"] == 1
+
+
+def test_nodes_are_looked_up_by_id():
+    cache = make_cache()
+    assert cache.get_child("S-1.P-1.J-1").parent is cache.get_child("S-1.P-1")
+    assert cache.get_child("S-1.P-2") is None
+
+
+def test_removed_nodes_leave_the_index():
+    cache = make_cache()
+    assert sorted(cache.remove_child("S-1.P-1")) == ["S-1.P-1", "S-1.P-1.J-1"]
+    assert cache.get_child("S-1.P-1.J-1") is None
+    assert "S-1.P-1.J-1" not in cache.parameters
+    assert cache.remove_child("S-1.P-1") == []
+
+
+def test_the_node_index_is_rebuilt_when_unpickled():
+    cache = pickle.loads(pickle.dumps(make_cache()))
+    node = cache.get_child("S-1.P-1.J-1")
+    assert node.parent is cache.get_child("S-1.P-1") and node.parent.parent is cache
+    assert cache.get_parameters("S-1.P-1.J-1")["level"] == "process"
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+import pytest
+from croniter import croniter
+
+from fbpscheduler.cron import CronEngine
+
+START = datetime(2024, 1, 1, 0, 0, 30)
+
+
+def expected(expression, start, count):
+    dates = croniter(expression, start)
+    return [dates.get_next(datetime) for _ in range(count)]
+
+
+def test_schedules_are_shared_by_expression():
+    engine = CronEngine()
+    schedule = engine.schedule("*/5 * * * *")
+    assert engine.schedule(" */5  *  * * * ") is schedule
+    assert len(engine) == 1
+    with pytest.raises(ValueError):
+        engine.schedule("not a cron expression")
+
+
+def test_dates_match_croniter():
+    schedule = CronEngine(batch_size=8).schedule("*/7 * * * *")
+    assert schedule.upcoming(START, 50) == expected("*/7 * * * *", START, 50)
+    assert schedule.window(START, START + timedelta(hours=1)) == expected("*/7 * * * *", START, 9)
+
+
+def test_next_dates_are_found_after_the_cache_is_pruned():
+    schedule = CronEngine(batch_size=4).schedule("* * * * *")
+    date = START
+    for _ in range(100):
+        date = schedule.next_after(date)
+    assert date == START.replace(second=0) + timedelta(minutes=100)
+    # A trigger behind the cache, and one far ahead of it
+    assert schedule.next_after(START) == START.replace(second=0) + timedelta(minutes=1)
+    far = START + timedelta(days=365)
+    assert schedule.next_after(far) == far.replace(second=0) + timedelta(minutes=1)
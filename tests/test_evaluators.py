@@ -0,0 +1,74 @@
+import asyncio
+import os
+
+from fbpscheduler.evaluators import ModuleCache, OutputTail, cmd_evaluator, python_evaluator
+
+
+def write_module(path, body):
+    path.write_text(body)
+    return str(path)
+
+
+def test_modules_are_loaded_once(tmp_path):
+    path = write_module(tmp_path / "jobs.py", "LOADS = []\nLOADS.append(1)\n")
+    cache = ModuleCache()
+    first = cache.load(path)
+    assert cache.load(path) is first
+    assert cache.info()["hits"] == 1 and cache.info()["misses"] == 1
+    assert path in cache
+
+
+def test_changed_modules_are_loaded_again(tmp_path):
+    path = write_module(tmp_path / "jobs.py", "VALUE = 1\n")
+    cache = ModuleCache()
+    assert cache.load(path).VALUE == 1
+    write_module(tmp_path / "jobs.py", "VALUE = 22\n")
+    os.utime(path, ns=(0, 0))
+    assert cache.load(path).VALUE == 22
+
+
+def test_least_recently_used_modules_are_evicted(tmp_path):
+    paths = [write_module(tmp_path / "jobs{}.py".format(i), "") for i in range(3)]
+    cache = ModuleCache(maxsize=2)
+    for path in paths[:2]:
+        cache.load(path)
+    cache.load(paths[0])
+    cache.load(paths[2])
+    assert paths[0] in cache and paths[1] not in cache and len(cache) == 2
+    cache.invalidate(paths[0])
+    assert paths[0] not in cache
+
+
+def test_output_tail_keeps_the_last_bytes():
+    tail = OutputTail(limit=10)
+    for chunk in (b"0123", b"456789", b"abcdef"):
+        tail.append(chunk)
+    assert tail.getvalue() == "6789abcdef"
+    tail.append(b"x" * 25 + b"end")
+    assert tail.getvalue() == "xxxxxxxend"
+
+
+def test_command_output_is_streamed(tmp_path):
+    lines = []
+    output_path = tmp_path / "output.log"
+    command = "for i in $(seq 1 2000); do echo line$i; done"
+    return_code, tail = asyncio.run(cmd_evaluator(command, line_handler=lines.append, output_path=str(output_path),
+                                                  tail_limit=100))
+    assert return_code == 0
+    assert lines == ["line{}".format(i) for i in range(1, 2001)]
+    assert len(tail) == 100 and tail.endswith("line2000\n")
+    assert output_path.read_text().splitlines() == lines
+
+
+def test_command_is_killed_at_the_time_limit():
+    return_code, tail = asyncio.run(cmd_evaluator("echo started; sleep 30", timeout=0.5))
+    assert return_code == 1
+    assert "TimeoutError" in tail and "started" in tail
+
+
+def test_missing_python_functions_are_reported(tmp_path):
+    path = write_module(tmp_path / "jobs.py", "")
+    return_code, message = asyncio.run(python_evaluator(path, "missing"))
+    assert return_code == 1 and "AttributeError" in message
+    return_code, message = asyncio.run(python_evaluator(str(tmp_path / "absent.py"), "missing"))
+    assert return_code == 1 and "Error" in message
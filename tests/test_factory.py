@@ -0,0 +1,40 @@
+import pickle
+
+from fbpscheduler.cache import Cache
+from fbpscheduler.enums import ObjectType
+from fbpscheduler.factory import EntityFactory
+
+
+def new_id(cache, parent_id, object_type=ObjectType.job):
+    entity_id = EntityFactory.generate_id(parent_id, object_type, cache)
+    cache.set_child(entity_id)
+    return entity_id
+
+
+def test_ids_are_numbered_per_parent_and_type():
+    cache = Cache("S-1")
+    process_id = new_id(cache, "S-1", ObjectType.process)
+    assert process_id == "S-1.P-1"
+    assert [new_id(cache, process_id) for _ in range(3)] == ["S-1.P-1.J-1", "S-1.P-1.J-2", "S-1.P-1.J-3"]
+    assert new_id(cache, process_id, ObjectType.job_group) == "S-1.P-1.JG-1"
+    assert new_id(cache, "S-1", ObjectType.process) == "S-1.P-2"
+
+
+def test_ids_of_removed_entities_are_not_reused():
+    cache = Cache("S-1")
+    new_id(cache, "S-1", ObjectType.process)
+    cache.remove_child("S-1.P-1")
+    assert new_id(cache, "S-1", ObjectType.process) == "S-1.P-2"
+
+
+def test_counters_are_restored_with_the_cache():
+    cache = Cache("S-1")
+    new_id(cache, "S-1", ObjectType.process)
+    cache = pickle.loads(pickle.dumps(cache))
+    assert new_id(cache, "S-1", ObjectType.process) == "S-1.P-2"
+
+
+def test_children_added_outside_of_the_factory_are_skipped():
+    cache = Cache("S-1")
+    cache.set_child("S-1.P-1")
+    assert new_id(cache, "S-1", ObjectType.process) == "S-1.P-2"
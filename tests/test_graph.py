@@ -0,0 +1,30 @@
+import pytest
+
+from fbpscheduler.graph import DependencyGraph
+
+
+def test_graph_from_dict():
+    graph = DependencyGraph.from_dict({"a": [], "b": ["a"], "c": ["a", "b"]})
+    assert graph.get_dependencies("c") == ["a", "b"]
+    assert graph.get_dependents("a") == ["b", "c"]
+    assert sorted(graph.edges()) == [("b", "a"), ("c", "a"), ("c", "b")]
+    assert graph.predecessor_counts() == [0, 1, 2]
+    assert graph.to_dict() == {"a": [], "b": ["a"], "c": ["a", "b"]}
+    assert len(graph) == 3 and "b" in graph and "d" not in graph
+
+
+def test_unknown_dependencies_are_rejected():
+    with pytest.raises(ValueError, match="b depends on x"):
+        DependencyGraph.from_dict({"a": [], "b": ["x"]})
+
+
+def test_cycles_are_rejected():
+    with pytest.raises(ValueError, match="b, c"):
+        DependencyGraph.from_dict({"a": [], "b": ["a", "c"], "c": ["b"]})
+
+
+def test_relabel_keeps_the_structure():
+    graph = DependencyGraph.from_dict({"a": [], "b": ["a"]})
+    relabelled = graph.relabel(["x", "y"])
+    assert relabelled.to_dict() == {"x": [], "y": ["x"]}
+    assert graph.to_dict() == {"a": [], "b": ["a"]}
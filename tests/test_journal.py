@@ -0,0 +1,34 @@
+from fbpscheduler.enums import JournalRecord
+from fbpscheduler.journal import StateJournal, read_records
+
+
+def write_journal(directory, seq, count):
+    journal = StateJournal()
+    journal.open(str(directory), "S-1", seq)
+    for _ in range(count):
+        journal.record_removed("S-1.P-1")
+    journal.close()
+    return journal
+
+
+def replayed_seqs(directory):
+    return [record[0] for record in StateJournal().replay(str(directory), "S-1", 0)]
+
+
+def test_torn_record_is_ignored(tmp_path):
+    journal = write_journal(tmp_path, 0, 3)
+    path = journal.segment_paths()[0]
+    with open(path, "ab") as f:
+        f.write(b"\x40\x00\x00\x00partial")
+    assert [record[0] for record in read_records(path, journal.serializer)] == [1, 2, 3]
+    assert [record[1] for record in read_records(path, journal.serializer)] == [JournalRecord.removed] * 3
+
+
+def test_records_after_a_torn_segment_are_replayed(tmp_path):
+    journal = write_journal(tmp_path, 0, 3)
+    # A crash while the first record of the next segment was written
+    with open(journal._segment_path(4), "wb") as f:
+        f.write(b"\x40\x00\x00\x00partial")
+
+    write_journal(tmp_path, 3, 2)
+    assert replayed_seqs(tmp_path) == [1, 2, 3, 4, 5]
@@ -0,0 +1,48 @@
+import json
+from collections import deque
+from datetime import datetime
+
+import pytest
+
+from fbpscheduler.enums import Status
+from fbpscheduler.graph import DependencyGraph
+from fbpscheduler.marshalling import TYPE_KEY, SchedulerEncoder, decode_value, from_json, to_json
+from fbpscheduler.retry import RetrySettings
+
+
+def round_trip(value):
+    return json.loads(json.dumps(value, cls=SchedulerEncoder), object_hook=decode_value)
+
+
+def test_values_round_trip():
+    value = {"date": datetime(2024, 1, 2, 3, 4, 5), "status": Status.finished, "items": deque([1, 2], 5),
+             "graph": DependencyGraph(["a", "b"], [[], [0]]), "settings": RetrySettings(delay=5.0)}
+    decoded = round_trip(value)
+    assert decoded["date"] == value["date"]
+    assert decoded["status"] is Status.finished
+    assert decoded["items"] == value["items"] and decoded["items"].maxlen == 5
+    assert list(decoded["graph"].ids) == ["a", "b"] and list(map(list, decoded["graph"].dependencies)) == [[], [0]]
+    assert decoded["settings"] == value["settings"]
+
+
+@pytest.mark.parametrize("data", [{"Datetime": "2024-01-02"},
+                                  {"Enum": "Status.finished"},
+                                  {"Object": {"type": "os:system", "state": {}}},
+                                  {TYPE_KEY: "Datetime"}])
+def test_user_dictionaries_are_not_decoded(data):
+    assert round_trip({"parameters": data}) == {"parameters": data}
+    assert from_json(to_json({"parameters": data})) == {"parameters": data}
+
+
+@pytest.mark.parametrize("type_name", ["os:system", "subprocess:Popen", "fbpschedulerx:Thing"])
+def test_objects_of_untrusted_modules_are_rejected(type_name):
+    data = {TYPE_KEY: "Object", "value": {"type": type_name, "state": {}}}
+    with pytest.raises(ValueError):
+        decode_value(data)
+
+
+def test_decoded_types_must_be_classes():
+    with pytest.raises(TypeError):
+        decode_value({TYPE_KEY: "Object", "value": {"type": "fbpscheduler.marshalling:to_json", "state": {}}})
+    with pytest.raises(TypeError):
+        decode_value({TYPE_KEY: "Enum", "value": "fbpscheduler.retry:RetrySettings.policy"})
@@ -0,0 +1,94 @@
+import asyncio
+import os
+
+import pytest
+
+from fbpscheduler.cache import Cache
+from fbpscheduler.enums import Status
+from fbpscheduler.templates import ProcessTemplate
+
+from helpers import job_config, process_config
+
+
+def run_process(config):
+    cache = Cache("S-1")
+    process = ProcessTemplate(config).instantiate(cache.id, cache)
+    asyncio.run(process.execute(cache))
+    return process
+
+
+def test_environment_values_are_converted_to_strings(capsys):
+    job = job_config(command='echo "$COUNT $ENABLED $NAME"', Environment={"COUNT": 4, "ENABLED": True, "NAME": "x"})
+    process = run_process(process_config([job]))
+    job = next(iter(process.get_entities()))
+    assert process.status == Status.finished
+    assert "4 True x" in job.message
+    assert "Target is not of instance str" not in capsys.readouterr().out
+
+
+def logged_job(name, log, body, **fields):
+    return job_config(name, command="echo start {0} >> {1}; {2}; echo end {0} >> {1}".format(name, log, body), **fields)
+
+
+def wait_for_line(line, log):
+    # Gives up after a few seconds so that a broken schedule shows up in the log rather than hanging
+    return "for i in $(seq 100); do grep -qx '{}' {} && break; sleep 0.05; done".format(line, log)
+
+
+def test_independent_children_run_concurrently(tmp_path):
+    log = tmp_path / "log"
+    # Each of a and b only ends once the other one has started
+    jobs = [logged_job("a", log, wait_for_line("start b", log)),
+            logged_job("b", log, wait_for_line("start a", log)),
+            logged_job("c", log, "true", Dependencies=["a", "b"])]
+    process = run_process(process_config(jobs))
+    lines = log.read_text().splitlines()
+    assert process.status == Status.finished
+    assert sorted(lines[:2]) == ["start a", "start b"]
+    assert lines[-2:] == ["start c", "end c"]
+
+
+def test_concurrency_caps_running_children(tmp_path):
+    log = tmp_path / "log"
+    jobs = [logged_job(name, log, "sleep 0.1") for name in "abc"]
+    process = run_process(process_config(jobs, Concurrency=1))
+    lines = log.read_text().splitlines()
+    assert process.status == Status.finished
+    assert len(lines) == 6
+    assert all(lines[i] == "start " + lines[i + 1].split()[1] for i in range(0, 6, 2))
+
+
+def test_running_children_are_stopped_when_a_sibling_raises(tmp_path):
+    pid_file = tmp_path / "pid"
+    jobs = [job_config("a", command="echo $$ > {}; exec sleep 30".format(pid_file)), job_config("b")]
+    cache = Cache("S-1")
+    process = ProcessTemplate(process_config(jobs)).instantiate(cache.id, cache)
+    sleeper, raiser = sorted(process.get_entities(), key=lambda job: job.name)
+
+    async def execute(cache, inherited_deadline=None):
+        while not pid_file.exists() or not pid_file.read_text().strip():
+            await asyncio.sleep(0.01)
+        raise RuntimeError("evaluation failed")
+
+    raiser.execute = execute
+    with pytest.raises(RuntimeError):
+        asyncio.run(process.execute(cache))
+    assert sleeper.status == Status.failure
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
+
+
+def test_no_children_start_after_a_failure(tmp_path):
+    jobs = [job_config("a", command="exit 3", **{"Exception Handling": "kill"}),
+            job_config("b", command="touch " + str(tmp_path / "b"), Dependencies=["a"])]
+    process = run_process(process_config(jobs))
+    assert process.status != Status.finished
+    assert not (tmp_path / "b").exists()
+
+
+def test_exec_jobs_pass_arguments_without_a_shell():
+    job = job_config(run_type="exec", command="printf '%s|'", parameters=["a b", "$HOME", "it's"])
+    process = run_process(process_config([job]))
+    job = next(iter(process.get_entities()))
+    assert process.status == Status.finished
+    assert "a b|$HOME|it's|" in job.message
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from fbpscheduler.cache import Cache
+from fbpscheduler.enums import BackpressurePolicy
+from fbpscheduler.pipeline import EventPipeline
+
+
+def test_events_are_dispatched_in_batches():
+    batches = []
+    pipeline = EventPipeline(batch_size=10, batch_window=5)
+    pipeline.start(batches.append)
+    for i in range(25):
+        pipeline.emit(i)
+    pipeline.close(5)
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert sum(batches, []) == list(range(25))
+
+
+def test_backpressure_drops_events_when_the_queue_is_full():
+    release = threading.Event()
+    batches = []
+
+    def dispatch(batch):
+        release.wait(5)
+        batches.append(batch)
+
+    for policy, expected in ((BackpressurePolicy.drop_oldest, [0, 4, 5]), (BackpressurePolicy.drop_newest, [0, 1, 2])):
+        batches.clear()
+        release.clear()
+        pipeline = EventPipeline(batch_size=1, batch_window=0, max_queue_size=2, backpressure=policy)
+        pipeline.start(dispatch)
+        pipeline.emit(0)
+        # The worker is blocked on the first event, the queue fills up behind it
+        while pipeline.queue_depth():
+            time.sleep(0.01)
+        for i in range(1, 6):
+            pipeline.emit(i)
+        assert pipeline.dropped == 3
+        release.set()
+        pipeline.close(5)
+        assert sum(batches, []) == expected
+
+
+def test_cache_handlers_receive_the_last_change_of_each_entity():
+    deltas, entities = [], []
+    pipeline = EventPipeline(batch_size=100, batch_window=5)
+    cache = Cache("S-1", cache_handler=deltas.append, entity_handler=lambda metadata, parameters: entities.append(metadata),
+                  pipeline=pipeline)
+    cache.set_child("S-1.P-1")
+    for status in ("running", "finished"):
+        cache.read_state({"entity_id": "S-1.P-1", "status": status})
+    pipeline.close(5)
+    assert deltas == [{"id": "S-1", "metadata": {"S-1.P-1": {"entity_id": "S-1.P-1", "status": "finished"}},
+                       "parameters": {"S-1.P-1": {}}}]
+    assert [metadata["status"] for metadata in entities] == ["finished"]
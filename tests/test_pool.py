@@ -0,0 +1,81 @@
+import asyncio
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fbpscheduler.pool import ProcessPool, get_process_pool
+from fbpscheduler.schedulers import LocalScheduler
+
+JOBS = """
+import time
+
+def spin(seconds, Cache):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+def fail(Cache):
+    raise RuntimeError("job failed")
+"""
+
+
+def run_jobs(tmp_path, *jobs):
+    path = tmp_path / "jobs.py"
+    path.write_text(JOBS)
+    pool = ProcessPool(1)
+
+    async def run():
+        return [await pool.run(str(path), command, arguments, timeout) for command, arguments, timeout in jobs]
+
+    try:
+        return asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+
+def test_functions_run_in_worker_processes(tmp_path):
+    results = run_jobs(tmp_path, ("spin", {"seconds": 0}, None), ("fail", {}, None))
+    assert results[0] == (0, "Function spin ran successfully")
+    assert results[1][0] == 1 and "job failed" in results[1][1]
+
+
+def test_workers_are_killed_at_the_time_limit(tmp_path):
+    start = time.perf_counter()
+    results = run_jobs(tmp_path, ("spin", {"seconds": 30}, 0.5), ("spin", {"seconds": 0}, None))
+    assert time.perf_counter() - start < 10
+    assert results[0][0] == 1 and "timed out" in results[0][1]
+    # The killed worker is replaced
+    assert results[1][0] == 0
+
+
+def test_replies_do_not_wait_for_the_default_executor(tmp_path):
+    path = tmp_path / "jobs.py"
+    path.write_text(JOBS)
+    pool = ProcessPool(1)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(1))
+        # Occupies the only thread of the default executor, as a hung thread job would
+        blocked = loop.run_in_executor(None, time.sleep, 1)
+        result = await pool.run(str(path), "spin", {"seconds": 0}, 0.8)
+        await blocked
+        return result
+
+    try:
+        assert asyncio.run(run()) == (0, "Function spin ran successfully")
+    finally:
+        pool.shutdown()
+
+
+def test_schedulers_run_jobs_in_their_own_pool(tmp_path):
+    first, second = LocalScheduler(str(tmp_path), process_pool_size=1), LocalScheduler(str(tmp_path))
+
+    async def pool_of(scheduler):
+        scheduler.process_pool.activate()
+        return get_process_pool()
+
+    assert asyncio.run(pool_of(first)) is first.process_pool
+    assert asyncio.run(pool_of(second)) is second.process_pool
+    assert first.process_pool.size == 1
+    assert pickle.loads(pickle.dumps(first.process_pool)).size == 1
@@ -0,0 +1,127 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from fbpscheduler.queues import PriorityRunQueue, expected_deadline
+from fbpscheduler.schedulers import LocalScheduler
+
+NOW = datetime(2024, 1, 1)
+
+
+class QueuedProcess:
+    def __init__(self, entity_id, priority=0, deadline=None):
+        self.entity_id = entity_id
+        self.priority = priority
+        self.deadline = deadline
+
+    def __repr__(self):
+        return self.entity_id
+
+
+def ids(processes):
+    return [process.entity_id for process in processes]
+
+
+def queue_of(*processes):
+    queue = PriorityRunQueue()
+    for process in processes:
+        queue.push(process)
+    return queue
+
+
+def test_processes_are_ordered_by_priority_then_deadline():
+    queue = queue_of(QueuedProcess("late", 0, NOW + timedelta(hours=2)),
+                     QueuedProcess("none", 0),
+                     QueuedProcess("early", 0, NOW + timedelta(hours=1)),
+                     QueuedProcess("urgent", 5, NOW + timedelta(hours=3)),
+                     QueuedProcess("low", -1, NOW))
+    assert ids(queue.ordered()) == ["urgent", "early", "late", "none", "low"]
+    assert ids(queue.pop() for _ in range(len(queue))) == ["urgent", "early", "late", "none", "low"]
+
+
+def test_equal_keys_keep_insertion_order():
+    queue = queue_of(*(QueuedProcess(str(i), 1, NOW) for i in range(10)))
+    assert ids(queue.ordered()) == [str(i) for i in range(10)]
+
+
+def test_time_of_day_deadlines_count_from_now():
+    process = QueuedProcess("p", deadline="00:10:00")
+    assert expected_deadline(process, NOW) == NOW + timedelta(minutes=10)
+    assert expected_deadline(QueuedProcess("q"), NOW) == datetime.max
+
+
+def test_processes_are_removed_by_id():
+    first, second, third = QueuedProcess("a", 3), QueuedProcess("b", 2), QueuedProcess("c", 1)
+    queue = queue_of(first, second, third)
+    # Any object with the same id refers to the queued process
+    assert queue.remove(QueuedProcess("b")) is second
+    assert ids(queue.ordered()) == ["a", "c"]
+    assert second not in queue and queue.get("b") is None
+    with pytest.raises(ValueError):
+        queue.remove(second)
+    queue.discard(second)
+    assert len(queue) == 2
+
+
+def test_update_moves_a_process():
+    first, second = QueuedProcess("a", 1), QueuedProcess("b", 0)
+    queue = queue_of(first, second)
+    second.priority = 2
+    queue.update(second)
+    assert ids(queue.ordered()) == ["b", "a"]
+    # Pushing a queued process updates it rather than adding it twice
+    first.priority = 3
+    queue.push(first)
+    assert ids(queue.ordered()) == ["a", "b"] and len(queue) == 2
+
+
+def test_state_with_list_keys_is_restored():
+    queue = queue_of(QueuedProcess("a", 0, NOW), QueuedProcess("b", 1, NOW))
+    state = queue.__getstate__()
+    restored = PriorityRunQueue.__new__(PriorityRunQueue)
+    # Formats without tuples give keys back as lists
+    restored.__setstate__({"entries": [[list(key), process] for key, process in state["entries"]],
+                           "seq": state["seq"]})
+    assert ids(restored.ordered()) == ["b", "a"]
+    restored.push(QueuedProcess("c", 1, NOW))
+    assert ids(restored.pop() for _ in range(3)) == ["b", "c", "a"]
+
+
+def test_scheduler_restores_queues_saved_as_lists(tmp_path):
+    state = dict(LocalScheduler(str(tmp_path)).__dict__)
+    state["initiated_processes"] = [QueuedProcess("a", 0), QueuedProcess("b", 1)]
+    state["run_queue"] = []
+    scheduler = LocalScheduler.__new__(LocalScheduler)
+    scheduler.__setstate__(state)
+    assert isinstance(scheduler.initiated_processes, PriorityRunQueue)
+    assert isinstance(scheduler.run_queue, PriorityRunQueue) and not scheduler.run_queue
+    assert ids(scheduler.initiated_processes.ordered()) == ["b", "a"]
+
+
+def test_random_operations_keep_the_heap_order():
+    rng = random.Random(0)
+    queue = PriorityRunQueue()
+    queued = {}
+    for i in range(2000):
+        operation = rng.random()
+        if operation < 0.5 or not queued:
+            process = QueuedProcess(str(i), rng.randint(0, 3), NOW + timedelta(minutes=rng.randint(0, 100)))
+            queue.push(process)
+            queued[process.entity_id] = process
+        elif operation < 0.7:
+            process = queued.pop(rng.choice(list(queued)))
+            assert queue.remove(process) is process
+        elif operation < 0.85:
+            process = queued[rng.choice(list(queued))]
+            process.priority = rng.randint(0, 3)
+            queue.update(process)
+        else:
+            expected = queue.ordered()[0]
+            assert queue.pop() is expected
+            del queued[expected.entity_id]
+        assert len(queue) == len(queued)
+    expected = sorted(queued.values(), key=lambda process: (-process.priority, process.deadline))
+    popped = [queue.pop() for _ in range(len(queue))]
+    assert [(process.priority, process.deadline) for process in popped] == \
+        [(process.priority, process.deadline) for process in expected]
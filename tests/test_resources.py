@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from fbpscheduler.enums import Status
+from fbpscheduler.resources import ResourceManager, ResourcePool
+from fbpscheduler.schedulers import LocalScheduler
+from fbpscheduler.templates import ProcessTemplate
+
+from helpers import job_config, process_config
+
+
+def group_config(group_resources, job_resources):
+    return {"Object Type": "JobGroup", "Name": "group", "Description": "", "Dependencies": [],
+            "Jobs": [job_config(Resources=job_resources)], "Resources": group_resources}
+
+
+def test_nested_requests_out_of_name_order_are_rejected():
+    ProcessTemplate(process_config([group_config({"a": 1}, {"b": 1})]))
+    with pytest.raises(ValueError):
+        ProcessTemplate(process_config([group_config({"b": 1}, {"a": 1})]))
+
+
+def test_nested_holds_out_of_name_order_raise():
+    manager = ResourceManager({"a": 1, "b": 1})
+
+    async def run():
+        async with manager.hold({"b": 1}):
+            async with manager.hold({"b": 1, "c": 1}):
+                pass
+            with pytest.raises(ValueError):
+                async with manager.hold({"a": 1}):
+                    pass
+
+    manager.pools["c"] = ResourcePool("c", 1)
+    asyncio.run(run())
+    assert {name: pool.available for name, pool in manager.pools.items()} == {"a": 1, "b": 1, "c": 1}
+
+
+def test_cancelled_waiters_are_skipped():
+    pool = ResourcePool("db", 1)
+
+    async def run():
+        await pool.acquire()
+        cancelled = asyncio.create_task(pool.acquire())
+        waiting = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        # Released before the cancelled task has run again
+        pool.release()
+        await asyncio.wait_for(waiting, 1)
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+
+    asyncio.run(run())
+    assert pool.available == 0 and pool.queue_depth == 0
+
+
+def test_deadline_runs_while_waiting_for_resources(tmp_path):
+    scheduler = LocalScheduler(str(tmp_path), resource_pools={"db": 1})
+    go = tmp_path / "go"
+    # The holder keeps the pool until the waiter has ended
+    holder = process_config([job_config(command="until [ -e {} ]; do sleep 0.01; done".format(go))], name="holder",
+                            Resources={"db": 1})
+    waiter = process_config([job_config()], name="waiter", Deadline="00:00:01", Resources={"db": 1})
+
+    async def run():
+        processes = [ProcessTemplate(config).instantiate(scheduler.id, scheduler.cache) for config in (holder, waiter)]
+        for process in processes:
+            scheduler.run_queue.push(process)
+            scheduler._start_process(process)
+        while not len(scheduler.ended_processes):
+            await asyncio.sleep(0.01)
+        ended = {process.name: process.status for process in scheduler.ended_processes}
+        go.touch()
+        while len(scheduler.ended_processes) < 2:
+            await asyncio.sleep(0.01)
+        return ended
+
+    assert asyncio.run(asyncio.wait_for(run(), 10)) == {"waiter": Status.failure}
+
+
+def test_waiting_requests_are_served_by_priority(tmp_path):
+    scheduler = LocalScheduler(str(tmp_path), resource_pools={"db": 1})
+    log, go = tmp_path / "log", tmp_path / "go"
+    configs = [process_config([job_config(command="until [ -e {} ]; do sleep 0.01; done".format(go))],
+                              name="holder", Resources={"db": 1}),
+               process_config([job_config(command="echo low >> " + str(log))], name="low", Resources={"db": 1}),
+               process_config([job_config(command="echo high >> " + str(log))], name="high", Priority=5,
+                              Resources={"db": 1})]
+
+    async def run():
+        pool = scheduler.resources.pools["db"]
+        for config, queued in zip(configs, (0, 1, 2)):
+            process = ProcessTemplate(config).instantiate(scheduler.id, scheduler.cache)
+            scheduler.run_queue.push(process)
+            scheduler._start_process(process)
+            # The low priority process is waiting before the high priority one arrives
+            while pool.queue_depth < queued:
+                await asyncio.sleep(0.01)
+        go.touch()
+        while len(scheduler.ended_processes) < 3:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(asyncio.wait_for(run(), 10))
+    assert log.read_text().split() == ["high", "low"]
@@ -0,0 +1,48 @@
+import json
+from datetime import datetime, timedelta
+
+from fbpscheduler.cache import Cache
+from fbpscheduler.enums import Status
+from fbpscheduler.retention import RetentionPolicy
+
+NOW = datetime(2024, 1, 1, 12)
+
+
+def make_cache(*statuses):
+    cache = Cache("S-1")
+    for i, status in enumerate(statuses, 1):
+        process_id = "S-1.P-{}".format(i)
+        cache.set_child(process_id)
+        cache.set_child(process_id + ".J-1")
+        cache.set_parameters(process_id + ".J-1", {"value": i})
+        cache.read_state({"entity_id": process_id, "name": "process", "status": status,
+                          "end_time": NOW - timedelta(hours=len(statuses) - i)})
+    return cache
+
+
+def test_instances_beyond_the_limit_are_evicted_oldest_first():
+    cache = make_cache(Status.finished, Status.running, Status.failure, Status.finished)
+    assert RetentionPolicy(max_instances=2).apply(cache, NOW) == ["S-1.P-1", "S-1.P-3"]
+    assert cache.get_child("S-1.P-1.J-1") is None and "S-1.P-1" not in cache.metadata
+    assert sorted(cache._children) == ["S-1.P-2", "S-1.P-4"]
+
+
+def test_old_instances_are_evicted():
+    cache = make_cache(Status.finished, Status.finished, Status.finished)
+    assert RetentionPolicy(max_age=timedelta(minutes=90)).select(cache, NOW) == ["S-1.P-1"]
+    assert RetentionPolicy(max_age=30 * 60).select(cache, NOW) == ["S-1.P-1", "S-1.P-2"]
+
+
+def test_instances_are_evicted_down_to_the_size_limit():
+    cache = make_cache(Status.finished, Status.finished, Status.running)
+    policy = RetentionPolicy(max_bytes=1)
+    assert policy.select(cache, NOW) == ["S-1.P-1", "S-1.P-2"]
+
+
+def test_evicted_instances_are_archived(tmp_path):
+    path = tmp_path / "evicted.jsonl"
+    cache = make_cache(Status.finished, Status.finished)
+    RetentionPolicy(max_instances=1, archive_path=str(path)).apply(cache, NOW)
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record["id"] for record in records] == ["S-1.P-1"]
+    assert records[0]["parameters"]["S-1.P-1.J-1"] == {"value": 1}
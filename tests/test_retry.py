@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from fbpscheduler.enums import BackoffPolicy, Status
+from fbpscheduler.retry import RetryQueue, RetrySettings, retry_delay
+
+NOW = datetime(2024, 1, 1)
+
+
+def entity(status=Status.unsuccessful, retry_count=1, children=(), policy=None, delay=None, max_delay=None,
+           entity_id="e"):
+    return SimpleNamespace(entity_id=entity_id, status=status, retry_count=retry_count,
+                           graph_entities={child.entity_id: child for child in children},
+                           retry_policy=policy, retry_delay=delay, retry_max_delay=max_delay)
+
+
+def test_backoff_policies():
+    assert RetrySettings(BackoffPolicy.fixed, 10).backoff(5) == 10
+    assert [RetrySettings(BackoffPolicy.exponential, 10).backoff(attempt) for attempt in (1, 2, 3)] == [10, 20, 40]
+    assert RetrySettings(BackoffPolicy.exponential, 10, 25).backoff(3) == 25
+    assert RetrySettings(BackoffPolicy.exponential, 1).backoff(10 ** 6) == 2.0 ** 64
+    assert all(0 <= RetrySettings(BackoffPolicy.jittered, 10).backoff(2) <= 20 for _ in range(100))
+
+
+def test_groups_wait_for_the_longest_backoff_of_their_children():
+    children = [entity(entity_id="a", retry_count=3, policy=BackoffPolicy.exponential),
+                entity(entity_id="b", retry_count=1, delay=100),
+                entity(entity_id="c", status=Status.finished, delay=1000)]
+    group = entity(children=children, delay=5)
+    # a inherits the delay of the group, c is not unsuccessful
+    assert retry_delay(group) == 100
+    children[1].retry_delay = None
+    assert retry_delay(group) == 20
+
+
+def test_retries_come_out_in_date_order():
+    queue = RetryQueue()
+    first, second, third = (SimpleNamespace(entity_id=name) for name in "abc")
+    queue.push(second, NOW + timedelta(seconds=20))
+    queue.push(first, NOW + timedelta(seconds=10))
+    queue.push(third, NOW + timedelta(seconds=30))
+    queue.discard(third)
+    assert len(queue) == 2 and third not in queue
+    assert queue.next_date() == NOW + timedelta(seconds=10)
+    assert queue.pop_due(NOW + timedelta(seconds=25)) == [first, second]
+    assert queue.next_date() is None and len(queue) == 0
+
+
+def test_pushing_a_queued_process_moves_its_retry():
+    queue = RetryQueue()
+    process = SimpleNamespace(entity_id="a")
+    queue.push(process, NOW + timedelta(seconds=10))
+    queue.push(process, NOW + timedelta(seconds=30))
+    assert queue.pop_due(NOW + timedelta(seconds=20)) == []
+    assert queue.pop_due(NOW + timedelta(seconds=30)) == [process]
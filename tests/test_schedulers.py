@@ -0,0 +1,90 @@
+import asyncio
+import json
+import pickle
+import sys
+
+import pytest
+
+from fbpscheduler.enums import Status
+from fbpscheduler.journal import StateJournal
+from fbpscheduler.schedulers import LocalScheduler
+from fbpscheduler.serializers import get_serializer
+from fbpscheduler.templates import ProcessTemplate
+
+from helpers import job_config, process_config
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="config files are only watched with inotify on linux")
+def test_processes_start_when_their_config_is_written(tmp_path):
+    # The directory is not scanned again during the test, the config is picked up from the file event
+    scheduler = LocalScheduler(str(tmp_path), poll_interval=3600)
+
+    async def run():
+        scheduler.run()
+        await asyncio.sleep(0.2)
+        with open(tmp_path / "process.json", "w") as f:
+            json.dump(process_config([job_config()]), f)
+        while not len(scheduler.ended_processes):
+            await asyncio.sleep(0.01)
+
+    asyncio.run(asyncio.wait_for(run(), 20))
+    assert [summary.status for summary in scheduler.ended_processes] == [Status.finished]
+    assert not scheduler.run_queue and not scheduler.initiated_processes
+
+
+@pytest.mark.parametrize("serializer", ["pickle", "json", "msgpack"])
+def test_restored_triggers_create_processes(tmp_path, serializer):
+    read_path, save_path = tmp_path / "configs", tmp_path / "state"
+    read_path.mkdir()
+    save_path.mkdir()
+    trigger = {"Trigger Type": "cron", "Cron Expression": "0 0 1 1 *", "Modifier Action": "keep"}
+    (read_path / "process.json").write_text(json.dumps(process_config([job_config()], trigger=trigger)))
+    scheduler = LocalScheduler(str(read_path), str(save_path),
+                               journal=StateJournal(serializer=get_serializer(serializer)))
+    asyncio.run(scheduler._insert_config("process.json"))
+    scheduler.save_state()
+    scheduler.journal.close()
+
+    restored = LocalScheduler.load_state(scheduler.journal.snapshot_path, get_serializer(serializer))
+    restored.process_configs["process.json"].trigger.fire()
+    process = restored.initiated_processes.pop()
+    assert process.name == "process" and process.entity_id == scheduler.id + ".P-1"
+    restored.journal.close()
+
+
+def test_states_saved_without_the_journal_are_rejected(tmp_path):
+    path = tmp_path / "S-1.pkl"
+    # States were plain pickles of the scheduler before the journal was added
+    path.write_bytes(pickle.dumps({"id": "S-1", "process_configs": {}}))
+    with pytest.raises(ValueError, match="before the journal"):
+        LocalScheduler.load_state(str(path))
+
+
+def test_config_changes_and_fires_are_replayed(tmp_path):
+    read_path, save_path = tmp_path / "configs", tmp_path / "state"
+    read_path.mkdir()
+    save_path.mkdir()
+    for name in ("first", "second"):
+        (read_path / (name + ".json")).write_text(json.dumps(process_config([job_config()], name=name)))
+    scheduler = LocalScheduler(str(read_path), str(save_path))
+    scheduler.save_state()
+
+    async def change_configs():
+        await scheduler._insert_config("first.json")
+        await scheduler._insert_config("second.json")
+        await scheduler._remove_config("second.json")
+
+    asyncio.run(change_configs())
+    scheduler.process_configs["first.json"].trigger.fire()
+    scheduler.cache.remove_child(scheduler.initiated_processes.pop().entity_id)
+    # Crash without another snapshot
+    scheduler.journal.close()
+
+    restored = LocalScheduler.load_state(scheduler.journal.snapshot_path)
+    assert list(restored.process_configs) == ["first.json"]
+    assert not restored._check_insert("first.json")
+    # The instant trigger already fired
+    assert restored.process_configs["first.json"].trigger.next_fire_date() is None
+    process = ProcessTemplate(restored.process_configs["first.json"].config).instantiate(restored.id, restored.cache)
+    assert process.entity_id == scheduler.id + ".P-2"
+    restored.journal.close()
@@ -0,0 +1,50 @@
+import pytest
+
+from fbpscheduler import schema_dir
+from fbpscheduler.marshalling import SchemaValidators
+
+from helpers import job_config, process_config
+
+
+@pytest.fixture(scope="module")
+def validators():
+    return SchemaValidators(schema_dir)
+
+
+@pytest.mark.parametrize("run_type", ["cmd", "exec"])
+def test_command_jobs_accept_list_parameters(validators, run_type):
+    config = process_config([job_config(run_type=run_type, command="echo", parameters=["a", 1])])
+    assert validators.validate_process(config)
+
+
+def test_python_jobs_reject_list_parameters(validators):
+    config = process_config([job_config(run_type="python", command="main", parameters=["a"], Module="module")])
+    result = validators.validate_process(config)
+    assert not result
+    assert "Parameters" in str(result)
+
+
+def test_errors_give_the_path_of_the_invalid_value(validators):
+    config = process_config([job_config(**{"Run Type": "perl"})])
+    result = validators.validate_process(config)
+    assert not result.valid
+    assert [error.path for error in result.errors] == [("Entity List", 0, "Run Type")]
+    assert str(result).startswith("Entity List/0/Run Type: ")
+
+
+def test_errors_of_nested_entities_come_from_the_closest_definition(validators):
+    group = {"Object Type": "JobGroup", "Name": "group", "Description": "", "Dependencies": [],
+             "Jobs": [job_config(Command=1)]}
+    result = validators.validate_process(process_config([group]))
+    assert [error.path for error in result.errors] == [("Entity List", 0, "Jobs", 0, "Command")]
+
+
+def test_compiled_and_fallback_validators_agree(validators):
+    valid = process_config([job_config()])
+    invalid = process_config([job_config(Deadline=5)])
+    assert validators.validate_process(valid)
+    assert not validators.validate_process(invalid)
+    fallback = SchemaValidators(schema_dir)
+    fallback._fast_validators = {}
+    assert fallback.validate_process(valid)
+    assert str(fallback.validate_process(invalid)) == str(validators.validate_process(invalid))
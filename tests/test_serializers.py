@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from fbpscheduler.cache import Cache
+from fbpscheduler.enums import Status
+from fbpscheduler.marshalling import TYPE_KEY
+from fbpscheduler.serializers import get_serializer, register_serializer, serializers
+from fbpscheduler.templates import ProcessTemplate
+
+from helpers import job_config, process_config
+
+
+@pytest.mark.parametrize("name", sorted(serializers))
+def test_processes_round_trip(name):
+    serializer = get_serializer(name)
+    cache = Cache("S-1", {"date": "2024-01-01"})
+    process = ProcessTemplate(process_config([job_config("a"), job_config("b", Dependencies=["a"])])).instantiate(
+        cache.id, cache)
+    asyncio.run(process.execute(cache))
+
+    restored_cache, restored = serializer.deserialize(serializer.serialize((cache, process)))
+    assert restored.status == Status.finished
+    assert restored.start_time == process.start_time and restored.deadline == process.deadline
+    assert restored.graph.to_dict() == process.graph.to_dict()
+    assert [job.status for job in restored.get_entities()] == [Status.finished, Status.finished]
+    assert restored_cache.get_parameters("S-1.P-1.J-2") == cache.get_parameters("S-1.P-1.J-2")
+    assert restored_cache.get_child("S-1.P-1.J-2").parent is restored_cache.get_child("S-1.P-1")
+
+
+def test_unknown_serializers_are_rejected():
+    with pytest.raises(ValueError, match="pickle"):
+        get_serializer("yaml")
+    with pytest.raises(TypeError):
+        register_serializer("dict", dict)
+
+
+def test_msgpack_lists_object_fields_once():
+    serializer = get_serializer("msgpack")
+    group = {"Object Type": "JobGroup", "Name": "group", "Description": "", "Dependencies": [],
+             "Jobs": [job_config("a"), job_config("b")]}
+    cache = Cache("S-1")
+    jobs = [group, job_config("c", parameters={TYPE_KEY: "Enum", "value": "Status.finished"})]
+    process = ProcessTemplate(process_config(jobs)).instantiate(cache.id, cache)
+    data = serializer.serialize(process)
+    assert data.count(b"success_code") == 1
+
+    restored = serializer.deserialize(data)
+    restored_group, restored_job = restored.get_entities()
+    assert [job.name for job in restored_group.get_entities()] == ["a", "b"] and restored_job.name == "c"
+    # Dictionaries are only decoded from extension types, whatever their keys
+    assert restored_job.parameters == {TYPE_KEY: "Enum", "value": "Status.finished"}
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from fbpscheduler.cache import Cache
+from fbpscheduler.enums import Status
+from fbpscheduler.factory import EntityFactory
+from fbpscheduler.templates import ProcessTemplate
+
+from helpers import job_config, process_config
+
+
+def config():
+    return process_config([job_config("a"), job_config("b", Dependencies=["a"])])
+
+
+def test_instances_match_parsed_processes():
+    template = ProcessTemplate(config())
+    instance = template.instantiate("S-1", Cache("S-1"))
+    parsed = EntityFactory.parse("S-1", config(), Cache("S-1"))
+    assert instance.entity_id == parsed.entity_id == "S-1.P-1"
+    assert instance.graph.to_dict() == parsed.graph.to_dict() == {"S-1.P-1.J-1": [], "S-1.P-1.J-2": ["S-1.P-1.J-1"]}
+    assert instance.graph_entities["S-1.P-1.J-2"].dependencies == {"a": "S-1.P-1.J-1"}
+
+
+def test_instances_do_not_share_run_state():
+    cache = Cache("S-1")
+    template = ProcessTemplate(config())
+    first, second = template.instantiate(cache.id, cache), template.instantiate(cache.id, cache)
+    asyncio.run(first.execute(cache))
+    assert first.status == Status.finished
+    assert second.status == Status.initialized
+    assert all(job.status == Status.initialized for job in second.get_entities())
+    assert cache.metadata["S-1.P-2.J-1"]["status"] == Status.initialized
+
+
+def test_invalid_dependencies_are_reported_when_loaded():
+    with pytest.raises(ValueError):
+        ProcessTemplate(process_config([job_config("a", Dependencies=["missing"])]))
+    with pytest.raises(ValueError):
+        ProcessTemplate(process_config([job_config("a", Dependencies=["b"]), job_config("b", Dependencies=["a"])]))
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from fbpscheduler.enums import MisfirePolicy
+from fbpscheduler.timers import TriggerService
+from fbpscheduler.triggers import CronTrigger, DateTrigger
+
+
+class FailingCallback:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        raise RuntimeError("callback failed")
+
+
+def test_raising_callback_fires_once_from_the_service():
+    callback = FailingCallback()
+    trigger = DateTrigger(datetime.now(), callback, None, None)
+
+    async def run():
+        service = TriggerService()
+        handle = service.schedule(trigger)
+        service.start()
+        await asyncio.sleep(0.2)
+        service.stop()
+        return service, handle
+
+    service, handle = asyncio.run(run())
+    assert callback.calls == 1
+    assert trigger.next_fire_date() is None
+    assert handle.when is None and len(service) == 0
+
+
+def test_raising_callback_fires_once_from_its_own_task():
+    callback = FailingCallback()
+    trigger = DateTrigger(datetime.now() + timedelta(milliseconds=10), callback, None, None)
+    asyncio.run(asyncio.wait_for(trigger.activate_trigger(), 1))
+    assert callback.calls == 1
+
+
+def missed_cron_trigger(callback, minutes, **misfire):
+    trigger = CronTrigger("* * * * *", callback, None, None, **misfire)
+    trigger._cron_date = trigger._trigger_date = datetime.now().replace(second=0, microsecond=0) - \
+        timedelta(minutes=minutes)
+    return trigger
+
+
+def fire_missed(trigger, now):
+    while trigger.drop_missed(now):
+        trigger.fire(now)
+
+
+@pytest.mark.parametrize("policy, grace_time, calls", [(MisfirePolicy.coalesce, None, 1),
+                                                        (MisfirePolicy.skip, None, 0),
+                                                        (MisfirePolicy.catch_up, 170, 3)])
+def test_misfire_policies(policy, grace_time, calls):
+    fired = []
+    now = datetime.now().replace(second=30, microsecond=0)
+    trigger = missed_cron_trigger(lambda: fired.append(1), 10, misfire_policy=policy, misfire_grace_time=grace_time)
+    fire_missed(trigger, now)
+    assert len(fired) == calls
+    assert trigger.next_fire_date() > now
+
+
+def test_missed_fires_are_paced():
+    fired = []
+    past = datetime.now() - timedelta(minutes=1)
+    triggers = [DateTrigger(past, lambda: fired.append(time.monotonic()), None, None) for _ in range(5)]
+
+    async def run():
+        service = TriggerService(catch_up_rate=5)
+        for trigger in triggers:
+            service.schedule(trigger)
+        service.start()
+        while len(fired) < 5:
+            await asyncio.sleep(0.01)
+        service.stop()
+
+    asyncio.run(asyncio.wait_for(run(), 10))
+    # At most catch_up_rate fires a second, a slow loop only spreads them further
+    assert all(later - earlier >= 0.19 for earlier, later in zip(fired, fired[1:]))
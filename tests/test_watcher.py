@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+from fbpscheduler.enums import FileEvent
+from fbpscheduler.watcher import InotifyWatcher, PollingWatcher
+
+watchers = [PollingWatcher]
+if sys.platform.startswith("linux"):
+    watchers.append(InotifyWatcher)
+
+
+@pytest.mark.parametrize("watcher_class", watchers)
+def test_file_changes_are_reported(tmp_path, watcher_class):
+    (tmp_path / "existing.json").write_text("{}")
+    watcher = watcher_class(str(tmp_path))
+    try:
+        assert watcher.changes() == [(FileEvent.created, "existing.json")]
+        assert watcher.changes() == []
+
+        (tmp_path / "new.json").write_text("{}")
+        (tmp_path / "existing.json").write_text('{"changed": true}')
+        assert set(watcher.changes()) == {(FileEvent.created, "new.json"), (FileEvent.modified, "existing.json")}
+
+        os.remove(tmp_path / "new.json")
+        os.mkdir(tmp_path / "directory")
+        assert watcher.changes() == [(FileEvent.deleted, "new.json")]
+    finally:
+        watcher.close()